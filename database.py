@@ -25,11 +25,29 @@ class Database:
             db_path: 数据库文件路径
         """
         self.db_path = db_path
+        # 内存数据库每次 connect 都是一个新库，需要保持同一个连接
+        self._memory_conn = sqlite3.connect(':memory:') if db_path == ':memory:' else None
         self.init_database()
 
+    @classmethod
+    def in_memory(cls) -> 'Database':
+        """
+        创建内存数据库实例（主要用于测试，不落盘）
+
+        Returns:
+            使用 :memory: 的 Database 实例
+        """
+        return cls(':memory:')
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取数据库连接（内存数据库复用同一连接）"""
+        if self._memory_conn is not None:
+            return self._memory_conn
+        return sqlite3.connect(self.db_path)
+
     def init_database(self):
         """初始化数据库表结构"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             # K 线数据表（3分钟）
@@ -138,7 +156,7 @@ class Database:
         """
         table_name = TABLES['klines_intraday'] if timeframe == '3m' else TABLES['klines_long_term']
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             for kline in klines:
@@ -180,7 +198,7 @@ class Database:
         """
         import pandas as pd
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             # 从 pandas Series 中获取指定 timestamp 的值
@@ -241,7 +259,7 @@ class Database:
             timestamp: 时间戳
             perp_data: 永续合约数据
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             cursor.execute(f"""
@@ -274,7 +292,7 @@ class Database:
         """
         table_name = TABLES['klines_intraday'] if timeframe == '3m' else TABLES['klines_long_term']
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             query = f"""
                 SELECT timestamp, open, high, low, close, volume, close_time
                 FROM {table_name}
@@ -295,7 +313,7 @@ class Database:
         Returns:
             最新数据字典
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             # 获取最新 K 线数据
@@ -363,4 +381,7 @@ class Database:
 
     def close(self):
         """关闭数据库连接"""
+        if self._memory_conn is not None:
+            self._memory_conn.close()
+            self._memory_conn = None
         logger.info("数据库连接已关闭")
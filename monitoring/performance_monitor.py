@@ -4,18 +4,40 @@
 实时监控系统性能、交易表现和成本
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+import atexit
 import json
+import math
 import sqlite3
+import threading
+import time
 from collections import defaultdict, deque
+from itertools import islice
 import statistics
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # 未安装时回退到标准库 json
+
 from models.trading_decision import TradingDecision
 from trading.paper_trader import PaperTrader
 from scheduling.decision_cache import DecisionCache
 
+# 批量写入语句（executemany 只准备一次语句，逐行绑定参数）
+_INSERT_TRADING_METRIC = '''
+    INSERT INTO trading_metrics
+    (timestamp, symbol, action, confidence, pnl, execution_time, llm_cost, total_cost)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+_INSERT_SYSTEM_METRIC = '''
+    INSERT INTO system_metrics
+    (timestamp, cpu_usage, memory_usage, active_connections, response_time, cache_hit_rate, error_rate)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
 
 @dataclass
 class SystemMetrics:
@@ -63,6 +85,20 @@ class PerformanceSummary:
     total_runtime: float  # 小时
 
 
+# 告警规则：(触发条件, 级别, 消息模板)，条件和模板都基于 get_alerts 汇总的数值
+_ALERT_RULES = (
+    (lambda v: v['status'] == 'critical', 'critical',
+     "系统错误率过高: {avg_error_rate:.2f}%"),
+    (lambda v: v['status'] == 'warning', 'warning',
+     "系统资源使用率过高: CPU {avg_cpu_usage:.1f}%, 内存 {avg_memory_usage:.1f}%"),
+    # 每小时成本超过10美元
+    (lambda v: v['cost_per_hour'] > 10, 'warning',
+     "LLM成本过高: ${cost_per_hour:.2f}/小时"),
+    (lambda v: v['total_trades'] > 10 and v['win_rate'] < 40, 'warning',
+     "交易胜率过低: {win_rate:.1f}%"),
+)
+
+
 class PerformanceMonitor:
     """
     性能监控器
@@ -74,10 +110,26 @@ class PerformanceMonitor:
     - 生成报告
     """
 
+    # 待写入行数达到该值、或距上次落库超过 FLUSH_INTERVAL 秒时批量落库
+    FLUSH_BATCH_SIZE = 64
+    FLUSH_INTERVAL = 60.0
+
+    # 监控数据可容忍少量丢失，不必每次提交都 fsync
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        "PRAGMA temp_store=MEMORY;"
+        "PRAGMA cache_size=-20000;"
+    )
+    # fast_mode（测试用）：完全关闭同步
+    # 连接会长期持有，不使用 locking_mode=EXCLUSIVE，以免其他连接无法读取
+    FAST_PRAGMAS = "PRAGMA synchronous=OFF;"
+
     def __init__(
         self,
         database_path: str = "performance_monitor.db",
-        window_size: int = 1000  # 滑动窗口大小
+        window_size: int = 1000,  # 滑动窗口大小
+        fast_mode: bool = False
     ):
         """
         初始化性能监控器
@@ -85,14 +137,36 @@ class PerformanceMonitor:
         Args:
             database_path: 数据库路径
             window_size: 滑动窗口大小
+            fast_mode: 是否牺牲持久性换取写入速度（用于测试）
         """
         self.database_path = database_path
         self.window_size = window_size
+        self.fast_mode = fast_mode
+        # 整个生命周期复用同一个连接（内存数据库也必须如此）
+        self._conn = sqlite3.connect(database_path, check_same_thread=False)
+        # 连接允许跨线程使用，连接与待写入缓存都由该锁保护
+        self._db_lock = threading.Lock()
+        self._conn.executescript(self.PRAGMAS)
+        if fast_mode:
+            self._conn.executescript(self.FAST_PRAGMAS)
 
         # 内存缓存（最近的数据）
         self.trading_metrics: deque = deque(maxlen=window_size)
         self.system_metrics: deque = deque(maxlen=window_size)
 
+        # 滑动窗口内交易指标的累计值，随窗口增删增量更新
+        self._agg = self._empty_agg()
+        # 窗口每变化一次加 1，用于判断 _trade_stats 缓存是否失效
+        self._agg_gen = 0
+        self._trade_stats_cache: Optional[tuple] = None
+
+        # 待写入数据库的行（批量提交，避免每行一次事务）
+        self._pending_trading: List[tuple] = []
+        self._pending_system: List[tuple] = []
+        self._last_flush = time.monotonic()
+        # 进程退出时写入尚未落库的指标（调用方忘记 close 时也不丢数据）
+        atexit.register(self.close)
+
         # 统计数据
         self.stats = {
             'total_requests': 0,
@@ -108,7 +182,7 @@ class PerformanceMonitor:
 
     def _init_database(self):
         """初始化数据库"""
-        conn = sqlite3.connect(self.database_path)
+        conn = self._conn
         cursor = conn.cursor()
 
         # 创建系统指标表
@@ -162,7 +236,6 @@ class PerformanceMonitor:
         ''')
 
         conn.commit()
-        conn.close()
 
     def record_trading_metrics(
         self,
@@ -193,7 +266,7 @@ class PerformanceMonitor:
             total_cost=total_cost
         )
 
-        self.trading_metrics.append(metric)
+        self._append_trading_metrics([metric])
 
         # 保存到数据库
         self._save_trading_metric(metric)
@@ -207,6 +280,137 @@ class PerformanceMonitor:
         else:
             self.stats['failed_requests'] += 1
 
+    def bulk_record_trading_metrics(
+        self,
+        rows: List[Tuple[TradingDecision, float, float, float, float]]
+    ):
+        """
+        批量记录交易指标（一次事务写入）
+
+        Args:
+            rows: (decision, pnl, execution_time, llm_cost, total_cost) 元组列表，
+                字段含义同 record_trading_metrics
+        """
+        if not rows:
+            return
+
+        timestamp = datetime.now()
+        metrics = [
+            TradingMetrics(
+                timestamp=timestamp,
+                symbol=decision.symbol or "UNKNOWN",
+                action=decision.action,
+                confidence=decision.confidence,
+                pnl=pnl,
+                execution_time=execution_time,
+                llm_cost=llm_cost,
+                total_cost=total_cost
+            )
+            for decision, pnl, execution_time, llm_cost, total_cost in rows
+        ]
+
+        self._append_trading_metrics(metrics)
+
+        # 保存到数据库
+        with self._db_lock:
+            self._pending_trading.extend(map(self._trading_metric_row, metrics))
+            self._flush_locked(force=True)
+
+        # 更新统计
+        successful = sum(1 for m in metrics if m.pnl > 0)
+        self.stats['total_trades'] += len(metrics)
+        self.stats['total_cost'] += sum(m.total_cost for m in metrics)
+        self.stats['successful_requests'] += successful
+        self.stats['failed_requests'] += len(metrics) - successful
+
+    @staticmethod
+    def _empty_agg() -> Dict[str, float]:
+        """空窗口的累计值"""
+        return {
+            'count': 0, 'winning': 0, 'losing': 0,
+            'pnl': 0.0, 'win_pnl': 0.0, 'loss_pnl': 0.0,
+            'cost': 0.0, 'llm_cost': 0.0, 'execution_time': 0.0
+        }
+
+    def _update_agg(self, metric: TradingMetrics, sign: int):
+        """将一条交易指标计入（sign=1）或移出（sign=-1）累计值"""
+        agg = self._agg
+        pnl = metric.pnl
+        agg['count'] += sign
+        agg['pnl'] += sign * pnl
+        agg['cost'] += sign * metric.total_cost
+        agg['llm_cost'] += sign * metric.llm_cost
+        agg['execution_time'] += sign * metric.execution_time
+        if pnl > 0:
+            agg['winning'] += sign
+            agg['win_pnl'] += sign * pnl
+        elif pnl < 0:
+            agg['losing'] += sign
+            agg['loss_pnl'] += sign * pnl
+
+    def _append_trading_metrics(self, metrics: List[TradingMetrics]):
+        """追加交易指标到滑动窗口，同时更新累计值（扣除被挤出窗口的旧指标）"""
+        window = self.trading_metrics
+        overflow = len(window) + len(metrics) - window.maxlen
+        if overflow > 0:
+            evicted = min(overflow, len(window))
+            for old in islice(window, evicted):
+                self._update_agg(old, -1)
+            # 批量超过窗口大小时，新指标本身也有一部分会被挤出
+            kept = metrics[overflow - evicted:]
+        else:
+            kept = metrics
+
+        window.extend(metrics)
+        for metric in kept:
+            self._update_agg(metric, 1)
+        self._agg_gen += 1
+
+    def _trade_stats(self) -> Dict[str, float]:
+        """
+        由累计值计算窗口内的交易统计（按 _agg_gen 缓存）
+
+        Returns:
+            交易统计
+        """
+        cache = self._trade_stats_cache
+        if cache is not None and cache[0] == self._agg_gen:
+            return cache[1]
+
+        agg = self._agg
+        n = agg['count']
+        winning = agg['winning']
+
+        # 盈亏比
+        profit_factor = (
+            agg['win_pnl'] / abs(agg['loss_pnl'])
+            if agg['losing'] and agg['loss_pnl'] < 0 else 0
+        )
+
+        # 夏普比率（简化）：标准差直接由窗口数据计算（增删平方和在大值移出窗口后会失真），
+        # 结果随整个统计按 _agg_gen 缓存
+        sharpe_ratio = 0
+        if n > 1:
+            returns = [m.pnl for m in self.trading_metrics]
+            std = statistics.stdev(returns)
+            if std > 0:
+                sharpe_ratio = statistics.mean(returns) / std * math.sqrt(365)
+
+        stats = {
+            'total_trades': n,
+            'winning_trades': winning,
+            'losing_trades': n - winning,
+            'win_rate': winning / n * 100 if n > 0 else 0,
+            'total_pnl': agg['pnl'],
+            'total_cost': agg['cost'],
+            'avg_cost_per_trade': agg['cost'] / n if n > 0 else 0,
+            'profit_factor': profit_factor,
+            'avg_execution_time': agg['execution_time'] / n if n > 0 else 0,
+            'sharpe_ratio': sharpe_ratio
+        }
+        self._trade_stats_cache = (self._agg_gen, stats)
+        return stats
+
     def record_system_metrics(
         self,
         cpu_usage: float,
@@ -258,8 +462,9 @@ class PerformanceMonitor:
             性能摘要
         """
         # 计算交易统计
-        trades = list(self.trading_metrics)
-        if not trades:
+        stats = self._trade_stats()
+        total_trades = stats['total_trades']
+        if not total_trades:
             return PerformanceSummary(
                 total_trades=0, winning_trades=0, losing_trades=0, win_rate=0,
                 total_pnl=0, total_return_pct=0, max_drawdown=0, sharpe_ratio=0,
@@ -267,58 +472,30 @@ class PerformanceMonitor:
                 avg_execution_time=0, total_runtime=0
             )
 
-        total_trades = len(trades)
-        winning_trades = sum(1 for t in trades if t.pnl > 0)
-        losing_trades = total_trades - winning_trades
-        win_rate = winning_trades / total_trades * 100 if total_trades > 0 else 0
-
-        total_pnl = sum(t.pnl for t in trades)
-        total_cost = sum(t.total_cost for t in trades)
-
         # 从纸交易获取组合指标
         if price_data:
             pnl_metrics = paper_trader.get_pnl(price_data)
             performance_metrics = paper_trader.get_performance_metrics()
         else:
-            pnl_metrics = {'total_pnl': total_pnl, 'total_return_pct': 0}
+            pnl_metrics = {'total_pnl': stats['total_pnl'], 'total_return_pct': 0}
             performance_metrics = {'max_drawdown': 0, 'total_trades': total_trades}
 
-        # 计算其他指标
-        avg_cost_per_trade = total_cost / total_trades if total_trades > 0 else 0
-
-        # 盈亏比
-        winning_pnls = [t.pnl for t in trades if t.pnl > 0]
-        losing_pnls = [t.pnl for t in trades if t.pnl < 0]
-        avg_win = statistics.mean(winning_pnls) if winning_pnls else 0
-        avg_loss = abs(statistics.mean(losing_pnls)) if losing_pnls else 0
-        profit_factor = (avg_win * len(winning_pnls)) / (avg_loss * len(losing_pnls)) if avg_loss > 0 else 0
-
-        # 平均执行时间
-        avg_execution_time = statistics.mean([t.execution_time for t in trades])
-
         # 运行时间
         total_runtime = (datetime.now() - self.stats['start_time']).total_seconds() / 3600
 
-        # 夏普比率（简化）
-        returns = [t.pnl for t in trades]
-        sharpe_ratio = 0
-        if len(returns) > 1 and statistics.stdev(returns) > 0:
-            mean_return = statistics.mean(returns)
-            sharpe_ratio = mean_return / statistics.stdev(returns) * statistics.sqrt(365)
-
         summary = PerformanceSummary(
             total_trades=total_trades,
-            winning_trades=winning_trades,
-            losing_trades=losing_trades,
-            win_rate=win_rate,
-            total_pnl=total_pnl,
+            winning_trades=stats['winning_trades'],
+            losing_trades=stats['losing_trades'],
+            win_rate=stats['win_rate'],
+            total_pnl=stats['total_pnl'],
             total_return_pct=pnl_metrics.get('total_return_pct', 0),
             max_drawdown=performance_metrics.get('max_drawdown', 0),
-            sharpe_ratio=sharpe_ratio,
-            total_cost=total_cost,
-            avg_cost_per_trade=avg_cost_per_trade,
-            profit_factor=profit_factor,
-            avg_execution_time=avg_execution_time,
+            sharpe_ratio=stats['sharpe_ratio'],
+            total_cost=stats['total_cost'],
+            avg_cost_per_trade=stats['avg_cost_per_trade'],
+            profit_factor=stats['profit_factor'],
+            avg_execution_time=stats['avg_execution_time'],
             total_runtime=total_runtime
         )
 
@@ -337,8 +514,10 @@ class PerformanceMonitor:
         Returns:
             交易记录列表
         """
-        recent = list(self.trading_metrics)[-limit:]
-        return [t.__dict__ for t in recent]
+        self.flush()
+        # 从队尾取最近 limit 条，不复制整个窗口；返回时按时间正序
+        recent = list(islice(reversed(self.trading_metrics), limit))
+        return [t.__dict__ for t in reversed(recent)]
 
     def get_cost_analysis(self) -> Dict[str, Any]:
         """
@@ -381,7 +560,7 @@ class PerformanceMonitor:
         if not self.system_metrics:
             return {'status': 'no_data'}
 
-        recent = list(self.system_metrics)[-10:]  # 最近10个指标
+        recent = list(islice(reversed(self.system_metrics), 10))[::-1]  # 最近10个指标
 
         avg_cpu = statistics.mean([m.cpu_usage for m in recent])
         avg_memory = statistics.mean([m.memory_usage for m in recent])
@@ -407,15 +586,10 @@ class PerformanceMonitor:
             'active_connections': recent[-1].active_connections if recent else 0
         }
 
-    def _save_trading_metric(self, metric: TradingMetrics):
-        """保存交易指标到数据库"""
-        conn = sqlite3.connect(self.database_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO trading_metrics
-            (timestamp, symbol, action, confidence, pnl, execution_time, llm_cost, total_cost)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+    @staticmethod
+    def _trading_metric_row(metric: TradingMetrics) -> tuple:
+        """交易指标 -> 数据库行"""
+        return (
             metric.timestamp.isoformat(),
             metric.symbol,
             metric.action,
@@ -424,19 +598,18 @@ class PerformanceMonitor:
             metric.execution_time,
             metric.llm_cost,
             metric.total_cost
-        ))
-        conn.commit()
-        conn.close()
+        )
+
+    def _save_trading_metric(self, metric: TradingMetrics):
+        """缓存交易指标，待批量写入数据库"""
+        row = self._trading_metric_row(metric)
+        with self._db_lock:
+            self._pending_trading.append(row)
+            self._flush_locked()
 
     def _save_system_metric(self, metric: SystemMetrics):
-        """保存系统指标到数据库"""
-        conn = sqlite3.connect(self.database_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO system_metrics
-            (timestamp, cpu_usage, memory_usage, active_connections, response_time, cache_hit_rate, error_rate)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        """缓存系统指标，待批量写入数据库"""
+        row = (
             metric.timestamp.isoformat(),
             metric.cpu_usage,
             metric.memory_usage,
@@ -444,13 +617,67 @@ class PerformanceMonitor:
             metric.response_time,
             metric.cache_hit_rate,
             metric.error_rate
-        ))
-        conn.commit()
-        conn.close()
+        )
+        with self._db_lock:
+            self._pending_system.append(row)
+            self._flush_locked()
+
+    def _flush_locked(self, force: bool = False):
+        """
+        将缓存的指标在一个事务内写入数据库（调用方需持有 _db_lock）
+
+        连接已关闭时丢弃缓存、不再写入。
+
+        Args:
+            force: 为 False 时仅在缓存达到 FLUSH_BATCH_SIZE 或超过 FLUSH_INTERVAL 后写入
+        """
+        if self._conn is None:
+            self._pending_trading.clear()
+            self._pending_system.clear()
+            return
+        pending = len(self._pending_trading) + len(self._pending_system)
+        if not pending:
+            return
+        if (not force and pending < self.FLUSH_BATCH_SIZE
+                and time.monotonic() - self._last_flush < self.FLUSH_INTERVAL):
+            return
+
+        with self._conn as conn:
+            if self._pending_trading:
+                conn.executemany(_INSERT_TRADING_METRIC, self._pending_trading)
+            if self._pending_system:
+                conn.executemany(_INSERT_SYSTEM_METRIC, self._pending_system)
+
+        self._pending_trading.clear()
+        self._pending_system.clear()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """立即写入所有缓存的指标"""
+        with self._db_lock:
+            self._flush_locked(force=True)
+
+    def close(self):
+        """写入缓存的指标并关闭数据库连接（可重复调用，关闭后不再写入数据库）"""
+        with self._db_lock:
+            if self._conn is None:
+                return
+            atexit.unregister(self.close)
+            self._flush_locked(force=True)
+            self._conn.close()
+            self._conn = None
 
     def _save_performance_summary(self, summary: PerformanceSummary):
-        """保存性能摘要到数据库"""
-        conn = sqlite3.connect(self.database_path)
+        """保存性能摘要到数据库（连接已关闭时跳过）"""
+        with self._db_lock:
+            if self._conn is None:
+                return
+            self._flush_locked(force=True)
+            self._insert_performance_summary(summary)
+
+    def _insert_performance_summary(self, summary: PerformanceSummary):
+        """写入一行性能摘要（调用方需持有 _db_lock）"""
+        conn = self._conn
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO performance_summary
@@ -475,7 +702,6 @@ class PerformanceMonitor:
             summary.total_runtime
         ))
         conn.commit()
-        conn.close()
 
     def export_report(self, file_path: str, paper_trader: PaperTrader):
         """
@@ -485,6 +711,7 @@ class PerformanceMonitor:
             file_path: 文件路径
             paper_trader: 纸交易执行器
         """
+        self.flush()
         summary = self.get_performance_summary(paper_trader)
         cost_analysis = self.get_cost_analysis()
         system_health = self.get_system_health()
@@ -498,53 +725,34 @@ class PerformanceMonitor:
             'statistics': self.stats
         }
 
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(report, f, indent=2, default=str)
+        if orjson is not None:
+            with open(file_path, 'wb') as f:
+                f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2, default=str))
+        else:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, default=str)
 
     def get_alerts(self, paper_trader: PaperTrader) -> List[Dict[str, Any]]:
         """
         获取告警信息
 
         Args:
-            paper_trader: 纸交易执行器
+            paper_trader: 纸交易执行器（保留参数以兼容旧接口，规则只依赖监控自身的数据）
 
         Returns:
             告警列表
         """
-        alerts = []
-
-        # 检查系统健康
-        health = self.get_system_health()
-        if health['status'] == 'critical':
-            alerts.append({
-                'level': 'critical',
-                'message': f"系统错误率过高: {health['avg_error_rate']:.2f}%",
-                'timestamp': datetime.now().isoformat()
-            })
-        elif health['status'] == 'warning':
-            alerts.append({
-                'level': 'warning',
-                'message': f"系统资源使用率过高: CPU {health['avg_cpu_usage']:.1f}%, 内存 {health['avg_memory_usage']:.1f}%",
-                'timestamp': datetime.now().isoformat()
-            })
-
-        # 检查成本
-        cost_analysis = self.get_cost_analysis()
-        cost_per_hour = cost_analysis.get('cost_per_hour', 0)
-        if cost_per_hour > 10:  # 每小时成本超过10美元
-            alerts.append({
-                'level': 'warning',
-                'message': f"LLM成本过高: ${cost_per_hour:.2f}/小时",
-                'timestamp': datetime.now().isoformat()
-            })
-
-        # 检查胜率
-        summary = self.get_performance_summary(paper_trader)
-        if summary.total_trades > 10 and summary.win_rate < 40:
-            alerts.append({
-                'level': 'warning',
-                'message': f"交易胜率过低: {summary.win_rate:.1f}%",
-                'timestamp': datetime.now().isoformat()
-            })
-
-        return alerts
+        # 各规则所需的数值都来自累计值或最近的系统指标，不再扫描交易窗口
+        values = dict(self.get_system_health())
+        stats = self._trade_stats()
+        runtime_hours = (datetime.now() - self.stats['start_time']).total_seconds() / 3600
+        values['cost_per_hour'] = stats['total_cost'] / max(1, runtime_hours)
+        values['total_trades'] = stats['total_trades']
+        values['win_rate'] = stats['win_rate']
+
+        timestamp = datetime.now().isoformat()
+        return [
+            {'level': level, 'message': message.format(**values), 'timestamp': timestamp}
+            for predicate, level, message in _ALERT_RULES
+            if predicate(values)
+        ]
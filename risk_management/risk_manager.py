@@ -175,18 +175,20 @@ class RiskManager:
                 risk_level="MEDIUM"
             )
 
-        # 计算收益率
-        returns = np.diff(price_history) / price_history[:-1]
+        # 价格只转换一次数组，收益率只计算一次，供各子指标复用
+        prices = np.asarray(price_history, dtype=np.float64)
+        returns = np.diff(prices) / prices[:-1]
 
         # 计算VaR
-        var_1d = self._calculate_var(returns, 0.05) * np.sqrt(1)  # 1天
-        var_5d = self._calculate_var(returns, 0.05) * np.sqrt(5)  # 5天
+        var = self._calculate_var(returns, 0.05)
+        var_1d = var * np.sqrt(1)  # 1天
+        var_5d = var * np.sqrt(5)  # 5天
 
         # 计算夏普比率
         sharpe_ratio = self._calculate_sharpe(returns)
 
         # 计算最大回撤
-        max_drawdown = self._calculate_max_drawdown(price_history)
+        max_drawdown = self._calculate_max_drawdown(prices)
 
         # 计算波动率
         volatility = np.std(returns) * np.sqrt(365) * 100  # 年化波动率
@@ -236,7 +238,10 @@ class RiskManager:
         Returns:
             VaR值
         """
-        return np.percentile(returns, confidence_level * 100)
+        returns = np.asarray(returns, dtype=np.float64)
+        # 只需要第 k 小的收益率，部分排序即可（取经验分位数，不做插值）
+        k = min(max(int(len(returns) * confidence_level), 0), len(returns) - 1)
+        return float(np.partition(returns, k)[k])
 
     def _calculate_sharpe(self, returns: np.ndarray, risk_free_rate: float = 0.02) -> float:
         """
@@ -260,7 +265,7 @@ class RiskManager:
         计算最大回撤
 
         Args:
-            prices: 价格序列
+            prices: 价格序列（列表或数组）
 
         Returns:
             最大回撤比例
@@ -268,16 +273,9 @@ class RiskManager:
         if len(prices) < 2:
             return 0.0
 
-        peak = prices[0]
-        max_dd = 0.0
-
-        for price in prices:
-            if price > peak:
-                peak = price
-            dd = (peak - price) / peak
-            max_dd = max(max_dd, dd)
-
-        return max_dd
+        prices = np.asarray(prices, dtype=np.float64)
+        peaks = np.maximum.accumulate(prices)  # 截至每个时点的历史最高价
+        return float(np.max((peaks - prices) / peaks))
 
     def _calculate_risk_score(
         self,
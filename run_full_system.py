@@ -241,6 +241,9 @@ class FullSystem:
             # 7. 生成最终报告
             await self.generate_final_report()
 
+            # 8. 关闭监控器，写入尚未落库的指标
+            self.monitor.close()
+
         return True
 
     async def generate_final_report(self):
@@ -19,18 +19,22 @@ class DataScheduler:
     """数据更新调度器"""
 
     def __init__(self, symbols: Optional[List[str]] = None,
-                 update_interval: Optional[int] = None):
+                 update_interval: Optional[int] = None,
+                 single_shot: bool = False):
         """
         初始化调度器
 
         Args:
             symbols: 交易对符号列表
             update_interval: 更新间隔（秒）
+            single_shot: 为 True 时 start() 只执行首次更新后立即返回，
+                后续由调用方通过 tick() 驱动（用于测试）
         """
         self.symbols = symbols if symbols else SYMBOLS
         self.update_interval = update_interval if update_interval else UPDATE_INTERVAL
         self.data_fetcher = DataFetcher()
         self.is_running = False
+        self._single_shot = single_shot
 
     def update_market_data(self):
         """更新所有交易对的市场数据"""
@@ -68,15 +72,22 @@ class DataScheduler:
         # 立即执行一次
         self.update_market_data()
 
+        if self._single_shot:
+            return
+
         # 运行调度器
         try:
             while self.is_running:
-                schedule.run_pending()
+                self.tick()
                 time.sleep(1)
         except KeyboardInterrupt:
             logger.info("接收到中断信号，正在停止调度器...")
             self.stop()
 
+    def tick(self):
+        """执行一次调度循环（运行所有到期任务）"""
+        schedule.run_pending()
+
     def stop(self):
         """停止调度器"""
         self.is_running = False
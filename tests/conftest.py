@@ -0,0 +1,18 @@
+"""
+pytest 共享配置
+
+在收集阶段一次性把项目根目录加入 sys.path，测试文件无需各自处理导入路径。
+共享的决策原型与模拟客户端在 tests/helpers.py 中，测试文件统一从 tests.helpers 导入。
+"""
+
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from tests.helpers import BUY_DECISION, fake_exchange, fake_info  # noqa: E402,F401
+
+# test_basic.py 是手动运行的冒烟脚本，导入时即执行并可能 sys.exit(1)，不作为 pytest 用例收集
+collect_ignore = ["test_basic.py"]
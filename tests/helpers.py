@@ -0,0 +1,86 @@
+"""
+测试共享的数据原型与模拟客户端
+
+各测试文件从这里导入，变体通过 dataclasses.replace 派生；工厂函数每次返回新的模拟对象。
+"""
+
+from unittest.mock import MagicMock
+
+from models.trading_decision import TradingDecision
+
+# 共享的买入决策原型（被测代码不会修改决策对象）
+BUY_DECISION = TradingDecision(
+    action="BUY",
+    confidence=80,
+    symbol="BTCUSDT",
+    entry_price=50000,
+    position_size=10.0,
+    risk_level="MEDIUM",
+    risk_score=50,
+    model_source="test",
+    timeframe="4h"
+)
+
+
+def fake_exchange() -> MagicMock:
+    """构造返回固定数据的模拟交易所"""
+    exchange = MagicMock()
+    exchange.fetch_ticker.return_value = {'last': 50000.0}
+    exchange.fetch_tickers.return_value = {
+        'BTC/USDT': {'symbol': 'BTC/USDT', 'last': 50000.0, 'info': {'symbol': 'BTCUSDT'}}
+    }
+    exchange.fetch_balance.return_value = {
+        'total': {'USDT': 5000.0, 'BTC': 0.05, 'ETH': 0.0}
+    }
+    exchange.load_markets.return_value = {
+        'BTC/USDT': {
+            'id': 'BTCUSDT', 'base': 'BTC', 'quote': 'USDT', 'type': 'spot',
+            'precision': {'amount': 0.00001, 'price': 0.01},
+        },
+        'BTC/USDT:USDT': {
+            'id': 'BTCUSDT', 'base': 'BTC', 'quote': 'USDT', 'type': 'swap',
+            'precision': {'amount': 0.001, 'price': 0.1},
+        },
+        'ETH/BTC': {'id': 'ETHBTC', 'base': 'ETH', 'quote': 'BTC'},
+    }
+    exchange.create_market_order.return_value = {
+        'id': 123,
+        'status': 'closed',
+        'filled': 0.01,
+        'average': 50000.0,
+        'fee': {'cost': 0.5}
+    }
+    return exchange
+
+
+def fake_info() -> MagicMock:
+    """构造返回固定数据的模拟 Info 客户端"""
+    info = MagicMock()
+    info.base_url = 'https://api.hyperliquid.xyz'
+    info.ws_manager = None
+    info.meta.return_value = {
+        'universe': [
+            {'name': 'BTC', 'szDecimals': 3},
+            {'name': 'ETH', 'szDecimals': 4}
+        ]
+    }
+    info.all_mids.return_value = {'BTC': '50000.0', 'ETH': '3000.0'}
+    info.user_state.return_value = {
+        'crossMarginSummary': {'accountValue': '10000.0'},
+        'withdrawable': '8000.0',
+        'assetPositions': [{
+            'position': {
+                'coin': 'BTC',
+                'szi': '0.1',
+                'entryPx': '48000.0',
+                'positionValue': '5000.0',
+                'unrealizedPnl': '200.0',
+                'leverage': {'value': 5}
+            }
+        }]
+    }
+    info.spot_user_state.return_value = {
+        'balances': [{'coin': 'USDC', 'total': '100.0'}, {'coin': 'HYPE', 'total': '0.0'}]
+    }
+    info.open_orders.return_value = [{'oid': 42, 'coin': 'BTC'}]
+    return info
@@ -168,6 +168,22 @@ class TestDatabase(unittest.TestCase):
         self.assertIsInstance(df, type(pd.DataFrame()))
         self.assertEqual(len(df), 2)
 
+    def test_in_memory_database(self):
+        """测试内存数据库跨方法调用保留数据"""
+        db = Database.in_memory()
+        try:
+            klines = [
+                [1640995200000, 100.0, 101.0, 99.0, 100.5, 1000.0, 1640995299999],
+            ]
+            db.insert_klines('BTCUSDT', klines, '3m')
+
+            data = db.get_latest_data('BTCUSDT')
+
+            self.assertIsNotNone(data)
+            self.assertEqual(data['symbol'], 'BTCUSDT')
+        finally:
+            db.close()
+
 
 if __name__ == '__main__':
     import pandas as pd
@@ -0,0 +1,347 @@
+"""
+Demo Trading 交易器测试
+
+使用模拟的 ccxt 交易所实例，不访问网络
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from collections import deque
+from dataclasses import replace
+from datetime import datetime
+from unittest.mock import patch
+
+import config
+from trading.demo_trader import DemoTrader
+from tests.helpers import BUY_DECISION, fake_exchange
+
+
+class _FakeProExchange:
+    """模拟 ccxt.pro 交易所：每次 watch 调用稍作等待后返回固定推送"""
+
+    def __init__(self, *args, **kwargs):
+        self.closed = False
+
+    def enable_demo_trading(self, enabled):
+        pass
+
+    async def watch_ticker(self, symbol):
+        await asyncio.sleep(0.01)
+        return {'symbol': symbol, 'last': 51000.0}
+
+    async def watch_balance(self):
+        await asyncio.sleep(0.01)
+        return {'total': {'USDT': 4000.0, 'BTC': 0.07, 'ETH': 0.0}}
+
+    async def close(self):
+        self.closed = True
+
+
+def _wait_until(predicate, timeout: float = 2.0) -> bool:
+    """轮询等待条件成立"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestDemoTrader(unittest.TestCase):
+    """Demo Trading 交易器测试"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.exchange = fake_exchange()
+
+        patchers = [
+            patch.object(config, 'DEMO_API_KEY', 'test-key', create=True),
+            patch.object(config, 'DEMO_SECRET_KEY', 'test-secret', create=True),
+            patch('trading.demo_trader.ccxt.binance', return_value=self.exchange),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.trader = DemoTrader(database_path=":memory:")
+        self.addCleanup(self.trader.close)
+
+    def _count(self, table: str) -> int:
+        """统计数据库表行数（先等待后台写库完成）"""
+        self.trader.flush()
+        return self.trader._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_missing_api_key(self):
+        """测试未配置 API Key"""
+        with patch.object(config, 'DEMO_API_KEY', ''):
+            with self.assertRaises(ValueError):
+                DemoTrader(database_path=":memory:")
+
+    def test_connectivity_check(self):
+        """测试初始化时用服务器时间接口测试连接，可跳过"""
+        self.exchange.fetch_time.assert_called_once()
+        self.exchange.fetch_ticker.assert_not_called()
+
+        self.exchange.fetch_time.reset_mock()
+        trader = DemoTrader(database_path=":memory:", skip_connectivity_check=True)
+        self.addCleanup(trader.close)
+        self.exchange.fetch_time.assert_not_called()
+
+    def test_connectivity_check_failure(self):
+        """测试连接失败时初始化报错"""
+        self.exchange.fetch_time.side_effect = Exception("network unreachable")
+        with self.assertRaises(Exception):
+            DemoTrader(database_path=":memory:")
+
+    def test_failed_init_releases_shared_client(self):
+        """测试连接测试之后的初始化步骤失败时，也归还共享客户端的引用"""
+        from trading import demo_trader
+
+        key = ('test-key', 'spot')
+        refs = demo_trader._SHARED_CLIENTS[key].refs
+        with patch('trading.demo_trader.sqlite3.connect', side_effect=sqlite3.OperationalError("disk I/O error")):
+            with self.assertRaises(sqlite3.OperationalError):
+                DemoTrader(database_path=":memory:")
+
+        self.assertEqual(demo_trader._SHARED_CLIENTS[key].refs, refs)
+
+    def test_http_session_pool(self):
+        """测试交易所会话挂载了连接池适配器"""
+        self.exchange.session.mount.assert_called_once()
+        prefix, adapter = self.exchange.session.mount.call_args[0]
+        self.assertEqual(prefix, 'https://')
+        self.assertEqual(adapter._pool_maxsize, 20)
+        self.assertEqual(adapter.max_retries.allowed_methods, frozenset({'GET'}))
+
+    def test_traders_share_client(self):
+        """测试同账户同类型的交易器共享客户端和令牌桶，最后一个关闭时释放会话"""
+        other = DemoTrader(database_path=":memory:")
+        futures = DemoTrader(database_path=":memory:", use_futures=True)
+        self.addCleanup(other.close)
+        self.addCleanup(futures.close)
+
+        self.assertIs(other.exchange, self.trader.exchange)
+        self.assertIs(other._bucket, self.trader._bucket)
+        self.assertIsNot(futures._bucket, self.trader._bucket)
+
+        other.close()
+        self.exchange.session.close.assert_not_called()
+        self.trader.close()
+        self.exchange.session.close.assert_called_once()
+
+    def test_place_market_order_saves_order(self):
+        """测试市价单写入数据库"""
+        result = self.trader.place_market_order('BTCUSDT', 'buy', 0.01, reason="test")
+
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['order_id'], '123')
+        self.assertEqual(self._count('orders'), 1)
+        self.assertEqual(self.trader.get_trades()[0]['order_id'], '123')
+
+    def test_async_market_order(self):
+        """测试异步下单立即返回客户端订单号，确认后更新订单并写库"""
+        result = self.trader.place_market_order('BTCUSDT', 'buy', 0.01, async_submit=True)
+
+        self.assertEqual(result['status'], 'submitted')
+        client_id = result['order_id']
+
+        self.assertTrue(self.trader.wait_for_orders(timeout=5))
+        self.exchange.create_market_order.assert_called_once_with(
+            'BTCUSDT', 'buy', 0.01, params={'newClientOrderId': client_id}
+        )
+        order = self.trader.get_trades()[-1]
+        self.assertEqual(order['order_id'], client_id)
+        self.assertEqual(order['status'], 'closed')
+        self.assertEqual(order['filled_price'], 50000.0)
+        self.assertEqual(self._count('orders'), 1)
+
+    def test_async_market_order_rejected(self):
+        """测试异步下单失败时订单标记为 rejected"""
+        self.exchange.create_market_order.side_effect = Exception("insufficient balance")
+
+        self.trader.place_market_order('BTCUSDT', 'buy', 0.01, async_submit=True)
+
+        self.assertTrue(self.trader.wait_for_orders(timeout=5))
+        self.assertEqual(self.trader.get_trades()[-1]['status'], 'rejected')
+
+    def test_async_market_order_after_close(self):
+        """测试关闭后异步下单返回错误，且不记录订单"""
+        self.trader.close()
+
+        result = self.trader.place_market_order('BTCUSDT', 'buy', 0.01, async_submit=True)
+
+        self.assertEqual(result['status'], 'error')
+        self.assertEqual(len(self.trader.orders), 0)
+        self.exchange.create_market_order.assert_not_called()
+
+    def test_background_writer_persists_all_orders(self):
+        """测试后台写库线程分批写入全部订单"""
+        self.exchange.create_market_order.side_effect = [
+            {'id': i, 'status': 'closed', 'filled': 0.01, 'average': 50000.0, 'fee': {'cost': 0.5}}
+            for i in range(250)
+        ]
+
+        for _ in range(250):
+            self.trader.place_market_order('BTCUSDT', 'buy', 0.01)
+
+        self.assertEqual(self._count('orders'), 250)
+
+    def test_orders_bounded_and_history_from_database(self):
+        """测试内存订单有上限，完整历史可从数据库查询"""
+        self.exchange.create_market_order.side_effect = [
+            {'id': i, 'status': 'closed', 'filled': 0.01, 'average': 50000.0, 'fee': {'cost': 0.5}}
+            for i in range(5)
+        ]
+        self.trader.orders = deque(maxlen=3)
+
+        for _ in range(5):
+            self.trader.place_market_order('BTCUSDT', 'buy', 0.01)
+
+        self.assertEqual([t['order_id'] for t in self.trader.get_trades(limit=2)], ['3', '4'])
+        self.assertEqual(len(self.trader.get_trades()), 3)
+
+        history = self.trader.get_order_history(limit=10, symbol='BTCUSDT')
+        self.assertEqual(len(history), 5)
+        self.assertEqual(self.trader.get_order_history(symbol='ETHUSDT'), [])
+
+    def test_close_flushes_and_is_idempotent(self):
+        """测试关闭时写完排队记录，重复关闭无副作用"""
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        trader = DemoTrader(database_path=path)
+
+        trader.place_market_order('BTCUSDT', 'buy', 0.01, async_submit=True)
+        trader.close()
+        trader.close()
+
+        with sqlite3.connect(path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0], 1)
+        self.assertFalse(trader._writer.is_alive())
+
+    def test_get_account_balance_saves_balances(self):
+        """测试获取余额时写入非零资产"""
+        balance = self.trader.get_account_balance()
+
+        self.assertEqual(balance, {'USDT': 5000.0, 'BTC': 0.05})
+        self.assertEqual(self._count('balances'), 2)
+
+    def test_balance_and_price_are_cached(self):
+        """测试余额/价格在有效期内复用，下单后余额缓存失效"""
+
+        self.trader.get_account_balance()
+        self.trader.get_account_balance()
+        self.trader.get_symbol_price('BTCUSDT')
+        self.trader.get_symbol_price('BTCUSDT')
+
+        self.assertEqual(self.exchange.fetch_balance.call_count, 1)
+        self.assertEqual(self.exchange.fetch_ticker.call_count, 1)
+
+        self.trader.place_market_order('BTCUSDT', 'buy', 0.01)
+        self.trader.get_account_balance()
+        self.assertEqual(self.exchange.fetch_balance.call_count, 2)
+
+    def test_websocket_feeds_price_and_balance(self):
+        """测试启用 WebSocket 后价格/余额来自推送，不再请求 REST"""
+        with patch('trading.demo_trader.ccxtpro') as ccxtpro:
+            ws_exchange = _FakeProExchange()
+            ccxtpro.binance.return_value = ws_exchange
+            trader = DemoTrader(database_path=":memory:", use_websocket=True)
+        self.addCleanup(trader.close)
+
+        # 首次读取订阅推送，并通过 REST 返回
+        self.assertEqual(trader.get_symbol_price('BTCUSDT'), 50000.0)
+        self.assertTrue(_wait_until(lambda: 'BTCUSDT' in trader._ws_tickers))
+        self.assertTrue(_wait_until(lambda: trader._ws_balance is not None))
+
+        self.assertEqual(trader.get_symbol_price('BTCUSDT'), 51000.0)
+        self.assertEqual(trader.get_account_balance(), {'USDT': 4000.0, 'BTC': 0.07})
+        self.assertEqual(self.exchange.fetch_ticker.call_count, 1)
+        self.exchange.fetch_balance.assert_not_called()
+
+        trader.close()
+        self.assertTrue(ws_exchange.closed)
+
+    def test_get_open_positions_batches_tickers(self):
+        """测试持仓价格通过一次 fetch_tickers 获取"""
+        positions = self.trader.get_open_positions()
+
+        self.assertEqual(len(positions), 1)
+        self.assertEqual(positions[0]['symbol'], 'BTCUSDT')
+        self.assertAlmostEqual(positions[0]['value'], 0.05 * 50000.0)
+        self.exchange.fetch_tickers.assert_called_once_with(['BTCUSDT'])
+
+    def test_order_info_to_dict_uses_current_timestamp(self):
+        """测试修改订单时间戳后 to_dict 返回新值，时间戳为空时返回 None"""
+        self.trader.place_market_order('BTCUSDT', 'buy', 0.01)
+        order = self.trader.orders[-1]
+
+        order.timestamp = datetime(2024, 1, 2, 3, 4, 5)
+
+        self.assertEqual(order.to_dict()['timestamp'], '2024-01-02T03:04:05')
+
+        order.timestamp = None
+        self.assertIsNone(order.to_dict()['timestamp'])
+
+    def test_base_asset(self):
+        """测试从交易对信息解析基础资产"""
+        self.assertEqual(self.trader._base_asset('BTCUSDT'), 'BTC')
+        self.assertEqual(self.trader._base_asset('ETHBTC'), 'ETH')
+        # 未知交易对按 USDT 计价处理
+        self.assertEqual(self.trader._base_asset('DOGEUSDT'), 'DOGE')
+        self.exchange.load_markets.assert_called_once()
+
+    def test_execute_buy_decision(self):
+        """测试执行买入决策"""
+        result = self.trader.execute_decision(BUY_DECISION)
+
+        self.assertEqual(result['status'], 'success')
+        # 10% 的 USDT 余额按当前价格换算为数量
+        self.exchange.create_market_order.assert_called_once_with('BTCUSDT', 'buy', 500.0 / 50000.0)
+
+    def test_execute_sell_uses_single_balance_lookup(self):
+        """测试卖出只查询一次余额，不拉取行情"""
+        decision = replace(BUY_DECISION, action="SELL", position_size=50.0)
+
+        result = self.trader.execute_decision(decision)
+
+        self.assertEqual(result['status'], 'success')
+        self.exchange.create_market_order.assert_called_once_with('BTCUSDT', 'sell', 0.025)
+        self.exchange.fetch_balance.assert_called_once()
+        self.exchange.fetch_ticker.assert_not_called()
+        self.exchange.fetch_tickers.assert_not_called()
+
+    def test_execute_sell_without_holding(self):
+        """测试无持仓时卖出返回错误"""
+        decision = replace(BUY_DECISION, action="SELL", symbol="ETHUSDT")
+
+        result = self.trader.execute_decision(decision)
+
+        self.assertEqual(result['status'], 'error')
+        self.exchange.create_market_order.assert_not_called()
+
+    def test_execute_buy_rounds_amount_to_lot_size(self):
+        """测试买入数量按交易对精度向下取整"""
+        self.exchange.fetch_balance.return_value = {'total': {'USDT': 1234.567}}
+
+        result = self.trader.execute_decision(BUY_DECISION)
+
+        self.assertEqual(result['status'], 'success')
+        # 123.4567 / 50000 = 0.002469134 -> 现货精度 0.00001
+        self.exchange.create_market_order.assert_called_once_with('BTCUSDT', 'buy', 0.00246)
+
+    def test_execute_buy_below_lot_size_not_sent(self):
+        """测试数量低于最小交易单位时不下单"""
+        self.exchange.fetch_balance.return_value = {'total': {'USDT': 0.1}}
+
+        result = self.trader.execute_decision(BUY_DECISION)
+
+        self.assertEqual(result['status'], 'error')
+        self.exchange.create_market_order.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
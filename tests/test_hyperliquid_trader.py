@@ -8,13 +8,24 @@ Hyperliquid交易器测试
 - 安全配置
 """
 
+import asyncio
+import sqlite3
+import tempfile
 import unittest
 import os
+import time
+from dataclasses import replace
+from datetime import datetime
 from unittest.mock import patch, MagicMock
 import sys
 sys.path.append('..')
 
 from trading.hyperliquid_trader import HyperliquidTrader
+from tests.helpers import BUY_DECISION, fake_info
+
+
+_AGENT_KEY = '0x' + '12' * 32
+_WALLET_ADDRESS = '0x' + 'ab' * 20
 
 
 class TestHyperliquidTrader(unittest.TestCase):
@@ -146,6 +157,422 @@ class TestHyperliquidTrader(unittest.TestCase):
             self.assertEqual(trader._round_price_to_sigfigs(0.00123456, 5), 0.0012346)
 
 
+class TestHyperliquidTraderOperations(unittest.TestCase):
+    """使用模拟 SDK 客户端测试交易器读写逻辑（不访问网络）"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.info = fake_info()
+        self.exchange = MagicMock()
+        self.exchange.order.return_value = {'oid': 7}
+
+        account = MagicMock()
+        account.from_key.return_value.address = '0x' + 'cd' * 20
+        patchers = [
+            patch('trading.hyperliquid_trader.Info', return_value=self.info),
+            patch('trading.hyperliquid_trader.Exchange', return_value=self.exchange),
+            patch('trading.hyperliquid_trader.Account', account, create=True),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.trader = HyperliquidTrader(
+            database_path=":memory:",
+            agent_private_key=_AGENT_KEY,
+            main_wallet_address=_WALLET_ADDRESS
+        )
+        self.addCleanup(self.trader.close)
+
+    def _count(self, table: str) -> int:
+        """统计数据库表行数"""
+        return self.trader._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_orders_and_balances_persisted(self):
+        """测试订单和余额写入同一个长连接数据库"""
+        result = self.trader.place_market_order('BTCUSDT', 'buy', 0.0123456)
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['amount'], 0.012)
+
+        balance = self.trader.get_account_balance()
+        self.assertEqual(balance['USDC'], 8100.0)
+
+        self.assertEqual(self._count('orders'), 1)
+        self.assertEqual(self._count('balances'), 2)
+
+    def test_sz_decimals_lookup(self):
+        """测试数量精度从预先生成的精度表读取"""
+        self.assertEqual(self.trader._get_sz_decimals('BTC'), 3)
+        self.assertEqual(self.trader._get_sz_decimals('ETH'), 4)
+        self.assertEqual(self.trader._get_sz_decimals('UNKNOWN'), 4)
+        self.assertEqual(self.trader._round_to_sz_decimals('BTC', 0.123456), 0.123)
+        self.info.meta.assert_called_once()
+
+    def test_orjson_response_parsing(self):
+        """测试共享会话的响应经 orjson 解析，解析失败仍抛出 ValueError"""
+        from requests.models import Response
+
+        response = Response()
+        response.status_code = 200
+        response._content = b'{"BTC": "50000.0", "sz": [1, 2]}'
+        for hook in self.trader._http.hooks['response']:
+            hook(response)
+        self.assertEqual(response.json(), {'BTC': '50000.0', 'sz': [1, 2]})
+
+        response._content = b'not json'
+        for hook in self.trader._http.hooks['response']:
+            hook(response)
+        with self.assertRaises(ValueError):
+            response.json()
+
+    def test_balance_persistence_throttled(self):
+        """测试余额未变化时不重复写库，决策路径读取余额不写库"""
+        with patch.object(self.trader, '_save_balances') as save:
+            self.trader.get_account_balance()
+            self.trader.get_account_balance()
+            self.assertEqual(save.call_count, 1)
+
+            self.info.user_state.return_value = dict(self.info.user_state.return_value, withdrawable='7000.0')
+            self.trader.get_account_balance()
+            self.assertEqual(save.call_count, 2)
+
+            self.trader.get_account_balance(persist=False)
+            self.assertEqual(save.call_count, 2)
+
+    def test_shared_http_session(self):
+        """测试 Info/Exchange（含 Exchange 内部的 Info）共用同一会话和连接池"""
+        session = self.trader._http
+        self.assertIs(self.info.session, session)
+        self.assertIs(self.exchange.session, session)
+        self.assertIs(self.exchange.info.session, session)
+
+        info_adapter = session.get_adapter('https://api.hyperliquid.xyz/info')
+        exchange_adapter = session.get_adapter('https://api.hyperliquid.xyz/exchange')
+        self.assertIs(info_adapter, exchange_adapter)
+        self.assertEqual(exchange_adapter.max_retries.total, 0)
+
+    def test_execute_buy_decision(self):
+        """测试买入决策：价格与余额并发获取，按 USDC 余额比例下单"""
+        decision = BUY_DECISION
+
+        with patch.object(self.trader, '_save_balances') as save:
+            result = self.trader.execute_decision(decision)
+        save.assert_not_called()
+
+        self.assertEqual(result['status'], 'success')
+        # 8100 USDC * 10% / 50000 = 0.0162 -> BTC 精度 3 位
+        self.assertEqual(result['amount'], 0.016)
+        self.info.user_state.assert_called_once_with(_WALLET_ADDRESS)
+        self.info.spot_user_state.assert_called_once_with(_WALLET_ADDRESS)
+
+    def test_execute_decision_async_submits_stop_loss_in_background(self):
+        """测试异步执行决策：下单后返回，止损单在后台提交，close 等待其完成"""
+        decision = replace(BUY_DECISION, stop_loss=48000, take_profit=55000)
+
+        def slow_trigger(**kwargs):
+            if 'trigger' in kwargs['order_type']:
+                time.sleep(0.2)
+            return {'oid': 7}
+        self.exchange.order.side_effect = slow_trigger
+
+        result = asyncio.run(self.trader.execute_decision_async(decision))
+
+        # 调用方的事件循环已结束，止损单仍在后台提交中；close 需等它完成
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(len(self.trader._stop_loss_futures), 1)
+        self.trader.close()
+
+        self.assertEqual(len(self.trader._stop_loss_futures), 0)
+        order_types = [call.kwargs['order_type'] for call in self.exchange.order.call_args_list]
+        self.assertEqual(len(order_types), 2)
+        self.assertIn('trigger', order_types[1])
+        self.assertEqual(self.trader.orders[-1].order_type, 'stop_loss')
+
+    def test_submit_decision_reuses_persistent_loop(self):
+        """测试同步提交决策复用同一个常驻事件循环，关闭时等待止损单完成"""
+        decision = replace(BUY_DECISION, stop_loss=48000, take_profit=55000)
+
+        result = self.trader.submit_decision(decision).result(timeout=5)
+        loop = self.trader._loop
+        self.assertEqual(self.trader._submit(asyncio.sleep(0, result='ok')), 'ok')
+
+        self.assertEqual(result['status'], 'success')
+        self.assertIs(self.trader._loop, loop)
+
+        self.trader.close()
+        self.assertTrue(loop.is_closed())
+        self.assertFalse(self.trader._loop_thread.is_alive())
+        order_types = [call.kwargs['order_type'] for call in self.exchange.order.call_args_list]
+        self.assertEqual(len(order_types), 2)
+        self.assertIn('trigger', order_types[1])
+
+    def test_close_waits_for_in_flight_submitted_decision(self):
+        """测试 close 等待常驻循环上尚未下完单的决策，其止损单也会提交"""
+        decision = replace(BUY_DECISION, stop_loss=48000, take_profit=55000)
+
+        def slow_order(**kwargs):
+            time.sleep(0.1)
+            return {'oid': 7}
+        self.exchange.order.side_effect = slow_order
+
+        future = self.trader.submit_decision(decision)
+        self.trader.close()
+
+        self.assertEqual(future.result(timeout=1)['status'], 'success')
+        order_types = [call.kwargs['order_type'] for call in self.exchange.order.call_args_list]
+        self.assertEqual(len(order_types), 2)
+        self.assertIn('trigger', order_types[1])
+
+    def test_all_mids_cached(self):
+        """测试有效期内多个币种的价格查询共用一次 all_mids 请求"""
+        self.assertEqual(self.trader.get_symbol_price('BTCUSDT'), 50000.0)
+        self.assertEqual(self.trader.get_symbol_price('ETHUSDT'), 3000.0)
+        self.info.all_mids.assert_called_once()
+
+        self.trader._mids_cache = (0.0, self.trader._mids_cache[1])  # 使缓存过期
+        self.trader.get_symbol_price('BTCUSDT')
+        self.assertEqual(self.info.all_mids.call_count, 2)
+
+    def test_websocket_pushes_replace_rest_polling(self):
+        """测试订阅推送后价格/持仓/挂单从内存读取，不再请求 REST"""
+        self.info.ws_manager = MagicMock()
+        trader = HyperliquidTrader(
+            database_path=":memory:",
+            agent_private_key=_AGENT_KEY,
+            main_wallet_address=_WALLET_ADDRESS,
+            use_websocket=True
+        )
+        self.addCleanup(trader.close)
+        callbacks = {call.args[0]['type']: call.args[1] for call in self.info.subscribe.call_args_list}
+
+        callbacks['allMids']({'channel': 'allMids', 'data': {'mids': {'BTC': '51000.0'}}})
+        callbacks['webData2']({'channel': 'webData2', 'data': {
+            'clearinghouseState': self.info.user_state.return_value,
+            'openOrders': [{'oid': 99, 'coin': 'BTC'}]
+        }})
+        self.info.user_state.reset_mock()
+
+        self.assertEqual(trader.get_symbol_price('BTCUSDT'), 51000.0)
+        self.assertEqual(trader.get_open_positions()[0]['positionAmt'], 0.1)
+        self.assertEqual(trader.get_order_status('BTCUSDT', '99')['status'], 'success')
+        self.assertEqual(trader.get_order_status('BTCUSDT', '42')['status'], 'error')
+        self.info.all_mids.assert_not_called()
+        self.info.user_state.assert_not_called()
+        self.info.open_orders.assert_not_called()
+
+        trader.close()
+        self.info.disconnect_websocket.assert_called_once()
+
+    def test_order_status_uses_indexed_open_orders(self):
+        """测试 REST 挂单按订单号索引并短时缓存，下单后失效"""
+        self.assertEqual(self.trader.get_order_status('BTCUSDT', '42')['status'], 'success')
+        self.assertEqual(self.trader.get_order_status('BTCUSDT', '43')['status'], 'error')
+        self.info.open_orders.assert_called_once_with(_WALLET_ADDRESS)
+
+        self.trader.place_limit_order('BTCUSDT', 'buy', 0.01, 45000.0)
+        self.trader.get_order_status('BTCUSDT', '7')
+        self.assertEqual(self.info.open_orders.call_count, 2)
+
+    def test_get_open_positions(self):
+        """测试持仓解析（列式数组组装为字典，跳过空仓）"""
+        state = self.info.user_state.return_value
+        state['assetPositions'].append({'position': {
+            'coin': 'ETH', 'szi': '-2.0', 'entryPx': None, 'positionValue': '6100.0',
+            'unrealizedPnl': '-100.0', 'leverage': None
+        }})
+        state['assetPositions'].append({'position': {
+            'coin': 'SOL', 'szi': '0.0', 'entryPx': '100.0', 'positionValue': '0.0',
+            'unrealizedPnl': '0.0', 'leverage': {'value': 3}
+        }})
+
+        positions = self.trader.get_open_positions()
+
+        self.assertEqual(positions, [
+            {'symbol': 'BTCUSDT', 'side': 'long', 'positionAmt': 0.1, 'entryPrice': 48000.0,
+             'markPrice': 50000.0, 'unRealizedProfit': 200.0, 'leverage': 5.0},
+            {'symbol': 'ETHUSDT', 'side': 'short', 'positionAmt': 2.0, 'entryPrice': 0.0,
+             'markPrice': 3050.0, 'unRealizedProfit': -100.0, 'leverage': 1.0},
+        ])
+
+    def test_round_to_sz_decimals_batch(self):
+        """测试批量数量舍入与逐个舍入结果一致"""
+        coins = ['BTC', 'ETH', 'BTC', 'UNKNOWN']
+        values = [0.123456, 0.123456, 1.0005, 2.123456]
+
+        rounded = self.trader._round_to_sz_decimals_batch(coins, values)
+
+        expected = [self.trader._round_to_sz_decimals(c, v) for c, v in zip(coins, values)]
+        self.assertEqual(rounded.tolist(), expected)
+
+    def test_round_price_to_sigfigs(self):
+        """测试价格按有效数字舍入"""
+        self.assertEqual(self.trader._round_price_to_sigfigs(1234.56789), 1234.6)
+        self.assertEqual(self.trader._round_price_to_sigfigs(0.00123456), 0.0012346)
+        self.assertEqual(self.trader._round_price_to_sigfigs(99999.7), 100000.0)
+        self.assertEqual(self.trader._round_price_to_sigfigs(0), 0)
+
+    def test_order_timestamp_stored_as_epoch_us(self):
+        """测试订单时间以纪元微秒整数保存"""
+        self.trader.place_market_order('BTCUSDT', 'buy', 0.01)
+
+        stored = self.trader._conn.execute("SELECT timestamp FROM orders").fetchone()[0]
+        self.assertIsInstance(stored, int)
+        self.assertEqual(stored, self.trader.orders[-1].timestamp // 1000)
+
+    def test_migrates_text_timestamps(self):
+        """测试旧版 ISO 字符串时间戳迁移为整数"""
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        placed_at = datetime(2024, 1, 2, 3, 4, 5, 678901)
+        with sqlite3.connect(path) as conn:
+            conn.execute('''
+                CREATE TABLE orders (
+                    order_id TEXT PRIMARY KEY, coin TEXT, side TEXT, size REAL, price REAL,
+                    order_type TEXT, status TEXT, timestamp TEXT, reduce_only BOOLEAN
+                )
+            ''')
+            conn.execute(
+                "INSERT INTO orders VALUES ('1', 'BTC', 'buy', 0.1, 50000, 'market', 'filled', ?, 0)",
+                (placed_at.isoformat(),)
+            )
+        conn.close()
+
+        trader = HyperliquidTrader(
+            database_path=path,
+            agent_private_key=_AGENT_KEY,
+            main_wallet_address=_WALLET_ADDRESS
+        )
+        self.addCleanup(trader.close)
+
+        stored = trader._conn.execute("SELECT timestamp FROM orders WHERE order_id = '1'").fetchone()[0]
+        # julianday 精度约为毫秒级
+        self.assertAlmostEqual(stored, placed_at.timestamp() * 1_000_000, delta=1000)
+
+    def test_symbol_conversion_cached(self):
+        """测试symbol转换使用模块级缓存"""
+        from trading import hyperliquid_trader
+
+        self.assertEqual(self.trader._convert_symbol_to_hyperliquid('SOLUSDT'), 'SOL')
+        self.assertEqual(self.trader._convert_symbol_to_hyperliquid('SOL'), 'SOL')
+        self.assertEqual(self.trader._convert_symbol_from_hyperliquid('SOL'), 'SOLUSDT')
+
+        hits = hyperliquid_trader._convert_symbol_to_hyperliquid.cache_info().hits
+        self.trader._convert_symbol_to_hyperliquid('SOLUSDT')
+        self.assertEqual(hyperliquid_trader._convert_symbol_to_hyperliquid.cache_info().hits, hits + 1)
+
+    def test_get_trades_matches_order_info_dict(self):
+        """测试 get_trades 直接构造的字典与 OrderInfo.to_dict 一致"""
+        self.trader.place_market_order('BTCUSDT', 'buy', 0.01)
+
+        trades = self.trader.get_trades()
+
+        self.assertEqual(trades, [self.trader.orders[-1].to_order_info().to_dict()])
+        self.assertEqual(trades[0]['symbol'], 'BTCUSDT')
+
+    def test_order_timestamp_ns(self):
+        """测试订单时间戳为纳秒整数，转换时才构造 datetime"""
+        before = time.time_ns()
+        self.trader.place_market_order('BTCUSDT', 'buy', 0.01)
+        order = self.trader.orders[-1]
+
+        self.assertIsInstance(order.timestamp, int)
+        self.assertGreaterEqual(order.timestamp, before)
+        self.assertEqual(order.to_order_info().timestamp, order.timestamp_dt)
+        self.assertIsInstance(order.timestamp_dt, datetime)
+
+    def test_identical_stop_loss_not_resubmitted(self):
+        """测试止损单仍挂着时相同止损不重复提交，平仓后重新提交"""
+        self.info.open_orders.return_value = [{'oid': 7, 'coin': 'BTC'}]
+
+        first = self.trader.set_stop_loss('BTCUSDT', 'long', 0.1, 48000)
+        second = self.trader.set_stop_loss('BTCUSDT', 'long', 0.1, 48000)
+
+        self.assertEqual(first['status'], 'success')
+        self.assertNotIn('cached', first)
+        self.assertEqual(second['status'], 'success')
+        self.assertTrue(second['cached'])
+        self.assertEqual(self.exchange.order.call_count, 1)
+
+        # 止损价变化时重新提交
+        self.trader.set_stop_loss('BTCUSDT', 'long', 0.1, 47000)
+        self.assertEqual(self.exchange.order.call_count, 2)
+
+        # 卖出平仓后缓存失效
+        self.trader.place_market_order('BTCUSDT', 'sell', 0.1)
+        self.trader.set_stop_loss('BTCUSDT', 'long', 0.1, 47000)
+        self.assertEqual(self.exchange.order.call_count, 4)
+
+    def test_triggered_stop_loss_is_resubmitted(self):
+        """测试止损单已触发（不在挂单中）时，相同止损重新提交"""
+        self.info.open_orders.return_value = [{'oid': 7, 'coin': 'BTC'}]
+        self.trader.set_stop_loss('BTCUSDT', 'long', 0.1, 48000)
+
+        # 止损在交易所触发，挂单中不再有该止损单
+        self.info.open_orders.return_value = []
+        self.trader._invalidate_open_orders()
+        result = self.trader.set_stop_loss('BTCUSDT', 'long', 0.1, 48000)
+
+        self.assertNotIn('cached', result)
+        self.assertEqual(self.exchange.order.call_count, 2)
+
+    def test_stop_loss_resubmitted_when_position_changes(self):
+        """测试总持仓变化（如外部成交）后相同止损重新提交"""
+        self.info.open_orders.return_value = [{'oid': 7, 'coin': 'BTC'}]
+        self.trader.set_stop_loss('BTCUSDT', 'long', 0.1, 48000)
+
+        self.info.user_state.return_value['assetPositions'][0]['position']['szi'] = '0.2'
+        result = self.trader.set_stop_loss('BTCUSDT', 'long', 0.1, 48000)
+
+        self.assertNotIn('cached', result)
+        self.assertEqual(self.exchange.order.call_count, 2)
+
+    def test_identical_buys_each_get_stop_loss(self):
+        """测试两次相同的买入决策各自提交止损单"""
+        self.info.open_orders.return_value = [{'oid': 7, 'coin': 'BTC'}]
+        decision = replace(BUY_DECISION, stop_loss=48000, take_profit=55000)
+
+        self.trader.execute_decision(decision)
+        self.trader.execute_decision(decision)
+
+        order_types = [call.kwargs['order_type'] for call in self.exchange.order.call_args_list]
+        self.assertEqual(len(order_types), 4)
+        self.assertIn('trigger', order_types[1])
+        self.assertIn('trigger', order_types[3])
+
+    def test_order_window_bounded_and_history_queryable(self):
+        """测试内存订单窗口有上限，完整历史可从数据库查询"""
+        from trading import hyperliquid_trader
+
+        with patch.object(hyperliquid_trader, '_ORDER_HISTORY_SIZE', 3):
+            trader = HyperliquidTrader(
+                database_path=":memory:",
+                agent_private_key=_AGENT_KEY,
+                main_wallet_address=_WALLET_ADDRESS
+            )
+        self.addCleanup(trader.close)
+
+        for i in range(4):
+            self.exchange.order.return_value = {'oid': i}
+            trader.place_market_order('BTCUSDT', 'buy', 0.01)
+        self.exchange.order.return_value = {'oid': 4}
+        trader.place_market_order('ETHUSDT', 'buy', 0.1)
+
+        self.assertEqual(len(trader.orders), 3)
+        self.assertEqual([t['order_id'] for t in trader.get_trades(limit=2)], ['3', '4'])
+
+        history = trader.get_order_history(limit=10)
+        self.assertEqual(len(history), 5)
+        self.assertEqual(history[0]['coin'], 'ETH')
+        btc_history = trader.get_order_history(limit=2, symbol='BTCUSDT')
+        self.assertEqual([row['order_id'] for row in btc_history], ['3', '2'])
+
+    def test_close_is_idempotent(self):
+        """测试重复关闭"""
+        self.trader.close()
+        self.trader.close()
+
+
 class TestHyperliquidIntegration(unittest.TestCase):
     """Hyperliquid集成测试（需要真实API密钥）"""
 
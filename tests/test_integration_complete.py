@@ -5,11 +5,13 @@
 """
 
 import unittest
-import tempfile
-import os
+from dataclasses import replace
 from datetime import datetime
 from unittest.mock import Mock, patch, MagicMock
 
+import numpy as np
+import pandas as pd
+
 from data_fetcher import DataFetcher
 from database import Database
 from indicators import TechnicalIndicators
@@ -26,24 +28,46 @@ from risk_management.backtest_engine import BacktestEngine, BacktestConfig
 from monitoring.performance_monitor import PerformanceMonitor
 
 
+# 平盘K线的一行 OHLCV 值
+_FLAT_OHLCV_ROW = np.array([50000, 50500, 49500, 50000, 100], dtype=np.float64)
+_OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# 测试共用的时间索引（DatetimeIndex 不可变，可安全共享）
+_DATES_3M = pd.date_range(start='2024-01-01', end='2024-01-10', freq='3T')
+_DATES_4H = pd.date_range(start='2024-01-01', end='2024-01-10', freq='4H')
+
+
+def _flat_ohlcv(index: pd.DatetimeIndex) -> pd.DataFrame:
+    """构造每行相同的平盘K线（零拷贝广播视图，只读）"""
+    values = np.broadcast_to(_FLAT_OHLCV_ROW, (len(index), len(_OHLCV_COLUMNS)))
+    return pd.DataFrame(values, columns=_OHLCV_COLUMNS, index=index, copy=False)
+
+
 class TestCompleteSystemIntegration(unittest.TestCase):
     """完整系统集成测试"""
 
-    def setUp(self):
-        """测试前准备"""
-        self.temp_dir = tempfile.mkdtemp()
-        self.temp_db = os.path.join(self.temp_dir, "test_integration.db")
-
-    def tearDown(self):
-        """测试后清理"""
-        import shutil
-        if os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
+    @classmethod
+    def setUpClass(cls):
+        """构建只读的配置模板，供多个测试共享"""
+        cls._risk_manager_tmpl = RiskManager(
+            account_balance=100000,
+            max_position_size=0.1,
+            max_leverage=10.0
+        )
+        cls._paper_trader_tmpl = PaperTrader(
+            initial_balance=100000,
+            fee_rate=0.001
+        )
+        cls._backtest_config_tmpl = BacktestConfig(
+            initial_balance=100000,
+            max_position_size=0.1,
+            max_leverage=10.0
+        )
 
     def test_data_pipeline_integration(self):
         """测试数据管道集成"""
         # 1. 初始化数据库
-        db = Database(self.temp_db)
+        db = Database.in_memory()
 
         # 2. 模拟数据获取
         fetcher = DataFetcher()
@@ -150,18 +174,8 @@ class TestCompleteSystemIntegration(unittest.TestCase):
 
         engine = BacktestEngine(config)
 
-        # 创建简单的市场数据
-        import pandas as pd
-        dates = pd.date_range(start='2024-01-01', end='2024-01-10', freq='3T')
-        market_data = {
-            'BTCUSDT': pd.DataFrame({
-                'open': [50000] * len(dates),
-                'high': [50500] * len(dates),
-                'low': [49500] * len(dates),
-                'close': [50000] * len(dates),
-                'volume': [100] * len(dates)
-            }, index=dates)
-        }
+        # 创建简单的市场数据（回测只读取，不修改）
+        market_data = {'BTCUSDT': _flat_ohlcv(_DATES_3M)}
 
         # 简单策略函数
         def simple_strategy(symbol, data, market_snapshot):
@@ -183,7 +197,7 @@ class TestCompleteSystemIntegration(unittest.TestCase):
 
     def test_performance_monitor_integration(self):
         """测试性能监控器集成"""
-        monitor = PerformanceMonitor(database_path=os.path.join(self.temp_dir, "monitor.db"))
+        monitor = PerformanceMonitor(database_path=":memory:")
         paper_trader = PaperTrader(initial_balance=100000)
 
         # 记录交易指标
@@ -304,9 +318,8 @@ class TestCompleteSystemIntegration(unittest.TestCase):
         preprocessor = MultiTimeframeProcessor()
 
         # 模拟市场数据
-        import pandas as pd
-        dates_4h = pd.date_range(start='2024-01-01', end='2024-01-10', freq='4H')
-        dates_3m = pd.date_range(start='2024-01-01', end='2024-01-10', freq='3T')
+        dates_4h = _DATES_4H
+        dates_3m = _DATES_3M
 
         data_4h = pd.DataFrame({
             'open': [50000] * len(dates_4h),
@@ -351,7 +364,7 @@ class TestCompleteSystemIntegration(unittest.TestCase):
         paper_trader = PaperTrader(initial_balance=100000)
 
         # 6. 性能监控
-        monitor = PerformanceMonitor(database_path=os.path.join(self.temp_dir, "workflow.db"))
+        monitor = PerformanceMonitor(database_path=":memory:")
 
         # 创建交易决策
         decision = TradingDecision(
@@ -446,36 +459,26 @@ class TestCompleteSystemIntegration(unittest.TestCase):
     def test_configuration_consistency(self):
         """测试配置一致性"""
         # 验证所有模块使用相同的配置参数
+        risk_manager = self._risk_manager_tmpl
+        config = self._backtest_config_tmpl
 
         # 检查风险管理配置
-        risk_manager = RiskManager(
-            account_balance=100000,
-            max_position_size=0.1,
-            max_leverage=10.0
-        )
-
         self.assertEqual(risk_manager.max_position_size, 0.1)
         self.assertEqual(risk_manager.max_leverage, 10.0)
 
         # 检查纸交易配置
-        paper_trader = PaperTrader(
-            initial_balance=100000,
-            fee_rate=0.001
-        )
+        self.assertEqual(self._paper_trader_tmpl.initial_balance, 100000)
 
-        self.assertEqual(paper_trader.initial_balance, 100000)
+        # 检查回测配置与风险管理一致
+        self.assertEqual(config.max_position_size, risk_manager.max_position_size)
+        self.assertEqual(config.max_leverage, risk_manager.max_leverage)
 
-        # 检查回测配置
-        config = BacktestConfig(
-            initial_balance=100000,
-            max_position_size=0.1,
-            max_leverage=10.0
-        )
-
-        self.assertEqual(config.max_position_size, 0.1)
+        # 变体配置只替换指定字段
+        variant = replace(config, max_leverage=5.0)
+        self.assertEqual(variant.max_leverage, 5.0)
+        self.assertEqual(variant.max_position_size, config.max_position_size)
         self.assertEqual(config.max_leverage, 10.0)
 
-
 if __name__ == '__main__':
     # 运行集成测试
     suite = unittest.TestLoader().loadTestsFromTestCase(TestCompleteSystemIntegration)
@@ -6,9 +6,10 @@ LLM客户端测试
 
 import unittest
 import json
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import patch, MagicMock
 import sys
 import os
+from types import SimpleNamespace
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -19,6 +20,11 @@ from llm_clients.qwen_client import QwenClient
 from llm_clients.llm_factory import LLMClientFactory
 
 
+def _stub_response(payload):
+    """构造轻量HTTP响应桩（无需断言调用参数时替代 Mock）"""
+    return SimpleNamespace(json=lambda: payload, raise_for_status=lambda: None)
+
+
 class TestTradingDecision(unittest.TestCase):
     """交易决策模型测试"""
 
@@ -135,8 +141,7 @@ class TestDeepSeekClient(unittest.TestCase):
     def test_get_decision_success(self, mock_session):
         """测试获取决策成功"""
         # 模拟响应
-        mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response = _stub_response({
             'choices': [{
                 'message': {
                     'content': json.dumps({
@@ -158,8 +163,7 @@ class TestDeepSeekClient(unittest.TestCase):
                 'completion_tokens': 50,
                 'total_tokens': 150
             }
-        }
-        mock_response.raise_for_status = Mock()
+        })
 
         mock_session.return_value.post.return_value = mock_response
 
@@ -174,12 +178,10 @@ class TestDeepSeekClient(unittest.TestCase):
     @patch('requests.Session')
     def test_extract_json_valid(self, mock_session):
         """测试JSON提取-有效JSON"""
-        mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response = _stub_response({
             'choices': [{'message': {'content': '{"action": "BUY", "confidence": 80, "reasoning": "test", "position_size": 10, "risk_level": "MEDIUM", "risk_score": 50, "timeframe": "4h"}'}}],
             'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15}
-        }
-        mock_response.raise_for_status = Mock()
+        })
         mock_session.return_value.post.return_value = mock_response
 
         decision, _ = self.client.get_decision("测试")
@@ -188,16 +190,14 @@ class TestDeepSeekClient(unittest.TestCase):
     @patch('requests.Session')
     def test_extract_json_code_block(self, mock_session):
         """测试JSON提取-代码块"""
-        mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response = _stub_response({
             'choices': [{
                 'message': {
                     'content': '```json\n{"action": "SELL", "confidence": 70, "reasoning": "test", "position_size": 10, "risk_level": "MEDIUM", "risk_score": 50, "timeframe": "4h"}\n```'
                 }
             }],
             'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15}
-        }
-        mock_response.raise_for_status = Mock()
+        })
         mock_session.return_value.post.return_value = mock_response
 
         decision, _ = self.client.get_decision("测试")
@@ -206,16 +206,14 @@ class TestDeepSeekClient(unittest.TestCase):
     @patch('requests.Session')
     def test_extract_json_fallback(self, mock_session):
         """测试JSON提取-回退"""
-        mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response = _stub_response({
             'choices': [{
                 'message': {
                     'content': '无效的JSON内容'
                 }
             }],
             'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15}
-        }
-        mock_response.raise_for_status = Mock()
+        })
         mock_session.return_value.post.return_value = mock_response
 
         decision, _ = self.client.get_decision("测试")
@@ -248,8 +246,7 @@ class TestQwenClient(unittest.TestCase):
     def test_get_decision_success(self, mock_session):
         """测试获取决策成功"""
         # 模拟响应
-        mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response = _stub_response({
             'output': {
                 'text': json.dumps({
                     'action': 'SELL',
@@ -268,8 +265,7 @@ class TestQwenClient(unittest.TestCase):
                 'input_tokens': 100,
                 'output_tokens': 50
             }
-        }
-        mock_response.raise_for_status = Mock()
+        })
 
         mock_session.return_value.post.return_value = mock_response
 
@@ -5,92 +5,118 @@
 import unittest
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from unittest.mock import Mock, patch
-import sys
-import os
+from unittest.mock import patch
 
-# 添加项目根目录到路径
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 模拟K线的随机种子；每次构建使用独立的 Generator，不改动全局随机状态
+_KLINES_SEED = 42
 
-from multi_timeframe_preprocessor import MultiTimeframeProcessor
-from database import Database
+# 固定的样本结束时间，使样本数据与墙钟无关、可重复
+_NOW = pd.Timestamp('2024-01-01 00:00:00')
+
+# 时间框架 -> 时间索引间隔
+_KLINE_FREQ = {'3m': '3min', '4h': '4h', '1h': '1h'}
+
+
+def _build_klines(timeframe: str, count: int = 100, seed: int = _KLINES_SEED) -> pd.DataFrame:
+    """创建模拟K线数据"""
+    rng = np.random.default_rng(seed)
+    base_price = 50000
+
+    # 随机游走：每根K线以上一根收盘价为基准开盘
+    open_noise = rng.normal(0, 100, count)
+    close_noise = rng.normal(0, 30, count)
+    close_prices = base_price + np.cumsum(open_noise + close_noise)
+    open_prices = close_prices - close_noise
+    high_prices = open_prices + np.abs(rng.normal(0, 50, count))
+    low_prices = open_prices - np.abs(rng.normal(0, 50, count))
+    volumes = rng.uniform(100, 1000, count)
+
+    timestamps = pd.date_range(end=_NOW, periods=count, freq=_KLINE_FREQ.get(timeframe, '1h'))
+
+    df = pd.DataFrame({
+        'timestamp': timestamps,
+        'open': open_prices,
+        'high': high_prices,
+        'low': low_prices,
+        'close': close_prices,
+        'volume': volumes
+    }, copy=False)
+
+    return df
+
+
+# 多数测试只需要形状合法的K线数据，共用模块级样本（只读）
+_DF_4H_50 = _build_klines('4h', 50)
+_DF_3M_50 = _build_klines('3m', 50)
+_FRAMES = {'4h_50': _DF_4H_50, '3m_50': _DF_3M_50}
 
 
 class TestMultiTimeframeProcessor(unittest.TestCase):
     """多时间框架处理器测试"""
 
-    def setUp(self):
-        """测试前准备"""
-        self.processor = MultiTimeframeProcessor()
-        self.test_symbol = 'BTCUSDT'
-
-    def tearDown(self):
-        """测试后清理"""
-        self.processor.close()
-
-    def _create_sample_klines(self, timeframe: str, count: int = 100) -> pd.DataFrame:
-        """创建模拟K线数据"""
-        np.random.seed(42)
-        base_price = 50000
-        data = []
-
-        for i in range(count):
-            # 生成模拟OHLCV数据
-            open_price = base_price + np.random.normal(0, 100)
-            high_price = open_price + abs(np.random.normal(0, 50))
-            low_price = open_price - abs(np.random.normal(0, 50))
-            close_price = open_price + np.random.normal(0, 30)
-            volume = np.random.uniform(100, 1000)
-
-            timestamp = datetime.now() - timedelta(hours=count-i)
-
-            data.append({
-                'timestamp': timestamp,
-                'open': open_price,
-                'high': high_price,
-                'low': low_price,
-                'close': close_price,
-                'volume': volume
-            })
-
-            base_price = close_price
-
-        df = pd.DataFrame(data)
-        if timeframe == '3m':
-            df['timestamp'] = datetime.now() - timedelta(minutes=3*count)
-        elif timeframe == '4h':
-            df['timestamp'] = datetime.now() - timedelta(hours=4*count)
-
-        return df
-
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_process_4h_data_success(self, mock_db):
+    @classmethod
+    def setUpClass(cls):
+        """测试类准备：共享处理器（使用模拟数据库）和K线缓存"""
+        # 延迟导入，只运行其他测试文件时不加载处理器及数据库依赖
+        from multi_timeframe_preprocessor import MultiTimeframeProcessor
+        cls.MultiTimeframeProcessor = MultiTimeframeProcessor
+
+        with patch('multi_timeframe_preprocessor.Database'):
+            cls.processor = MultiTimeframeProcessor()
+        cls.mock_db = cls.processor.db
+        cls.test_symbol = 'BTCUSDT'
+
+        # 样本数据由固定种子生成，可在测试间复用
+        cls._klines_cache = {}
+
+        # 特征计算结果被多个测试共用，按 (方法, 样本) 只计算一次
+        cls._feature_cache = {}
+        cls._trend_4h = cls._feature('_analyze_trend_4h', '4h_50')
+        cls._momentum_4h = cls._feature('_calculate_long_momentum', '4h_50')
+
+    @classmethod
+    def tearDownClass(cls):
+        """测试类清理"""
+        cls.processor.close()
+
+    @classmethod
+    def _get_klines(cls, timeframe: str, count: int = 100) -> pd.DataFrame:
+        """获取缓存的模拟K线数据（直接共享，调用方只读）"""
+        key = (timeframe, count)
+        if key not in cls._klines_cache:
+            cls._klines_cache[key] = _build_klines(timeframe, count)
+        return cls._klines_cache[key]
+
+    @classmethod
+    def _feature(cls, method: str, frame: str) -> dict:
+        """获取缓存的特征计算结果（样本只读，结果可复用）"""
+        key = (method, frame)
+        if key not in cls._feature_cache:
+            cls._feature_cache[key] = getattr(cls.processor, method)(_FRAMES[frame])
+        return cls._feature_cache[key]
+
+    def test_process_4h_data_success(self):
         """测试4小时数据处理成功"""
         # 模拟数据库返回
-        mock_db.return_value.get_klines.return_value = self._create_sample_klines('4h', 100)
+        self.mock_db.get_klines.return_value = self._get_klines('4h', 100)
 
         result = self.processor.process_4h_data(self.test_symbol)
 
         # 验证基本结构
         self.assertEqual(result['symbol'], self.test_symbol)
         self.assertEqual(result['timeframe'], '4h')
-        self.assertIn('current_price', result)
-        self.assertIn('trend', result)
-        self.assertIn('momentum', result)
-        self.assertIn('support_resistance', result)
-        self.assertIn('description', result)
+        self.assertLessEqual({
+            'current_price', 'trend', 'momentum', 'support_resistance', 'description'
+        }, result.keys())
 
         # 验证趋势结构
         trend = result['trend']
-        self.assertIn('direction', trend)
-        self.assertIn('strength', trend)
-        self.assertIn('price_change_24h', trend)
+        self.assertLessEqual({'direction', 'strength', 'price_change_24h'}, trend.keys())
 
     def test_process_4h_data_empty(self):
         """测试4小时数据为空"""
         # 使用真实的Database类，但传入不存在的符号
-        processor = MultiTimeframeProcessor()
+        processor = self.MultiTimeframeProcessor()
         result = processor.process_4h_data('NONEXISTENT')
 
         self.assertEqual(result['symbol'], 'NONEXISTENT')
@@ -98,40 +124,31 @@ class TestMultiTimeframeProcessor(unittest.TestCase):
         self.assertIn('error', result)
         processor.close()
 
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_process_3m_data_success(self, mock_db):
+    def test_process_3m_data_success(self):
         """测试3分钟数据处理成功"""
-        mock_db.return_value.get_klines.return_value = self._create_sample_klines('3m', 200)
+        self.mock_db.get_klines.return_value = self._get_klines('3m', 200)
 
         result = self.processor.process_3m_data(self.test_symbol)
 
         # 验证基本结构
         self.assertEqual(result['symbol'], self.test_symbol)
         self.assertEqual(result['timeframe'], '3m')
-        self.assertIn('current_price', result)
-        self.assertIn('momentum', result)
-        self.assertIn('breakout', result)
-        self.assertIn('oversold_overbought', result)
-        self.assertIn('description', result)
+        self.assertLessEqual({
+            'current_price', 'momentum', 'breakout', 'oversold_overbought', 'description'
+        }, result.keys())
 
         # 验证动量结构
         momentum = result['momentum']
-        self.assertIn('rsi_7', momentum)
-        self.assertIn('momentum_5m', momentum)
-        self.assertIn('momentum_direction', momentum)
+        self.assertLessEqual({'rsi_7', 'momentum_5m', 'momentum_direction'}, momentum.keys())
 
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_analyze_trend_4h(self, mock_db):
+    def test_analyze_trend_4h(self):
         """测试4小时趋势分析"""
-        df = self._create_sample_klines('4h', 50)
-        trend = self.processor._analyze_trend_4h(df)
+        trend = self._trend_4h
 
-        self.assertIn('direction', trend)
-        self.assertIn('strength', trend)
-        self.assertIn('sma_20', trend)
-        self.assertIn('sma_50', trend)
-        self.assertIn('position_vs_sma20', trend)
-        self.assertIn('position_vs_sma50', trend)
+        self.assertLessEqual({
+            'direction', 'strength', 'sma_20', 'sma_50', 'position_vs_sma20',
+            'position_vs_sma50'
+        }, trend.keys())
 
         # 验证趋势方向枚举
         valid_directions = ['STRONG_UP', 'UP', 'STRONG_DOWN', 'DOWN', 'SIDEWAYS']
@@ -141,16 +158,14 @@ class TestMultiTimeframeProcessor(unittest.TestCase):
         valid_strengths = ['STRONG', 'MEDIUM', 'WEAK']
         self.assertIn(trend['strength'], valid_strengths)
 
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_find_support_resistance(self, mock_db):
+    def test_find_support_resistance(self):
         """测试支撑阻力位检测"""
-        df = self._create_sample_klines('4h', 50)
-        sr = self.processor._find_support_resistance(df)
+        sr = self._feature('_find_support_resistance', '4h_50')
 
-        self.assertIn('nearest_resistance', sr)
-        self.assertIn('nearest_support', sr)
-        self.assertIn('resistance_distance_pct', sr)
-        self.assertIn('support_distance_pct', sr)
+        self.assertLessEqual({
+            'nearest_resistance', 'nearest_support', 'resistance_distance_pct',
+            'support_distance_pct'
+        }, sr.keys())
 
         # 如果找到支撑/阻力位，应为数值类型
         if sr['nearest_resistance'] is not None:
@@ -158,17 +173,13 @@ class TestMultiTimeframeProcessor(unittest.TestCase):
         if sr['nearest_support'] is not None:
             self.assertIsInstance(sr['nearest_support'], (int, float))
 
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_calculate_long_momentum(self, mock_db):
+    def test_calculate_long_momentum(self):
         """测试长期动量计算"""
-        df = self._create_sample_klines('4h', 50)
-        momentum = self.processor._calculate_long_momentum(df)
+        momentum = self._momentum_4h
 
-        self.assertIn('rsi', momentum)
-        self.assertIn('macd', momentum)
-        self.assertIn('macd_signal', momentum)
-        self.assertIn('momentum_direction', momentum)
-        self.assertIn('rsi_signal', momentum)
+        self.assertLessEqual({
+            'rsi', 'macd', 'macd_signal', 'momentum_direction', 'rsi_signal'
+        }, momentum.keys())
 
         # 验证RSI在合理范围
         if momentum['rsi'] is not None:
@@ -179,17 +190,13 @@ class TestMultiTimeframeProcessor(unittest.TestCase):
         valid_momentum = ['OVERBOUGHT', 'OVERSOLD', 'POSITIVE', 'NEGATIVE']
         self.assertIn(momentum['momentum_direction'], valid_momentum)
 
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_analyze_momentum_3m(self, mock_db):
+    def test_analyze_momentum_3m(self):
         """测试3分钟动量分析"""
-        df = self._create_sample_klines('3m', 50)
-        momentum = self.processor._analyze_momentum_3m(df)
+        momentum = self._feature('_analyze_momentum_3m', '3m_50')
 
-        self.assertIn('rsi_7', momentum)
-        self.assertIn('momentum_5m', momentum)
-        self.assertIn('momentum_20m', momentum)
-        self.assertIn('momentum_direction', momentum)
-        self.assertIn('momentum_strength', momentum)
+        self.assertLessEqual({
+            'rsi_7', 'momentum_5m', 'momentum_20m', 'momentum_direction', 'momentum_strength'
+        }, momentum.keys())
 
         # 验证动量强度
         valid_strengths = ['STRONG', 'MEDIUM', 'WEAK']
@@ -198,17 +205,14 @@ class TestMultiTimeframeProcessor(unittest.TestCase):
         # 验证方向
         self.assertIn(momentum['momentum_direction'], ['UP', 'DOWN'])
 
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_detect_breakout(self, mock_db):
+    def test_detect_breakout(self):
         """测试突破检测"""
-        df = self._create_sample_klines('3m', 50)
-        breakout = self.processor._detect_breakout(df)
+        breakout = self._feature('_detect_breakout', '3m_50')
 
-        self.assertIn('is_upside_breakout', breakout)
-        self.assertIn('is_downside_breakout', breakout)
-        self.assertIn('resistance_level', breakout)
-        self.assertIn('support_level', breakout)
-        self.assertIn('breakout_strength', breakout)
+        self.assertLessEqual({
+            'is_upside_breakout', 'is_downside_breakout', 'resistance_level', 'support_level',
+            'breakout_strength'
+        }, breakout.keys())
 
         # 验证布尔值
         self.assertIsInstance(breakout['is_upside_breakout'], bool)
@@ -218,16 +222,13 @@ class TestMultiTimeframeProcessor(unittest.TestCase):
         if breakout['is_upside_breakout']:
             self.assertFalse(breakout['is_downside_breakout'])
 
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_calculate_oversold_overbought(self, mock_db):
+    def test_calculate_oversold_overbought(self):
         """测试超买超卖计算"""
-        df = self._create_sample_klines('3m', 50)
-        oo = self.processor._calculate_oversold_overbought(df)
+        oo = self._feature('_calculate_oversold_overbought', '3m_50')
 
-        self.assertIn('rsi_7', oo)
-        self.assertIn('signal', oo)
-        self.assertIn('signal_strength', oo)
-        self.assertIn('reversal_probability', oo)
+        self.assertLessEqual({
+            'rsi_7', 'signal', 'signal_strength', 'reversal_probability'
+        }, oo.keys())
 
         # 验证信号类型
         valid_signals = ['EXTREME_OVERBOUGHT', 'OVERBOUGHT', 'EXTREME_OVERSOLD', 'OVERSOLD', 'NEUTRAL']
@@ -238,17 +239,13 @@ class TestMultiTimeframeProcessor(unittest.TestCase):
             self.assertGreaterEqual(oo['rsi_7'], 0)
             self.assertLessEqual(oo['rsi_7'], 100)
 
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_analyze_micro_trend(self, mock_db):
+    def test_analyze_micro_trend(self):
         """测试微趋势分析"""
-        df = self._create_sample_klines('3m', 50)
-        micro = self.processor._analyze_micro_trend(df)
+        micro = self._feature('_analyze_micro_trend', '3m_50')
 
-        self.assertIn('direction', micro)
-        self.assertIn('ema_10', micro)
-        self.assertIn('price_vs_ema10', micro)
-        self.assertIn('trend_consistency_pct', micro)
-        self.assertIn('trend_strength', micro)
+        self.assertLessEqual({
+            'direction', 'ema_10', 'price_vs_ema10', 'trend_consistency_pct', 'trend_strength'
+        }, micro.keys())
 
         # 验证方向
         self.assertIn(micro['direction'], ['UP', 'DOWN'])
@@ -256,11 +253,9 @@ class TestMultiTimeframeProcessor(unittest.TestCase):
         # 验证位置
         self.assertIn(micro['price_vs_ema10'], ['above', 'below'])
 
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_calculate_volatility(self, mock_db):
+    def test_calculate_volatility(self):
         """测试波动率计算"""
-        df = self._create_sample_klines('4h', 50)
-        vol = self.processor._calculate_volatility(df)
+        vol = self._feature('_calculate_volatility', '4h_50')
 
         self.assertIn('current_volatility_pct', vol)
         self.assertIn('volatility_level', vol)
@@ -269,12 +264,11 @@ class TestMultiTimeframeProcessor(unittest.TestCase):
         valid_levels = ['HIGH', 'MEDIUM', 'LOW']
         self.assertIn(vol['volatility_level'], valid_levels)
 
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_generate_4h_description(self, mock_db):
+    def test_generate_4h_description(self):
         """测试4小时描述生成"""
         features = {
-            'trend': self.processor._analyze_trend_4h(self._create_sample_klines('4h', 50)),
-            'momentum': self.processor._calculate_long_momentum(self._create_sample_klines('4h', 50)),
+            'trend': self._trend_4h,
+            'momentum': self._momentum_4h,
             'raw_data': {
                 'current_price': 50000,
                 'price_change_24h': 2.5,
@@ -289,14 +283,12 @@ class TestMultiTimeframeProcessor(unittest.TestCase):
         self.assertIn('趋势分析', desc)
         self.assertIn('动量指标', desc)
 
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_generate_3m_description(self, mock_db):
+    def test_generate_3m_description(self):
         """测试3分钟描述生成"""
-        df = self._create_sample_klines('3m', 50)
         features = {
-            'momentum': self.processor._analyze_momentum_3m(df),
-            'breakout': self.processor._detect_breakout(df),
-            'oversold_overbought': self.processor._calculate_oversold_overbought(df)
+            'momentum': self._feature('_analyze_momentum_3m', '3m_50'),
+            'breakout': self._feature('_detect_breakout', '3m_50'),
+            'oversold_overbought': self._feature('_calculate_oversold_overbought', '3m_50')
         }
 
         desc = self.processor._generate_3m_description(features)
@@ -305,8 +297,24 @@ class TestMultiTimeframeProcessor(unittest.TestCase):
         self.assertIn('短期分析', desc)
         self.assertIn('突破信号', desc)
 
-    @patch('multi_timeframe_preprocessor.Database')
-    def test_empty_results(self, mock_db):
+    def test_helpers_do_not_mutate_input(self):
+        """测试特征计算不修改输入数据（共享样本的前提）"""
+        df_4h = _DF_4H_50.copy()
+        df_3m = _DF_3M_50.copy()
+
+        self.processor._analyze_trend_4h(_DF_4H_50)
+        self.processor._find_support_resistance(_DF_4H_50)
+        self.processor._calculate_long_momentum(_DF_4H_50)
+        self.processor._calculate_volatility(_DF_4H_50)
+        self.processor._analyze_momentum_3m(_DF_3M_50)
+        self.processor._detect_breakout(_DF_3M_50)
+        self.processor._calculate_oversold_overbought(_DF_3M_50)
+        self.processor._analyze_micro_trend(_DF_3M_50)
+
+        pd.testing.assert_frame_equal(_DF_4H_50, df_4h)
+        pd.testing.assert_frame_equal(_DF_3M_50, df_3m)
+
+    def test_empty_results(self):
         """测试空结果"""
         result_4h = self.processor._empty_4h_result(self.test_symbol)
         result_3m = self.processor._empty_3m_result(self.test_symbol)
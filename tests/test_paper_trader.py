@@ -5,37 +5,53 @@
 """
 
 import unittest
+import sqlite3
 import tempfile
 import os
-import sys
+from dataclasses import fields, replace
 from datetime import datetime
-from unittest.mock import Mock
-
-# 添加项目根目录到路径
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from unittest.mock import Mock, patch
 
 from trading.paper_trader import PaperTrader, Position, Trade
-from models.trading_decision import TradingDecision
+from tests.helpers import BUY_DECISION
+
+# 50%仓位的买入决策，测试中通过 dataclasses.replace 派生变体
+_BUY = replace(BUY_DECISION, position_size=50.0)  # 50%仓位
+
+# 各测试场景的决策，每个场景只构建一次（PaperTrader 不会修改决策对象）
+_SCENARIOS = {
+    name: replace(_BUY, **overrides)
+    for name, overrides in {
+        'buy_50': {},
+        'buy_50_sl_tp': {'stop_loss': 49000, 'take_profit': 52000},
+        'sell_100_at_51k': {'action': "SELL", 'entry_price': 51000, 'position_size': 100.0},
+        'hold': {'action': "HOLD", 'confidence': 50, 'entry_price': None, 'position_size': 0.0},
+        'oversized': {'entry_price': 200000, 'position_size': 100.0},
+    }.items()
+}
 
 
 class TestPaperTrader(unittest.TestCase):
     """纸交易执行器测试"""
 
-    def setUp(self):
-        """测试前准备"""
-        # 使用临时数据库
-        self.temp_db = tempfile.mktemp(suffix='.db')
-        self.trader = PaperTrader(
+    @classmethod
+    def setUpClass(cls):
+        """测试类准备：所有测试共享一个执行器"""
+        # 使用内存数据库，避免磁盘IO
+        cls.trader = PaperTrader(
             initial_balance=100000,
-            database_path=self.temp_db,
+            database_path=":memory:",
             fee_rate=0.001
         )
 
-    def tearDown(self):
-        """测试后清理"""
-        self.trader.close()
-        if os.path.exists(self.temp_db):
-            os.remove(self.temp_db)
+    @classmethod
+    def tearDownClass(cls):
+        """测试类清理"""
+        cls.trader.close()
+
+    def setUp(self):
+        """测试前准备：恢复初始账户状态"""
+        self.trader.reset()
 
     def test_initialization(self):
         """测试初始化"""
@@ -47,19 +63,7 @@ class TestPaperTrader(unittest.TestCase):
     def test_buy_new_position(self):
         """测试新建多头仓位"""
         # 创建买入决策
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            stop_loss=49000,
-            take_profit=52000,
-            position_size=50.0,  # 50%仓位
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = _SCENARIOS['buy_50_sl_tp']
 
         result = self.trader.execute_decision(decision, 50000)
 
@@ -78,31 +82,11 @@ class TestPaperTrader(unittest.TestCase):
     def test_sell_position(self):
         """测试平仓"""
         # 先买入
-        buy_decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=50.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        buy_decision = _SCENARIOS['buy_50']
         self.trader.execute_decision(buy_decision, 50000)
 
         # 卖出
-        sell_decision = TradingDecision(
-            action="SELL",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=51000,
-            position_size=100.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        sell_decision = _SCENARIOS['sell_100_at_51k']
 
         result = self.trader.execute_decision(sell_decision, 51000)
 
@@ -113,15 +97,7 @@ class TestPaperTrader(unittest.TestCase):
 
     def test_hold_decision(self):
         """测试HOLD决策"""
-        decision = TradingDecision(
-            action="HOLD",
-            confidence=50,
-            symbol="BTCUSDT",
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = _SCENARIOS['hold']
 
         result = self.trader.execute_decision(decision, 50000)
 
@@ -131,17 +107,7 @@ class TestPaperTrader(unittest.TestCase):
     def test_update_prices(self):
         """测试更新价格"""
         # 建立仓位
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=50.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = _SCENARIOS['buy_50']
         self.trader.execute_decision(decision, 50000)
 
         # 更新价格
@@ -155,19 +121,7 @@ class TestPaperTrader(unittest.TestCase):
     def test_stop_loss_trigger(self):
         """测试止损触发"""
         # 建立带止损的仓位
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            stop_loss=49000,  # 止损
-            take_profit=52000,
-            position_size=50.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = _SCENARIOS['buy_50_sl_tp']
         self.trader.execute_decision(decision, 50000)
 
         # 触发止损
@@ -180,19 +134,7 @@ class TestPaperTrader(unittest.TestCase):
     def test_take_profit_trigger(self):
         """测试止盈触发"""
         # 建立带止盈的仓位
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            stop_loss=49000,
-            take_profit=52000,  # 止盈
-            position_size=50.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = _SCENARIOS['buy_50_sl_tp']
         self.trader.execute_decision(decision, 50000)
 
         # 触发止盈
@@ -205,17 +147,7 @@ class TestPaperTrader(unittest.TestCase):
     def test_get_portfolio_value(self):
         """测试投资组合价值计算"""
         # 建立仓位
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=50.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = _SCENARIOS['buy_50']
         self.trader.execute_decision(decision, 50000)
 
         # 计算投资组合价值
@@ -231,55 +163,73 @@ class TestPaperTrader(unittest.TestCase):
     def test_get_pnl(self):
         """测试PnL计算"""
         # 建立仓位
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=50.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = _SCENARIOS['buy_50']
         self.trader.execute_decision(decision, 50000)
 
         # 计算PnL
         price_data = {"BTCUSDT": 52000}
         pnl = self.trader.get_pnl(price_data)
 
-        self.assertIn("unrealized_pnl", pnl)
-        self.assertIn("realized_pnl", pnl)
-        self.assertIn("total_pnl", pnl)
+        self.assertLessEqual({"unrealized_pnl", "realized_pnl", "total_pnl"}, pnl.keys())
         self.assertGreater(pnl["unrealized_pnl"], 0)
 
+    def test_realized_pnl_total_tracks_trades(self):
+        """测试已实现PnL累计与交易记录保持一致，重置后清零"""
+        self.trader.execute_decision(_SCENARIOS['buy_50'], 50000)
+        self.trader.execute_decision(_SCENARIOS['sell_100_at_51k'], 51000)
+
+        expected = sum(t.pnl for t in self.trader.trades)
+        self.assertAlmostEqual(expected, 1000.0)
+        self.assertEqual(self.trader.get_pnl({})["realized_pnl"], expected)
+        stored = self.trader._conn.execute(
+            'SELECT realized_pnl FROM account_history ORDER BY id DESC LIMIT 1'
+        ).fetchone()[0]
+        self.assertEqual(stored, expected)
+
+        self.trader.reset()
+        self.assertEqual(self.trader.get_pnl({})["realized_pnl"], 0.0)
+
     def test_get_performance_metrics(self):
         """测试性能指标计算"""
         metrics = self.trader.get_performance_metrics()
 
-        self.assertIn("total_trades", metrics)
-        self.assertIn("win_rate", metrics)
-        self.assertIn("total_return", metrics)
+        self.assertLessEqual({"total_trades", "win_rate", "total_return"}, metrics.keys())
         self.assertEqual(metrics["total_trades"], 0)
         self.assertEqual(metrics["win_rate"], 0)
 
+    def test_performance_metrics_vectorized(self):
+        """测试 PnL 列扩容后，向量化指标与逐笔计算结果一致"""
+        with patch('trading.paper_trader._PNL_ARRAY_INITIAL_SIZE', 2):
+            trader = PaperTrader(initial_balance=100000, database_path=":memory:")
+        self.addCleanup(trader.close)
+
+        for price, exit_price in [(50000, 51000), (50000, 48000), (50000, 50500), (50000, 47000)]:
+            trader.execute_decision(_SCENARIOS['buy_50'], price)
+            trader.execute_decision(_SCENARIOS['sell_100_at_51k'], exit_price)
+
+        metrics = trader.get_performance_metrics()
+
+        # 逐笔计算的参考实现
+        current, running_max, max_drawdown = trader.balance, 0, 0
+        for trade in trader.trades:
+            current += trade.pnl
+            running_max = max(running_max, current)
+            max_drawdown = max(max_drawdown, (running_max - current) / running_max * 100)
+        wins = sum(1 for t in trader.trades if t.pnl > 0)
+
+        self.assertGreaterEqual(len(trader._pnl_array), 8)
+        self.assertEqual(metrics["total_trades"], 8)
+        self.assertAlmostEqual(metrics["win_rate"], wins / 8 * 100)
+        self.assertAlmostEqual(metrics["max_drawdown"], max_drawdown)
+        self.assertGreater(metrics["max_drawdown"], 0)
+
     def test_get_positions(self):
         """测试获取持仓"""
         positions = self.trader.get_positions()
         self.assertEqual(positions, [])
 
         # 建立仓位
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=50.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = _SCENARIOS['buy_50']
         self.trader.execute_decision(decision, 50000)
 
         positions = self.trader.get_positions()
@@ -292,17 +242,7 @@ class TestPaperTrader(unittest.TestCase):
         self.assertEqual(len(trades), 0)
 
         # 买入
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=50.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = _SCENARIOS['buy_50']
         self.trader.execute_decision(decision, 50000)
 
         trades = self.trader.get_trades()
@@ -311,22 +251,13 @@ class TestPaperTrader(unittest.TestCase):
 
     def test_export_trades(self):
         """测试导出交易记录"""
-        # 创建临时文件
-        temp_file = tempfile.mktemp(suffix='.json')
+        # 创建临时文件（原子地创建并命名）
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tf:
+            temp_file = tf.name
 
         try:
             # 买入
-            decision = TradingDecision(
-                action="BUY",
-                confidence=80,
-                symbol="BTCUSDT",
-                entry_price=50000,
-                position_size=50.0,
-                risk_level="MEDIUM",
-                risk_score=50,
-                model_source="test",
-                timeframe="4h"
-            )
+            decision = _SCENARIOS['buy_50']
             self.trader.execute_decision(decision, 50000)
 
             # 导出
@@ -348,17 +279,7 @@ class TestPaperTrader(unittest.TestCase):
     def test_reset(self):
         """测试重置账户"""
         # 买入
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=50.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = _SCENARIOS['buy_50']
         self.trader.execute_decision(decision, 50000)
 
         # 重置
@@ -369,19 +290,75 @@ class TestPaperTrader(unittest.TestCase):
         self.assertEqual(len(self.trader.positions), 0)
         self.assertEqual(len(self.trader.trades), 0)
 
+    def test_in_memory_database(self):
+        """测试内存数据库跨调用保留交易记录"""
+        decision = _SCENARIOS['buy_50']
+        self.trader.execute_decision(decision, 50000)
+
+        cursor = self.trader._conn.execute('SELECT symbol, side FROM trades')
+        self.assertEqual(cursor.fetchall(), [("BTCUSDT", "buy")])
+
+    def test_file_database_persistent_connection(self):
+        """测试文件数据库复用同一连接写入，其他连接可读到已提交的数据"""
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        trader = PaperTrader(initial_balance=100000, database_path=path)
+        self.addCleanup(lambda: [os.remove(f) for f in (path, path + '-wal', path + '-shm') if os.path.exists(f)])
+        self.addCleanup(trader.close)
+
+        conn = trader._conn
+        trader.execute_decision(_SCENARIOS['buy_50'], 50000)
+        self.assertIs(trader._conn, conn)
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+        reader = sqlite3.connect(path)
+        self.addCleanup(reader.close)
+        self.assertEqual(reader.execute('SELECT symbol, side FROM trades').fetchall(), [("BTCUSDT", "buy")])
+        self.assertEqual(reader.execute('SELECT COUNT(*) FROM positions').fetchone()[0], 1)
+
+        trader.close()
+        trader.close()
+        self.assertIsNone(trader._conn)
+
+    def test_decision_writes_in_single_transaction(self):
+        """测试一次决策/价格更新的全部写入处于同一事务，结束后提交"""
+        in_transaction = []
+        conn = self.trader._conn
+
+        with patch.object(PaperTrader, '_save_account_history', autospec=True,
+                          side_effect=lambda trader: in_transaction.append(conn.in_transaction)):
+            self.trader.execute_decision(_SCENARIOS['buy_50_sl_tp'], 50000)
+            self.trader.update_prices({"BTCUSDT": 48500})  # 触发止损平仓
+
+        self.assertEqual(in_transaction, [True, True, True])
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM trades').fetchone()[0], 2)
+
+    def test_replay_writes_in_bulk(self):
+        """测试批量回放：缓冲写入，结束后一次性写库并只记一条账户历史"""
+        events = [
+            (_SCENARIOS['buy_50'], 50000),
+            (_SCENARIOS['buy_50'], 50500),
+            (_SCENARIOS['sell_100_at_51k'], 51000),
+            (_SCENARIOS['buy_50'], 50000),
+        ]
+
+        results = self.trader.replay(events)
+
+        self.assertEqual([r["status"] for r in results], ["success"] * 4)
+        conn = self.trader._conn
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM trades').fetchone()[0], 4)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM account_history').fetchone()[0], 1)
+        size = conn.execute("SELECT size FROM positions WHERE symbol = 'BTCUSDT'").fetchone()[0]
+        self.assertEqual(size, self.trader.positions["BTCUSDT"].size)
+
+        # 回放结束后恢复直接写库
+        self.trader.execute_decision(_SCENARIOS['sell_100_at_51k'], 51000)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM trades').fetchone()[0], 5)
+
     def test_insufficient_balance(self):
         """测试余额不足"""
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=200000,  # 高价格
-            position_size=100.0,  # 100%仓位
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = _SCENARIOS['oversized']
 
         result = self.trader.execute_decision(decision, 200000)
 
@@ -390,17 +367,7 @@ class TestPaperTrader(unittest.TestCase):
 
     def test_invalid_decision(self):
         """测试无效决策"""
-        decision = TradingDecision(
-            action="BUY",
-            confidence=150,  # 无效置信度
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=50.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = replace(_BUY, confidence=150)  # 无效置信度
 
         result = self.trader.execute_decision(decision, 50000)
 
@@ -479,6 +446,7 @@ class TestPosition(unittest.TestCase):
         self.assertEqual(data["size"], 1.0)
         self.assertEqual(data["entry_price"], 50000)
         self.assertIsInstance(data["entry_time"], str)
+        self.assertEqual(data.keys(), {f.name for f in fields(Position)})
 
 
 class TestTrade(unittest.TestCase):
@@ -521,6 +489,7 @@ class TestTrade(unittest.TestCase):
         self.assertEqual(data["size"], 1.0)
         self.assertEqual(data["price"], 50000)
         self.assertIsInstance(data["timestamp"], str)
+        self.assertEqual(data.keys(), {f.name for f in fields(Trade)})
 
 
 if __name__ == '__main__':
@@ -7,9 +7,16 @@
 import unittest
 import tempfile
 import os
+import shutil
 import sqlite3
+import threading
+from dataclasses import replace
 from datetime import datetime, timedelta
 import json
+import math
+import statistics
+from unittest.mock import patch
+import numpy as np
 
 from monitoring.performance_monitor import (
     PerformanceMonitor,
@@ -17,9 +24,22 @@ from monitoring.performance_monitor import (
     TradingMetrics,
     PerformanceSummary
 )
-from models.trading_decision import TradingDecision
+from tests.helpers import BUY_DECISION
 from trading.paper_trader import PaperTrader
 
+# Linux 下 /dev/shm 是内存文件系统，数据库放在这里可避免真实磁盘写入
+_SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+
+# 测试中反复使用的卖出决策（record_trading_metrics 不会修改决策）
+_SELL_DECISION = replace(BUY_DECISION, action="SELL")
+
+
+def _fast_tmp_db() -> str:
+    """创建临时数据库文件（优先放在 /dev/shm），返回路径"""
+    temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db', dir=_SHM_DIR)
+    temp_db.close()
+    return temp_db.name
+
 
 class TestSystemMetrics(unittest.TestCase):
     """系统指标测试"""
@@ -93,27 +113,36 @@ class TestPerformanceSummary(unittest.TestCase):
 class TestPerformanceMonitor(unittest.TestCase):
     """性能监控器测试"""
 
+    @classmethod
+    def setUpClass(cls):
+        """共享纸交易执行器（各测试只读取，不会修改其状态）"""
+        cls.paper_trader = PaperTrader(initial_balance=100000, database_path=":memory:")
+
+    @classmethod
+    def tearDownClass(cls):
+        """关闭共享的纸交易执行器"""
+        cls.paper_trader.close()
+
     def setUp(self):
         """测试前准备"""
-        # 使用临时数据库
-        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
-        self.database_path = self.temp_db.name
-        self.temp_db.close()
-
-        self.monitor = PerformanceMonitor(database_path=self.database_path)
+        # 这些测试只读内存中的指标，使用内存数据库即可
+        self.monitor = PerformanceMonitor(database_path=":memory:")
 
     def tearDown(self):
         """测试后清理"""
-        if os.path.exists(self.database_path):
-            os.unlink(self.database_path)
+        self.monitor.close()
 
     def test_init_database(self):
         """测试初始化数据库"""
+        database_path = _fast_tmp_db()
+        self.addCleanup(os.unlink, database_path)
+        PerformanceMonitor(database_path=database_path, fast_mode=True).close()
+
         # 数据库文件应该已创建
-        self.assertTrue(os.path.exists(self.database_path))
+        self.assertTrue(os.path.exists(database_path))
 
         # 检查表是否存在
-        conn = sqlite3.connect(self.database_path)
+        conn = sqlite3.connect(database_path)
         cursor = conn.cursor()
 
         cursor.execute(
@@ -129,17 +158,7 @@ class TestPerformanceMonitor(unittest.TestCase):
 
     def test_record_trading_metrics(self):
         """测试记录交易指标"""
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=10.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = BUY_DECISION
 
         self.monitor.record_trading_metrics(
             decision=decision,
@@ -180,29 +199,18 @@ class TestPerformanceMonitor(unittest.TestCase):
 
     def test_get_performance_summary(self):
         """测试获取性能摘要"""
-        paper_trader = PaperTrader(initial_balance=100000)
-
-        # 先添加一些交易数据
-        for i in range(10):
-            decision = TradingDecision(
-                action="BUY" if i % 2 == 0 else "SELL",
-                confidence=80,
-                symbol="BTCUSDT",
-                position_size=10.0,
-                risk_level="MEDIUM",
-                risk_score=50,
-                model_source="test",
-                timeframe="4h"
-            )
+        paper_trader = self.paper_trader
 
-            pnl = 100.0 if i % 2 == 0 else -50.0
-            self.monitor.record_trading_metrics(
-                decision=decision,
-                pnl=pnl,
-                execution_time=1.0,
-                llm_cost=0.02,
-                total_cost=0.03
-            )
+        # 先添加一些交易数据（盈亏交替）
+        self.monitor.bulk_record_trading_metrics([
+            (BUY_DECISION, 100.0, 1.0, 0.02, 0.03) if i % 2 == 0
+            else (_SELL_DECISION, -50.0, 1.0, 0.02, 0.03)
+            for i in range(10)
+        ])
+
+        self.assertEqual(self.monitor.stats['total_trades'], 10)
+        self.assertEqual(self.monitor.stats['successful_requests'], 5)
+        self.assertEqual(self.monitor.stats['failed_requests'], 5)
 
         summary = self.monitor.get_performance_summary(paper_trader)
 
@@ -212,54 +220,87 @@ class TestPerformanceMonitor(unittest.TestCase):
         self.assertEqual(summary.win_rate, 50.0)
         self.assertEqual(summary.total_pnl, 250.0)
 
+    def test_summary_follows_sliding_window(self):
+        """测试摘要只统计滑动窗口内的交易（累计值随窗口增量更新）"""
+        monitor = PerformanceMonitor(database_path=":memory:", window_size=3)
+        self.addCleanup(monitor.close)
+        paper_trader = self.paper_trader
+
+        monitor.bulk_record_trading_metrics([
+            (BUY_DECISION, 10.0, 1.0, 0.02, 0.03),
+            (_SELL_DECISION, -20.0, 2.0, 0.02, 0.03),
+        ])
+        for pnl in (30.0, 40.0, -5.0):
+            monitor.record_trading_metrics(
+                decision=BUY_DECISION,
+                pnl=pnl,
+                execution_time=3.0,
+                llm_cost=0.02,
+                total_cost=0.03
+            )
+
+        summary = monitor.get_performance_summary(paper_trader)
+
+        # 窗口内只剩最后 3 笔：30, 40, -5
+        pnls = [30.0, 40.0, -5.0]
+        self.assertEqual(summary.total_trades, 3)
+        self.assertEqual(summary.winning_trades, 2)
+        self.assertAlmostEqual(summary.total_pnl, 65.0)
+        self.assertAlmostEqual(summary.profit_factor, 70.0 / 5.0)
+        self.assertAlmostEqual(summary.avg_execution_time, 3.0)
+        self.assertAlmostEqual(
+            summary.sharpe_ratio,
+            statistics.mean(pnls) / statistics.stdev(pnls) * math.sqrt(365)
+        )
+
+    def test_sharpe_exact_after_large_pnls_leave_window(self):
+        """测试大额盈亏移出窗口后，夏普比率仍按窗口内数据精确计算"""
+        monitor = PerformanceMonitor(database_path=":memory:", window_size=3)
+        self.addCleanup(monitor.close)
+
+        for pnl in (1e9, 1e9, 1e9, 1.0, 2.0, 4.0):
+            monitor.record_trading_metrics(
+                decision=BUY_DECISION,
+                pnl=pnl,
+                execution_time=1.0,
+                llm_cost=0.0,
+                total_cost=0.0
+            )
+
+        summary = monitor.get_performance_summary(self.paper_trader)
+
+        pnls = [1.0, 2.0, 4.0]
+        expected = statistics.mean(pnls) / statistics.stdev(pnls) * math.sqrt(365)
+        self.assertAlmostEqual(summary.sharpe_ratio, expected)
+        self.assertAlmostEqual(summary.sharpe_ratio, 29.18, places=2)
+
     def test_get_recent_trades(self):
         """测试获取最近交易记录"""
         # 添加多条交易记录
         for i in range(5):
-            decision = TradingDecision(
-                action="BUY",
-                confidence=80,
-                symbol="BTCUSDT",
-                position_size=10.0,
-                risk_level="MEDIUM",
-                risk_score=50,
-                model_source="test",
-                timeframe="4h"
-            )
-
             self.monitor.record_trading_metrics(
-                decision=decision,
-                pnl=100.0,
+                decision=BUY_DECISION,
+                pnl=100.0 + i,
                 execution_time=1.0,
                 llm_cost=0.02,
                 total_cost=0.03
             )
 
-        # 获取最近3条记录
+        # 获取最近3条记录（按时间正序）
         recent = self.monitor.get_recent_trades(limit=3)
         self.assertEqual(len(recent), 3)
         self.assertEqual(recent[0]['symbol'], "BTCUSDT")
+        self.assertEqual([t['pnl'] for t in recent], [102.0, 103.0, 104.0])
 
     def test_get_cost_analysis(self):
         """测试成本分析"""
         # 添加交易记录
-        for i in range(3):
-            decision = TradingDecision(
-                action="BUY",
-                confidence=80,
-                symbol="BTCUSDT",
-                position_size=10.0,
-                risk_level="MEDIUM",
-                risk_score=50,
-                model_source="test",
-                timeframe="4h"
-            )
-
+        for _ in range(3):
             llm_cost = 0.02
             total_cost = 0.05
 
             self.monitor.record_trading_metrics(
-                decision=decision,
+                decision=BUY_DECISION,
                 pnl=100.0,
                 execution_time=1.0,
                 llm_cost=llm_cost,
@@ -274,9 +315,11 @@ class TestPerformanceMonitor(unittest.TestCase):
         self.assertIn('avg_cost_per_trade', analysis)
         self.assertIn('cost_breakdown', analysis)
 
-        self.assertAlmostEqual(analysis['total_cost'], 0.15, places=6)
-        self.assertAlmostEqual(analysis['llm_cost'], 0.06, places=6)
-        self.assertAlmostEqual(analysis['other_cost'], 0.09, places=6)
+        np.testing.assert_allclose(
+            [analysis['total_cost'], analysis['llm_cost'], analysis['other_cost']],
+            [0.15, 0.06, 0.09],
+            rtol=0, atol=1e-6
+        )
 
     def test_get_system_health(self):
         """测试获取系统健康状况"""
@@ -306,30 +349,12 @@ class TestPerformanceMonitor(unittest.TestCase):
 
     def test_get_alerts(self):
         """测试获取告警信息"""
-        paper_trader = PaperTrader(initial_balance=100000)
-
-        # 添加一些交易记录（胜率较低）
-        for i in range(15):
-            decision = TradingDecision(
-                action="SELL",  # 大部分是亏损交易
-                confidence=80,
-                symbol="BTCUSDT",
-                position_size=10.0,
-                risk_level="MEDIUM",
-                risk_score=50,
-                model_source="test",
-                timeframe="4h"
-            )
-
-            pnl = -100.0  # 全部亏损
+        paper_trader = self.paper_trader
 
-            self.monitor.record_trading_metrics(
-                decision=decision,
-                pnl=pnl,
-                execution_time=1.0,
-                llm_cost=0.02,
-                total_cost=0.03
-            )
+        # 添加一些交易记录（全部亏损，胜率较低）
+        self.monitor.bulk_record_trading_metrics(
+            [(_SELL_DECISION, -100.0, 1.0, 0.02, 0.03)] * 15
+        )
 
         alerts = self.monitor.get_alerts(paper_trader)
 
@@ -340,24 +365,31 @@ class TestPerformanceMonitor(unittest.TestCase):
             any('胜率过低' in msg for msg in alert_messages)
         )
 
+    def test_get_alerts_system_critical(self):
+        """测试系统错误率过高时的告警"""
+        self.monitor.record_system_metrics(
+            cpu_usage=50.0,
+            memory_usage=60.0,
+            active_connections=10,
+            response_time=0.25,
+            cache_hit_rate=0.85,
+            error_rate=10.0
+        )
+
+        alerts = self.monitor.get_alerts(self.paper_trader)
+
+        self.assertEqual(
+            [(a['level'], a['message']) for a in alerts],
+            [('critical', "系统错误率过高: 10.00%")]
+        )
+
     def test_export_report(self):
         """测试导出报告"""
-        paper_trader = PaperTrader(initial_balance=100000)
+        paper_trader = self.paper_trader
 
         # 添加一些测试数据
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            position_size=10.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
-
         self.monitor.record_trading_metrics(
-            decision=decision,
+            decision=BUY_DECISION,
             pnl=100.0,
             execution_time=1.0,
             llm_cost=0.02,
@@ -393,38 +425,130 @@ class TestPerformanceMonitor(unittest.TestCase):
             if os.path.exists(report_path):
                 os.unlink(report_path)
 
+    def test_export_report_without_orjson(self):
+        """测试未安装 orjson 时回退到标准库 json"""
+        paper_trader = self.paper_trader
+        self.monitor.record_trading_metrics(
+            decision=BUY_DECISION,
+            pnl=100.0,
+            execution_time=1.0,
+            llm_cost=0.02,
+            total_cost=0.03
+        )
+
+        temp_report = tempfile.NamedTemporaryFile(delete=False, suffix='.json')
+        temp_report.close()
+        report_path = temp_report.name
+        self.addCleanup(os.unlink, report_path)
+
+        with patch('monitoring.performance_monitor.orjson', None):
+            self.monitor.export_report(report_path, paper_trader)
+
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+
+        self.assertEqual(report['performance_summary']['total_trades'], 1)
+        self.assertEqual(report['recent_trades'][0]['symbol'], "BTCUSDT")
+
 
 class TestDatabaseOperations(unittest.TestCase):
     """数据库操作测试"""
 
+    @classmethod
+    def setUpClass(cls):
+        """创建一次已建表的模板数据库，各测试复制使用"""
+        cls._template_db = _fast_tmp_db()
+        PerformanceMonitor(database_path=cls._template_db, fast_mode=True).close()
+
+    @classmethod
+    def tearDownClass(cls):
+        """删除模板数据库"""
+        if os.path.exists(cls._template_db):
+            os.unlink(cls._template_db)
+
     def setUp(self):
         """测试前准备"""
-        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
-        self.database_path = self.temp_db.name
-        self.temp_db.close()
+        self.database_path = _fast_tmp_db()
+        shutil.copyfile(self._template_db, self.database_path)
 
-        self.monitor = PerformanceMonitor(database_path=self.database_path)
+        self.monitor = PerformanceMonitor(database_path=self.database_path, fast_mode=True)
 
     def tearDown(self):
         """测试后清理"""
+        self.monitor.close()
         if os.path.exists(self.database_path):
             os.unlink(self.database_path)
 
-    def test_save_and_retrieve_trading_metrics(self):
-        """测试保存和检索交易指标"""
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            position_size=10.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
+    def test_pending_metrics_flushed_after_interval(self):
+        """测试未达到批量大小时，超过时间间隔也会落库"""
+        def count():
+            with sqlite3.connect(self.database_path) as conn:
+                return conn.execute("SELECT COUNT(*) FROM trading_metrics").fetchone()[0]
+
+        self.monitor.record_trading_metrics(
+            decision=BUY_DECISION, pnl=1.0, execution_time=1.0, llm_cost=0.0, total_cost=0.0
         )
+        self.assertEqual(count(), 0)
 
+        self.monitor._last_flush -= PerformanceMonitor.FLUSH_INTERVAL
         self.monitor.record_trading_metrics(
-            decision=decision,
+            decision=BUY_DECISION, pnl=2.0, execution_time=1.0, llm_cost=0.0, total_cost=0.0
+        )
+        self.assertEqual(count(), 2)
+
+    def test_close_flushes_and_is_idempotent(self):
+        """测试 close 写入缓存指标、可重复调用"""
+        self.monitor.record_trading_metrics(
+            decision=BUY_DECISION, pnl=1.0, execution_time=1.0, llm_cost=0.0, total_cost=0.0
+        )
+        self.monitor.close()
+        self.monitor.close()
+
+        with sqlite3.connect(self.database_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM trading_metrics").fetchone()[0], 1)
+
+    def test_writes_after_close_are_skipped(self):
+        """测试 close 后记录指标、生成摘要不会访问已关闭的连接"""
+        self.monitor.close()
+
+        self.monitor.record_trading_metrics(
+            decision=BUY_DECISION, pnl=1.0, execution_time=1.0, llm_cost=0.0, total_cost=0.0
+        )
+        self.monitor.bulk_record_trading_metrics([(BUY_DECISION, 1.0, 1.0, 0.0, 0.0)])
+        self.monitor.flush()
+        paper_trader = PaperTrader(database_path=":memory:")
+        self.addCleanup(paper_trader.close)
+        summary = self.monitor.get_performance_summary(paper_trader)
+
+        self.assertEqual(summary.total_trades, 2)
+        with sqlite3.connect(self.database_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM trading_metrics").fetchone()[0], 0)
+
+    def test_concurrent_records_are_all_written(self):
+        """测试多线程同时记录指标时所有行都写入数据库"""
+        def record():
+            for _ in range(PerformanceMonitor.FLUSH_BATCH_SIZE):
+                self.monitor.record_trading_metrics(
+                    decision=BUY_DECISION, pnl=1.0, execution_time=1.0, llm_cost=0.0, total_cost=0.0
+                )
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.monitor.flush()
+
+        with sqlite3.connect(self.database_path) as conn:
+            self.assertEqual(
+                conn.execute("SELECT COUNT(*) FROM trading_metrics").fetchone()[0],
+                4 * PerformanceMonitor.FLUSH_BATCH_SIZE
+            )
+
+    def test_save_and_retrieve_trading_metrics(self):
+        """测试保存和检索交易指标"""
+        self.monitor.record_trading_metrics(
+            decision=BUY_DECISION,
             pnl=100.0,
             execution_time=1.0,
             llm_cost=0.02,
@@ -432,6 +556,7 @@ class TestDatabaseOperations(unittest.TestCase):
         )
 
         # 直接查询数据库验证
+        self.monitor.flush()
         conn = sqlite3.connect(self.database_path)
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM trading_metrics")
@@ -454,6 +579,7 @@ class TestDatabaseOperations(unittest.TestCase):
         )
 
         # 直接查询数据库验证
+        self.monitor.flush()
         conn = sqlite3.connect(self.database_path)
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM system_metrics")
@@ -464,6 +590,42 @@ class TestDatabaseOperations(unittest.TestCase):
         self.assertEqual(rows[0][2], 50.0)  # cpu_usage
         self.assertEqual(rows[0][3], 60.0)  # memory_usage
 
+    def test_bulk_record_trading_metrics(self):
+        """测试批量记录交易指标直接写入数据库"""
+        self.monitor.bulk_record_trading_metrics(
+            [(BUY_DECISION, 100.0, 1.0, 0.02, 0.03)] * 3
+        )
+
+        conn = sqlite3.connect(self.database_path)
+        rows = conn.execute("SELECT symbol, action FROM trading_metrics").fetchall()
+        conn.close()
+
+        self.assertEqual(rows, [("BTCUSDT", "BUY")] * 3)
+        self.assertEqual(len(self.monitor.trading_metrics), 3)
+
+    def test_metrics_are_batched_until_flush(self):
+        """测试指标先缓存，flush 后才写入数据库"""
+        for _ in range(3):
+            self.monitor.record_system_metrics(
+                cpu_usage=50.0,
+                memory_usage=60.0,
+                active_connections=10,
+                response_time=0.25,
+                cache_hit_rate=0.85,
+                error_rate=2.0
+            )
+
+        def count_rows():
+            conn = sqlite3.connect(self.database_path)
+            try:
+                return conn.execute("SELECT COUNT(*) FROM system_metrics").fetchone()[0]
+            finally:
+                conn.close()
+
+        self.assertEqual(count_rows(), 0)
+        self.monitor.flush()
+        self.assertEqual(count_rows(), 3)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,47 @@
+"""
+令牌桶限流器测试
+"""
+
+import time
+import unittest
+
+from trading.rate_limiter import TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+    """令牌桶测试"""
+
+    def test_burst_within_capacity(self):
+        """测试额度内的请求不等待"""
+        bucket = TokenBucket(capacity=100, refill_per_sec=1)
+
+        for _ in range(10):
+            self.assertEqual(bucket.consume(10), 0.0)
+        self.assertFalse(bucket.try_consume(10))
+
+    def test_consume_waits_for_refill(self):
+        """测试额度耗尽后等待补充"""
+        bucket = TokenBucket(capacity=5, refill_per_sec=100)
+        bucket.consume(5)
+
+        start = time.monotonic()
+        waited = bucket.consume(2)
+
+        self.assertGreater(waited, 0)
+        self.assertGreaterEqual(time.monotonic() - start, 0.015)
+
+    def test_weight_above_capacity_is_capped(self):
+        """测试超过容量的权重按容量计算，不会永久阻塞"""
+        bucket = TokenBucket(capacity=3, refill_per_sec=1)
+        self.assertEqual(bucket.consume(10), 0.0)
+
+    def test_invalid_arguments(self):
+        """测试非法参数"""
+        with self.assertRaises(ValueError):
+            TokenBucket(capacity=0, refill_per_sec=1)
+        with self.assertRaises(ValueError):
+            TokenBucket(capacity=1, refill_per_sec=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
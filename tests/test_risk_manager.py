@@ -6,6 +6,7 @@
 
 import unittest
 import numpy as np
+from dataclasses import replace
 from datetime import datetime
 import sys
 import os
@@ -14,7 +15,16 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from risk_management.risk_manager import RiskManager, RiskMetrics, PositionSizer
-from models.trading_decision import TradingDecision
+from tests.helpers import BUY_DECISION
+
+# 各测试在此基础上用 replace 修改个别字段
+_BASE_DECISION = replace(BUY_DECISION, position_size=5.0)
+
+
+def _price_history(count: int = 100, seed: int = 42) -> list:
+    """生成模拟价格历史（每次使用独立的随机数生成器，不影响全局随机状态）"""
+    rng = np.random.default_rng(seed)
+    return (50000 + rng.normal(0, 1000, size=count)).tolist()
 
 
 class TestRiskManager(unittest.TestCase):
@@ -31,19 +41,7 @@ class TestRiskManager(unittest.TestCase):
 
     def test_evaluate_valid_decision(self):
         """测试评估有效决策"""
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            stop_loss=49000,
-            take_profit=52000,
-            position_size=5.0,  # 5%
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = replace(_BASE_DECISION, stop_loss=49000, take_profit=52000)
 
         current_positions = {}
         price_data = {"BTCUSDT": 50000}
@@ -59,17 +57,7 @@ class TestRiskManager(unittest.TestCase):
 
     def test_evaluate_invalid_decision(self):
         """测试评估无效决策"""
-        decision = TradingDecision(
-            action="BUY",
-            confidence=150,  # 无效置信度
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=5.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = replace(_BASE_DECISION, confidence=150)  # 无效置信度
 
         current_positions = {}
         price_data = {"BTCUSDT": 50000}
@@ -83,16 +71,11 @@ class TestRiskManager(unittest.TestCase):
 
     def test_evaluate_excessive_position(self):
         """测试评估超大仓位"""
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
+        decision = replace(
+            _BASE_DECISION,
             position_size=50.0,  # 50%，超出10%限制
             risk_level="LOW",
-            risk_score=30,
-            model_source="test",
-            timeframe="4h"
+            risk_score=30
         )
 
         current_positions = {}
@@ -107,18 +90,7 @@ class TestRiskManager(unittest.TestCase):
 
     def test_evaluate_excessive_leverage(self):
         """测试评估过高杠杆"""
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=5.0,
-            leverage=20.0,  # 超出10x限制
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = replace(_BASE_DECISION, leverage=20.0)  # 超出10x限制
 
         current_positions = {}
         price_data = {"BTCUSDT": 50000}
@@ -133,8 +105,7 @@ class TestRiskManager(unittest.TestCase):
     def test_calculate_risk_metrics_sufficient_data(self):
         """测试计算风险指标-数据充足"""
         # 生成模拟价格历史
-        np.random.seed(42)
-        price_history = [50000 + np.random.normal(0, 1000) for _ in range(100)]
+        price_history = _price_history()
 
         metrics = self.risk_manager.calculate_risk_metrics(
             symbol="BTCUSDT",
@@ -223,17 +194,7 @@ class TestRiskManager(unittest.TestCase):
 
     def test_calculate_position_size(self):
         """测试计算仓位大小"""
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=10.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = replace(_BASE_DECISION, position_size=10.0)
 
         position_size = self.risk_manager._calculate_position_size(decision, 50000)
 
@@ -242,15 +203,12 @@ class TestRiskManager(unittest.TestCase):
 
     def test_calculate_position_size_hold(self):
         """测试HOLD决策的仓位大小"""
-        decision = TradingDecision(
+        decision = replace(
+            _BASE_DECISION,
             action="HOLD",
             confidence=50,
-            symbol="BTCUSDT",
             position_size=0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
+            entry_price=None
         )
 
         position_size = self.risk_manager._calculate_position_size(decision, 50000)
@@ -268,19 +226,9 @@ class TestPositionSizer(unittest.TestCase):
 
     def test_calculate_position_size_with_history(self):
         """测试带历史数据的仓位计算"""
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=10.0,
-            risk_level="MEDIUM",
-            risk_score=50,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = replace(_BASE_DECISION, position_size=10.0)
 
-        price_history = [50000 + np.random.normal(0, 1000) for _ in range(100)]
+        price_history = _price_history()
 
         position_size = self.position_sizer.calculate_position_size(
             decision, 50000, 100000, price_history
@@ -290,17 +238,7 @@ class TestPositionSizer(unittest.TestCase):
 
     def test_calculate_position_size_without_history(self):
         """测试不带历史数据的仓位计算"""
-        decision = TradingDecision(
-            action="BUY",
-            confidence=80,
-            symbol="BTCUSDT",
-            entry_price=50000,
-            position_size=10.0,
-            risk_level="LOW",
-            risk_score=30,
-            model_source="test",
-            timeframe="4h"
-        )
+        decision = replace(_BASE_DECISION, position_size=10.0, risk_level="LOW", risk_score=30)
 
         position_size = self.position_sizer.calculate_position_size(
             decision, 50000, 100000
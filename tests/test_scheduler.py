@@ -53,14 +53,19 @@ class TestDataScheduler(unittest.TestCase):
         mock_fetcher_instance = MagicMock()
         mock_fetcher.return_value = mock_fetcher_instance
 
-        scheduler = DataScheduler(['BTCUSDT'], 60)
+        scheduler = DataScheduler(['BTCUSDT'], 60, single_shot=True)
 
         # 测试初始状态
         self.assertFalse(scheduler.is_running)
 
-        # 注意：由于调度器会进入循环，我们只测试状态更新
-        # 实际测试中会使用更复杂的mock来避免无限循环
-        scheduler.is_running = True
+        # single_shot 模式下 start() 只执行首次更新，不进入循环
+        scheduler.start()
+        self.assertTrue(scheduler.is_running)
+        mock_fetcher_instance.get_market_data.assert_called_once_with('BTCUSDT')
+
+        # 间隔未到，tick() 不会再次更新
+        scheduler.tick()
+        mock_fetcher_instance.get_market_data.assert_called_once()
 
         # 测试停止
         scheduler.stop()
@@ -15,9 +15,9 @@ from dataclasses import dataclass
 from models.trading_decision import TradingDecision
 
 
-@dataclass
+@dataclass(slots=True)
 class OrderInfo:
-    """订单信息"""
+    """订单信息（slots：交易器会在内存中保留大量订单）"""
 
     order_id: str
     symbol: str
@@ -38,7 +38,7 @@ class OrderInfo:
 
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        result = {
+        return {
             'order_id': self.order_id,
             'symbol': self.symbol,
             'side': self.side,
@@ -52,7 +52,6 @@ class OrderInfo:
             'fee': self.fee,
             'pnl': self.pnl
         }
-        return result
 
 
 class TradingInterface(ABC):
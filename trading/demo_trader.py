@@ -5,18 +5,186 @@ Demo Trading 交易器
 注意：在当前网络环境中可能不可达
 """
 
+import asyncio
 import ccxt
+import queue
 import sqlite3
-from typing import Dict, Optional, List, Any
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Dict, Optional, List, Any, Deque
 from datetime import datetime
+from decimal import Decimal, ROUND_DOWN
 import logging
 import time
 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from trading.base import TradingInterface, OrderInfo
+from trading.rate_limiter import TokenBucket
 from models.trading_decision import TradingDecision
 
+try:
+    import ccxt.pro as ccxtpro
+except ImportError:  # 旧版 ccxt 不含 WebSocket 支持
+    ccxtpro = None
+
 logger = logging.getLogger(__name__)
 
+# 订单/余额记录可容忍断电时丢失最后几笔，换取写入不再逐次 fsync
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;"
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA temp_store=MEMORY;"
+    "PRAGMA cache_size=-20000;"
+)
+
+# 后台写库线程：队列容量、单批最多条数、凑批最长等待（秒）
+_WRITE_QUEUE_SIZE = 10_000
+_WRITE_BATCH_SIZE = 100
+_WRITE_BATCH_WAIT = 0.05
+_WRITER_STOP = object()  # 写库线程的退出信号
+
+# Binance 请求权重限额（每分钟 1200）及各接口的权重，未列出的按 1 计
+_RATE_LIMIT_CAPACITY = 1200
+_RATE_LIMIT_REFILL_PER_SEC = 20
+_REQUEST_WEIGHTS = {
+    'fetch_time': 1,
+    'fetch_ticker': 1,
+    'fetch_tickers': 40,
+    'fetch_balance': 10,
+    'fetch_order': 2,
+    'load_markets': 20,
+    'create_order': 1,
+    'create_market_order': 1,
+    'create_limit_order': 1,
+    'cancel_order': 1,
+}
+
+# ccxt 的 requests 会话连接池：线程池并发请求时复用连接（免去重复的 TCP/TLS 握手）；
+# 只重试 GET，避免下单/撤单请求被重复提交
+_HTTP_POOL_CONNECTIONS = 10
+_HTTP_POOL_MAXSIZE = 20
+_HTTP_RETRY = Retry(total=2, backoff_factor=0.1, allowed_methods=frozenset({'GET'}))
+
+# WebSocket 推送出错后重新订阅前的等待（秒）
+_WS_RETRY_DELAY = 1.0
+
+# 固定的 SQL 文本，sqlite3 按文本缓存预编译语句，重复执行无需重新解析
+_INSERT_ORDER_SQL = """
+    INSERT OR REPLACE INTO orders
+    (order_id, symbol, side, type, amount, price, status,
+     filled_amount, filled_price, timestamp, fee, pnl)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_BALANCE_SQL = """
+    INSERT OR REPLACE INTO balances (asset, free, locked, total)
+    VALUES (?, ?, ?, ?)
+"""
+
+# 内存中保留的最近订单数，更早的订单通过 get_order_history 从数据库查询
+_ORDER_HISTORY_SIZE = 10_000
+
+# 稳定币（不计入持仓）与 Demo 账户初始赠送的资产
+_STABLES = frozenset({'USDT', 'USDC', 'BUSD', 'TUSD', 'FDUSD'})
+_INITIAL_ASSETS = frozenset({'BTC', 'ETH', 'BNB', 'SOL', 'XRP', 'DOGE', 'ADA', 'DOT', 'AVAX', 'MATIC'})
+
+
+@dataclass
+class _SharedClient:
+    """共享的 ccxt 客户端及其限流令牌桶"""
+
+    exchange: Any
+    bucket: TokenBucket
+    refs: int = 0
+
+
+# 同一账户、同一交易类型的交易器共享客户端：复用连接池和已加载的交易对，
+# 并共用一个令牌桶（交易所按账户/IP 计算请求权重）
+_SHARED_CLIENTS: Dict[tuple, _SharedClient] = {}
+_SHARED_CLIENTS_LOCK = threading.Lock()
+
+
+def _build_exchange(api_key: str, secret: str, market_type: str):
+    """创建 ccxt 客户端：关闭固定间隔限流（改用令牌桶）、挂载连接池并启用 Demo Trading 模式"""
+    exchange = ccxt.binance({
+        'apiKey': api_key,
+        'secret': secret,
+        'type': market_type,
+        'enableRateLimit': False,
+    })
+
+    adapter = HTTPAdapter(
+        pool_connections=_HTTP_POOL_CONNECTIONS,
+        pool_maxsize=_HTTP_POOL_MAXSIZE,
+        max_retries=_HTTP_RETRY
+    )
+    exchange.session.mount('https://', adapter)
+
+    # 尝试启用 Demo Trading 模式
+    try:
+        # 检查 CCXT 是否支持 enable_demo_trading
+        if hasattr(exchange, 'enable_demo_trading'):
+            exchange.enable_demo_trading(True)
+            logger.info("✅ 已启用 CCXT Demo Trading 模式")
+        else:
+            logger.warning("⚠️  CCXT 版本不支持 enable_demo_trading() 方法")
+    except Exception as e:
+        logger.error(f"⚠️  启用 Demo Trading 失败: {e}")
+        logger.error("可能的原因:")
+        logger.error("  1. 网络环境无法访问 demo-api.binance.com")
+        logger.error("  2. Demo Trading API Key 无效")
+        logger.error("  3. CCXT 版本过低")
+        raise
+
+    return exchange
+
+
+def _acquire_client(api_key: str, secret: str, market_type: str) -> tuple:
+    """
+    获取共享客户端（不存在时创建），引用计数加一
+
+    Returns:
+        (exchange, bucket)
+    """
+    key = (api_key, market_type)
+    with _SHARED_CLIENTS_LOCK:
+        client = _SHARED_CLIENTS.get(key)
+        if client is None:
+            client = _SharedClient(
+                exchange=_build_exchange(api_key, secret, market_type),
+                bucket=TokenBucket(_RATE_LIMIT_CAPACITY, _RATE_LIMIT_REFILL_PER_SEC)
+            )
+            _SHARED_CLIENTS[key] = client
+        client.refs += 1
+        return client.exchange, client.bucket
+
+
+def _release_client(key: tuple):
+    """引用计数减一，最后一个使用者释放时关闭 HTTP 会话"""
+    with _SHARED_CLIENTS_LOCK:
+        client = _SHARED_CLIENTS.get(key)
+        if client is None:
+            return
+        client.refs -= 1
+        if client.refs > 0:
+            return
+        del _SHARED_CLIENTS[key]
+
+    try:
+        client.exchange.session.close()
+    except Exception as e:
+        logger.warning(f"关闭 HTTP 会话失败: {e}")
+
+
+def _decimal(value) -> Decimal:
+    """float 经 str 转为 Decimal，保留其十进制表示而非二进制误差"""
+    return Decimal(str(value))
+
 
 class DemoTrader(TradingInterface):
     """
@@ -32,7 +200,11 @@ class DemoTrader(TradingInterface):
         self,
         database_path: Optional[str] = None,
         fee_rate: float = 0.001,
-        use_futures: bool = False
+        use_futures: bool = False,
+        balance_ttl: float = 2.0,
+        price_ttl: float = 1.0,
+        use_websocket: bool = False,
+        skip_connectivity_check: bool = False
     ):
         """
         初始化 Demo Trading 交易器
@@ -41,6 +213,10 @@ class DemoTrader(TradingInterface):
             database_path: 数据库路径
             fee_rate: 手续费率
             use_futures: 是否使用期货交易
+            balance_ttl: 余额缓存有效期（秒），0 表示不缓存
+            price_ttl: 价格缓存有效期（秒），0 表示不缓存
+            use_websocket: 是否通过 WebSocket 推送获取行情/余额（ccxt.pro）
+            skip_connectivity_check: 跳过初始化时的连接测试，由首次实际请求暴露连接问题
         """
         import config
 
@@ -48,7 +224,17 @@ class DemoTrader(TradingInterface):
         self.use_futures = use_futures
         self.database_path = database_path or "demo_trading.db"
         self.positions: Dict[str, Dict] = {}
-        self.orders: List[OrderInfo] = []
+        self.orders: Deque[OrderInfo] = deque(maxlen=_ORDER_HISTORY_SIZE)
+        self._closed = False
+
+        # 短时缓存，避免一次决策内重复请求余额/行情：(数据, 获取时刻)
+        self.balance_ttl = balance_ttl
+        self.price_ttl = price_ttl
+        self._balance_cache: tuple = (None, 0.0)
+        self._price_cache: Dict[str, tuple] = {}
+        # 交易对信息（按交易所格式 BTCUSDT 索引），首次使用时加载
+        self._markets_by_id: Optional[Dict[str, Dict]] = None
+        self._precision_steps: Dict[tuple, Decimal] = {}
 
         # 检查 Demo Trading API Key
         if not config.DEMO_API_KEY or not config.DEMO_SECRET_KEY:
@@ -56,60 +242,68 @@ class DemoTrader(TradingInterface):
             logger.error(error_msg)
             raise ValueError(error_msg)
 
-        # 创建交易所实例
-        if use_futures:
-            self.exchange = ccxt.binance({
-                'apiKey': config.DEMO_API_KEY,
-                'secret': config.DEMO_SECRET_KEY,
-                'type': 'future',
-                'enableRateLimit': True,
-            })
-            self._mode_name = "DEMO TRADING (Futures)"
-        else:
-            self.exchange = ccxt.binance({
-                'apiKey': config.DEMO_API_KEY,
-                'secret': config.DEMO_SECRET_KEY,
-                'type': 'spot',
-                'enableRateLimit': True,
-            })
-            self._mode_name = "DEMO TRADING (Spot)"
-
-        # 尝试启用 Demo Trading 模式
-        try:
-            # 检查 CCXT 是否支持 enable_demo_trading
-            if hasattr(self.exchange, 'enable_demo_trading'):
-                self.exchange.enable_demo_trading(True)
-                logger.info("✅ 已启用 CCXT Demo Trading 模式")
-            else:
-                logger.warning("⚠️  CCXT 版本不支持 enable_demo_trading() 方法")
-        except Exception as e:
-            logger.error(f"⚠️  启用 Demo Trading 失败: {e}")
-            logger.error("可能的原因:")
-            logger.error("  1. 网络环境无法访问 demo-api.binance.com")
-            logger.error("  2. Demo Trading API Key 无效")
-            logger.error("  3. CCXT 版本过低")
-            raise
+        # 获取（同账户、同交易类型共享的）交易所实例与限流令牌桶
+        market_type = 'future' if use_futures else 'spot'
+        self._mode_name = "DEMO TRADING (Futures)" if use_futures else "DEMO TRADING (Spot)"
+        self._client_key = (config.DEMO_API_KEY, market_type)
+        self.exchange, self._bucket = _acquire_client(
+            config.DEMO_API_KEY, config.DEMO_SECRET_KEY, market_type
+        )
 
-        # 测试连接
+        # 之后任何一步初始化失败都要归还共享客户端的引用，否则该客户端永远不会被关闭
         try:
-            self.exchange.fetch_ticker('BTCUSDT')
-            logger.info("✅ Demo Trading API 连接成功")
-        except Exception as e:
-            logger.error(f"⚠️  Demo Trading API 连接失败: {e}")
-            logger.error("建议:")
-            logger.error("  1. 检查网络连接")
-            logger.error("  2. 验证 API Key 权限")
-            logger.error("  3. 尝试使用 Testnet 模式作为备选")
+            # 测试连接（服务器时间接口：权重 1、无需交易对）
+            if not skip_connectivity_check:
+                try:
+                    self._call('fetch_time')
+                    logger.info("✅ Demo Trading API 连接成功")
+                except Exception as e:
+                    logger.error(f"⚠️  Demo Trading API 连接失败: {e}")
+                    logger.error("建议:")
+                    logger.error("  1. 检查网络连接")
+                    logger.error("  2. 验证 API Key 权限")
+                    logger.error("  3. 尝试使用 Testnet 模式作为备选")
+                    raise
+
+            # 整个生命周期复用一个数据库连接，写入时加锁
+            self._db_lock = threading.Lock()
+            self._conn = sqlite3.connect(self.database_path, check_same_thread=False)
+            self._conn.executescript(_SQLITE_PRAGMAS)
+
+            self._init_database()
+
+            # 相互独立的交易所请求并发发出（ccxt 同步客户端，用线程池并发）
+            self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="demo-trader-io")
+            # 异步提交、尚未收到交易所确认的订单
+            self._pending_orders: set = set()
+
+            # 订单/余额由后台线程批量写库，不占用下单路径
+            self._write_q: queue.Queue = queue.Queue(maxsize=_WRITE_QUEUE_SIZE)
+            self._writer = threading.Thread(
+                target=self._writer_loop, name="demo-trader-db-writer", daemon=True
+            )
+            self._writer.start()
+
+            # WebSocket 推送的最新价格/余额，后台事件循环持续更新，读取时优先使用
+            self._ws_exchange = None
+            self._ws_loop: Optional[asyncio.AbstractEventLoop] = None
+            self._ws_futures: List[Any] = []
+            self._ws_tickers: Dict[str, float] = {}
+            self._ws_symbols: set = set()
+            self._ws_balance: Optional[Dict[str, float]] = None
+            if use_websocket:
+                self._start_websocket(config.DEMO_API_KEY, config.DEMO_SECRET_KEY)
+        except Exception:
+            _release_client(self._client_key)
             raise
 
-        self._init_database()
         logger.info(f"Demo Trading交易器已初始化 - 模式: {self.mode_name}")
         logger.info("初始资金: 5000 USDT, 0.05 BTC, 1 ETH, 2 BNB")
 
     def _init_database(self):
         """初始化数据库"""
         try:
-            conn = sqlite3.connect(self.database_path)
+            conn = self._conn
             cursor = conn.cursor()
 
             cursor.execute('''
@@ -153,8 +347,11 @@ class DemoTrader(TradingInterface):
                 )
             ''')
 
+            # 历史订单按时间倒序 / 按交易对查询
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_ts ON orders(timestamp DESC)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_symbol_ts ON orders(symbol, timestamp DESC)")
+
             conn.commit()
-            conn.close()
             logger.info("数据库初始化成功")
         except Exception as e:
             logger.error(f"数据库初始化失败: {e}")
@@ -162,37 +359,242 @@ class DemoTrader(TradingInterface):
 
     def get_account_balance(self) -> Dict[str, float]:
         """获取账户余额"""
+        if self._ws_balance is not None:
+            return dict(self._ws_balance)
+
+        cached, fetched_at = self._balance_cache
+        if cached is not None and time.monotonic() - fetched_at < self.balance_ttl:
+            return dict(cached)
+
         try:
-            balance = self.exchange.fetch_balance()
+            balance = self._call('fetch_balance')
             result = {asset: amount for asset, amount in balance['total'].items() if amount > 0}
             logger.debug(f"获取余额: {result}")
+            self._balance_cache = (result, time.monotonic())
             self._save_balances(result)
-            return result
+            return dict(result)
         except Exception as e:
             logger.error(f"获取余额失败: {e}")
             return {}
 
     def get_symbol_price(self, symbol: str) -> float:
         """获取当前价格"""
+        if self._ws_loop is not None:
+            price = self._ws_tickers.get(symbol)
+            if price is not None:
+                return price
+            self._subscribe_ticker(symbol)
+
+        cached = self._price_cache.get(symbol)
+        if cached is not None and time.monotonic() - cached[1] < self.price_ttl:
+            return cached[0]
+
         try:
-            ticker = self.exchange.fetch_ticker(symbol)
+            ticker = self._call('fetch_ticker', symbol)
             price = ticker['last']
             logger.debug(f"{symbol} 当前价格: {price}")
+            self._price_cache[symbol] = (price, time.monotonic())
             return price
         except Exception as e:
             logger.error(f"获取 {symbol} 价格失败: {e}")
             raise
 
+    def _start_websocket(self, api_key: str, secret: str):
+        """创建 ccxt.pro 客户端并在后台线程运行事件循环，订阅余额推送"""
+        if ccxtpro is None:
+            logger.warning("当前 ccxt 不支持 ccxt.pro，继续使用 REST 获取行情/余额")
+            return
+
+        self._ws_exchange = ccxtpro.binance({
+            'apiKey': api_key,
+            'secret': secret,
+            'type': 'future' if self.use_futures else 'spot',
+            # 先取一次完整余额快照，之后的增量推送在其上合并
+            'options': {'watchBalance': {'fetchBalanceSnapshot': True}},
+        })
+        if hasattr(self._ws_exchange, 'enable_demo_trading'):
+            self._ws_exchange.enable_demo_trading(True)
+
+        self._ws_loop = asyncio.new_event_loop()
+        self._ws_thread = threading.Thread(
+            target=self._ws_loop.run_forever, name="demo-trader-ws", daemon=True
+        )
+        self._ws_thread.start()
+        self._ws_futures.append(
+            asyncio.run_coroutine_threadsafe(self._watch_balance(), self._ws_loop)
+        )
+        logger.info("✅ 已启用 WebSocket 行情/余额推送")
+
+    def _subscribe_ticker(self, symbol: str):
+        """订阅交易对行情推送（每个交易对只订阅一次）"""
+        if symbol in self._ws_symbols:
+            return
+        self._ws_symbols.add(symbol)
+        self._ws_futures.append(
+            asyncio.run_coroutine_threadsafe(self._watch_ticker(symbol), self._ws_loop)
+        )
+
+    async def _watch_ticker(self, symbol: str):
+        """持续接收行情推送；出错时清除该价格让读取退回 REST，稍后重连"""
+        while True:
+            try:
+                ticker = await self._ws_exchange.watch_ticker(symbol)
+                self._ws_tickers[symbol] = ticker['last']
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"{symbol} 行情推送中断: {e}")
+                self._ws_tickers.pop(symbol, None)
+                await asyncio.sleep(_WS_RETRY_DELAY)
+
+    async def _watch_balance(self):
+        """持续接收余额推送；出错时清除余额让读取退回 REST，稍后重连"""
+        while True:
+            try:
+                balance = await self._ws_exchange.watch_balance()
+                self._ws_balance = {
+                    asset: amount for asset, amount in balance['total'].items() if amount and amount > 0
+                }
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"余额推送中断: {e}")
+                self._ws_balance = None
+                await asyncio.sleep(_WS_RETRY_DELAY)
+
+    def _stop_websocket(self):
+        """取消推送订阅，关闭 WebSocket 客户端并停止事件循环"""
+        for future in self._ws_futures:
+            future.cancel()
+        try:
+            asyncio.run_coroutine_threadsafe(self._ws_exchange.close(), self._ws_loop).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"关闭 WebSocket 连接失败: {e}")
+        self._ws_loop.call_soon_threadsafe(self._ws_loop.stop)
+        self._ws_thread.join(timeout=5)
+        self._ws_loop.close()
+        self._ws_loop = None
+        self._ws_tickers.clear()
+        self._ws_balance = None
+
+    def _call(self, method: str, *args, **kwargs):
+        """按接口权重消耗限流令牌后调用交易所方法"""
+        self._bucket.consume(_REQUEST_WEIGHTS.get(method, 1))
+        return getattr(self.exchange, method)(*args, **kwargs)
+
+    def _market(self, symbol: str) -> Optional[Dict]:
+        """
+        获取交易对信息（首次调用时加载全部交易对）
+
+        Args:
+            symbol: 交易对（交易所格式，如 BTCUSDT）
+
+        Returns:
+            ccxt 交易对信息，未知交易对返回 None
+        """
+        if self._markets_by_id is None:
+            try:
+                markets = self._call('load_markets')
+                # 现货与合约可能共用同一 id（如 BTCUSDT），优先当前交易类型的交易对
+                wanted = 'swap' if self.use_futures else 'spot'
+                by_id: Dict[str, Dict] = {}
+                for market in markets.values():
+                    if market['id'] not in by_id or market.get('type') == wanted:
+                        by_id[market['id']] = market
+                self._markets_by_id = by_id
+            except Exception as e:
+                logger.warning(f"加载交易对信息失败: {e}")
+
+        return (self._markets_by_id or {}).get(symbol)
+
+    def _base_asset(self, symbol: str) -> str:
+        """
+        获取交易对的基础资产（如 BTCUSDT -> BTC）
+
+        Args:
+            symbol: 交易对（交易所格式）
+
+        Returns:
+            基础资产
+        """
+        market = self._market(symbol)
+        if market:
+            return market['base']
+        return symbol[:-4] if symbol.endswith('USDT') else symbol
+
+    def _precision_step(self, symbol: str, field: str) -> Optional[Decimal]:
+        """
+        获取交易对数量/价格的最小变动单位
+
+        Args:
+            symbol: 交易对
+            field: 'amount' 或 'price'
+
+        Returns:
+            最小变动单位，交易对信息缺失时返回 None
+        """
+        key = (symbol, field)
+        if key not in self._precision_steps:
+            market = self._market(symbol)
+            precision = (market or {}).get('precision', {}).get(field)
+            if precision is None:
+                # 交易对信息未加载成功时不缓存，下次重试
+                return None
+            if getattr(self.exchange, 'precisionMode', ccxt.TICK_SIZE) == ccxt.DECIMAL_PLACES:
+                step = Decimal(1).scaleb(-int(precision))
+            else:
+                step = Decimal(str(precision))
+            self._precision_steps[key] = step
+        return self._precision_steps[key]
+
+    def _round_down(self, symbol: str, value: Decimal, field: str = 'amount') -> float:
+        """
+        按交易对精度向下取整（避免超出 LOT_SIZE/PRICE_FILTER 被交易所拒单）
+
+        Args:
+            symbol: 交易对
+            value: 数量或价格
+            field: 'amount' 或 'price'
+
+        Returns:
+            取整后的值
+        """
+        step = self._precision_step(symbol, field)
+        if step:
+            value = (value / step).to_integral_value(rounding=ROUND_DOWN) * step
+        return float(value)
+
+    def _invalidate_balance(self):
+        """下单/撤单后余额已变化，丢弃缓存"""
+        self._balance_cache = (None, 0.0)
+
     def place_market_order(
         self,
         symbol: str,
         side: str,
         amount: float,
-        reason: str = ""
+        reason: str = "",
+        async_submit: bool = False
     ) -> Dict[str, Any]:
-        """下市价单"""
+        """
+        下市价单
+
+        Args:
+            symbol: 交易对
+            side: 买卖方向
+            amount: 数量
+            reason: 原因
+            async_submit: 为 True 时不等待交易所确认，立即返回客户端订单号；
+                确认后在后台更新订单并写库，可用 wait_for_orders 等待
+
+        Returns:
+            执行结果
+        """
         try:
-            order = self.exchange.create_market_order(symbol, side, amount)
+            if async_submit:
+                return self._submit_market_order_async(symbol, side, amount, reason)
+
+            order = self._call('create_market_order', symbol, side, amount)
 
             order_info = OrderInfo(
                 order_id=str(order['id']),
@@ -207,6 +609,7 @@ class DemoTrader(TradingInterface):
                 fee=order.get('fee', {}).get('cost', 0)
             )
             self.orders.append(order_info)
+            self._invalidate_balance()
             self._save_order(order_info)
             self._update_position_from_order(order_info)
 
@@ -233,6 +636,66 @@ class DemoTrader(TradingInterface):
                 "mode": "Demo Trading"
             }
 
+    def _submit_market_order_async(self, symbol: str, side: str, amount: float, reason: str) -> Dict[str, Any]:
+        """生成客户端订单号并在线程池中提交市价单，立即返回"""
+        order_info = OrderInfo(
+            order_id=uuid.uuid4().hex,
+            symbol=symbol,
+            side=side,
+            type='market',
+            amount=amount,
+            price=None,
+            status='new'
+        )
+        # 先提交，提交成功后才记录订单（如已 close 时提交失败，不留下不存在的订单）
+        future = self._executor.submit(self._confirm_market_order, order_info)
+        self.orders.append(order_info)
+        self._pending_orders.add(future)
+        future.add_done_callback(self._pending_orders.discard)
+
+        logger.info(f"Demo Trading 市价单已异步提交: {symbol} {side} {amount} ({order_info.order_id})")
+        return {
+            "status": "submitted",
+            "order_id": order_info.order_id,
+            "symbol": symbol,
+            "side": side,
+            "amount": amount,
+            "message": f"{reason} (Demo Trading)"
+        }
+
+    def _confirm_market_order(self, order_info: OrderInfo):
+        """提交订单（以客户端订单号标识），按交易所确认原地更新订单并写库"""
+        try:
+            order = self._call(
+                'create_market_order', order_info.symbol, order_info.side, order_info.amount,
+                params={'newClientOrderId': order_info.order_id}
+            )
+            order_info.price = order.get('price')
+            order_info.status = order['status']
+            order_info.filled_amount = order.get('filled', 0)
+            order_info.filled_price = order.get('average')
+            order_info.fee = order.get('fee', {}).get('cost', 0)
+            self._invalidate_balance()
+            self._update_position_from_order(order_info)
+            logger.info(f"Demo Trading 市价单已确认: {order_info.order_id} ({order['id']})")
+        except Exception as e:
+            order_info.status = 'rejected'
+            logger.error(f"Demo Trading 异步市价单失败: {order_info.order_id}: {e}")
+        self._save_order(order_info)
+
+    def wait_for_orders(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待异步提交的订单全部收到确认
+
+        Args:
+            timeout: 最长等待秒数，为空时一直等待
+
+        Returns:
+            是否全部完成
+        """
+        _, not_done = wait(list(self._pending_orders), timeout=timeout)
+        return not not_done
+
     def place_limit_order(
         self,
         symbol: str,
@@ -243,7 +706,7 @@ class DemoTrader(TradingInterface):
     ) -> Dict[str, Any]:
         """下限价单"""
         try:
-            order = self.exchange.create_limit_order(symbol, side, amount, price)
+            order = self._call('create_limit_order', symbol, side, amount, price)
 
             order_info = OrderInfo(
                 order_id=str(order['id']),
@@ -255,6 +718,7 @@ class DemoTrader(TradingInterface):
                 status=order['status']
             )
             self.orders.append(order_info)
+            self._invalidate_balance()
             self._save_order(order_info)
 
             logger.info(f"Demo Trading 限价单提交成功: {symbol} {side} {amount} @ {price}")
@@ -283,7 +747,8 @@ class DemoTrader(TradingInterface):
     def cancel_order(self, symbol: str, order_id: str) -> Dict[str, Any]:
         """撤单"""
         try:
-            self.exchange.cancel_order(order_id, symbol)
+            self._call('cancel_order', order_id, symbol)
+            self._invalidate_balance()
             logger.info(f"Demo Trading 撤单成功: {symbol} {order_id}")
             return {"status": "success", "message": "撤单成功"}
         except Exception as e:
@@ -293,7 +758,7 @@ class DemoTrader(TradingInterface):
     def get_order_status(self, symbol: str, order_id: str) -> Dict[str, Any]:
         """获取订单状态"""
         try:
-            order = self.exchange.fetch_order(order_id, symbol)
+            order = self._call('fetch_order', order_id, symbol)
             return {
                 "status": "success",
                 "order": order
@@ -306,49 +771,74 @@ class DemoTrader(TradingInterface):
         """获取所有持仓"""
         try:
             balance = self.get_account_balance()
-            positions = []
 
             # 过滤出非稳定币资产
-            initial_assets = ['BTC', 'ETH', 'BNB', 'SOL', 'XRP', 'DOGE', 'ADA', 'DOT', 'AVAX', 'MATIC']
-            for asset, amount in balance.items():
-                if asset not in ['USDT', 'USDC', 'BUSD', 'TUSD', 'FDUSD'] and amount > 0.000001:
-                    symbol = asset + 'USDT'
-                    try:
-                        current_price = self.get_symbol_price(symbol)
-                        value = amount * current_price
-                        positions.append({
-                            'symbol': symbol,
-                            'contracts': amount,
-                            'side': 'long',
-                            'entryPrice': 0,
-                            'margin': 0,
-                            'percentage': 0,
-                            'current_price': current_price,
-                            'value': value,
-                            'is_initial_asset': asset in initial_assets,
-                            'asset': asset,
-                            'mode': 'Demo Trading'
-                        })
-                    except Exception:
-                        positions.append({
-                            'symbol': symbol,
-                            'contracts': amount,
-                            'side': 'long',
-                            'entryPrice': 0,
-                            'margin': 0,
-                            'percentage': 0,
-                            'current_price': None,
-                            'value': None,
-                            'is_initial_asset': asset in initial_assets,
-                            'asset': asset,
-                            'mode': 'Demo Trading'
-                        })
+            held = [
+                (asset, amount) for asset, amount in balance.items()
+                if asset not in _STABLES and amount > 0.000001
+            ]
+            prices = self._get_prices([asset + 'USDT' for asset, _ in held])
+
+            positions = []
+            for asset, amount in held:
+                symbol = asset + 'USDT'
+                current_price = prices.get(symbol)
+                positions.append({
+                    'symbol': symbol,
+                    'contracts': amount,
+                    'side': 'long',
+                    'entryPrice': 0,
+                    'margin': 0,
+                    'percentage': 0,
+                    'current_price': current_price,
+                    'value': amount * current_price if current_price is not None else None,
+                    'is_initial_asset': asset in _INITIAL_ASSETS,
+                    'asset': asset,
+                    'mode': 'Demo Trading'
+                })
 
             return positions
         except Exception as e:
             logger.error(f"Demo Trading 获取持仓失败: {e}")
             return []
 
+    def _get_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """
+        批量获取多个交易对的当前价格（一次 fetch_tickers 请求）
+
+        Args:
+            symbols: 交易对列表（交易所格式，如 BTCUSDT）
+
+        Returns:
+            {symbol: price}，取不到价格的交易对不在结果中
+        """
+        if not symbols:
+            return {}
+
+        try:
+            tickers = self._call('fetch_tickers', symbols)
+        except Exception as e:
+            # 某个交易对不存在时整批请求会失败，退回逐个查询
+            logger.warning(f"批量获取价格失败，改为逐个查询: {e}")
+            prices = {}
+            for symbol in symbols:
+                try:
+                    prices[symbol] = self.get_symbol_price(symbol)
+                except Exception:
+                    pass
+            return prices
+
+        # ccxt 返回以统一格式（BTC/USDT）为键的行情，原始交易对在 info 中
+        now = time.monotonic()
+        prices = {}
+        for key, ticker in tickers.items():
+            symbol = (ticker.get('info') or {}).get('symbol', key)
+            price = ticker.get('last')
+            if price is not None:
+                prices[symbol] = price
+                self._price_cache[symbol] = (price, now)
+        return prices
+
     def set_stop_loss(
         self,
         symbol: str,
@@ -364,7 +854,8 @@ class DemoTrader(TradingInterface):
             else:
                 limit_price = stop_price * 1.005
 
-            order = self.exchange.create_order(
+            order = self._call(
+                'create_order',
                 symbol=symbol,
                 type='stop',
                 side='sell' if side.lower() == 'long' else 'buy',
@@ -403,15 +894,24 @@ class DemoTrader(TradingInterface):
             return {"status": "error", "message": f"决策无效: {msg}"}
 
         try:
-            current_price = price_override or self.get_symbol_price(decision.symbol)
-
             if decision.action == "BUY":
-                balance = self.get_account_balance()
+                # 价格和余额互不依赖，同时请求
+                if price_override:
+                    current_price = price_override
+                    balance = self.get_account_balance()
+                else:
+                    price_future = self._executor.submit(self.get_symbol_price, decision.symbol)
+                    balance_future = self._executor.submit(self.get_account_balance)
+                    current_price = price_future.result()
+                    balance = balance_future.result()
+
                 if 'USDT' not in balance or balance['USDT'] <= 0:
                     return {"status": "error", "message": "Demo Trading 余额不足"}
 
-                usdt_amount = balance['USDT'] * (decision.position_size / 100)
-                amount = usdt_amount / current_price
+                usdt_amount = _decimal(balance['USDT']) * _decimal(decision.position_size) / 100
+                amount = self._round_down(decision.symbol, usdt_amount / _decimal(current_price))
+                if amount <= 0:
+                    return {"status": "error", "message": "Demo Trading 下单数量低于最小交易单位"}
 
                 order_result = self.place_market_order(
                     symbol=decision.symbol,
@@ -425,48 +925,28 @@ class DemoTrader(TradingInterface):
                         symbol=decision.symbol,
                         side='long',
                         amount=amount,
-                        stop_price=decision.stop_loss,
+                        stop_price=self._round_down(decision.symbol, _decimal(decision.stop_loss), 'price'),
                         reason=f"止损-{decision.reasoning[:50]}"
                     )
 
                 return order_result
 
             elif decision.action == "SELL":
-                positions = self.get_open_positions()
-                position = None
-                for pos in positions:
-                    if pos['symbol'] == decision.symbol and float(pos['contracts']) > 0:
-                        position = pos
-                        break
-
-                if not position:
-                    balance = self.get_account_balance()
-                    base_asset = decision.symbol.replace('USDT', '').replace('BTC', '').replace('ETH', '').replace('BNB', '')
-                    if decision.symbol.endswith('BTCUSDT'):
-                        base_asset = 'BTC'
-                    elif decision.symbol.endswith('ETHUSDT'):
-                        base_asset = 'ETH'
-                    elif decision.symbol.endswith('BNBUSDT'):
-                        base_asset = 'BNB'
-                    elif decision.symbol.endswith('SOLUSDT'):
-                        base_asset = 'SOL'
-                    elif decision.symbol.endswith('XRPUSDT'):
-                        base_asset = 'XRP'
-                    elif decision.symbol.endswith('DOGEUSDT'):
-                        base_asset = 'DOGE'
-
-                    if base_asset in balance and balance[base_asset] > 0:
-                        initial_balance = balance[base_asset]
-                        amount = initial_balance * (decision.position_size / 100)
-                        logger.info(f"Demo Trading 使用初始 {base_asset} 持仓进行做空: {amount}")
-                    else:
-                        return {
-                            "status": "error",
-                            "message": f"Demo Trading 未找到 {decision.symbol} 的持仓",
-                            "hint": "可使用初始资产进行做空操作"
-                        }
-                else:
-                    amount = float(position['contracts']) * (decision.position_size / 100)
+                # 现货持仓即基础资产余额，一次余额查询即可确定卖出数量，无需逐个拉取行情
+                balance = self.get_account_balance()
+                base_asset = self._base_asset(decision.symbol)
+                held = balance.get(base_asset, 0)
+                if held <= 0:
+                    return {
+                        "status": "error",
+                        "message": f"Demo Trading 未找到 {decision.symbol} 的持仓",
+                        "hint": "可使用初始资产进行做空操作"
+                    }
+                amount = _decimal(held) * _decimal(decision.position_size) / 100
+
+                amount = self._round_down(decision.symbol, amount)
+                if amount <= 0:
+                    return {"status": "error", "message": "Demo Trading 下单数量低于最小交易单位"}
 
                 order_result = self.place_market_order(
                     symbol=decision.symbol,
@@ -495,48 +975,136 @@ class DemoTrader(TradingInterface):
         pass
 
     def _save_order(self, order: OrderInfo):
-        """保存订单到数据库"""
-        try:
-            conn = sqlite3.connect(self.database_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO orders
-                (order_id, symbol, side, type, amount, price, status,
-                 filled_amount, filled_price, timestamp, fee, pnl)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                order.order_id, order.symbol, order.side, order.type,
-                order.amount, order.price, order.status,
-                order.filled_amount, order.filled_price,
-                order.timestamp.isoformat(), order.fee, order.pnl
-            ))
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            logger.error(f"保存订单失败: {e}")
+        """保存订单到数据库（交给后台线程写入）"""
+        self._enqueue_write('order', (
+            order.order_id, order.symbol, order.side, order.type,
+            order.amount, order.price, order.status,
+            order.filled_amount, order.filled_price,
+            order.timestamp.isoformat(), order.fee, order.pnl
+        ))
 
     def _save_balances(self, balances: Dict[str, float]):
-        """保存余额到数据库"""
+        """保存余额到数据库（交给后台线程写入）"""
+        rows = [(asset, amount, 0.0, amount) for asset, amount in balances.items()]
+        self._enqueue_write('balances', rows)
+
+    def _enqueue_write(self, kind: str, payload):
+        """将写库任务放入队列，队列满时退回同步写入"""
         try:
-            conn = sqlite3.connect(self.database_path)
-            cursor = conn.cursor()
-            for asset, amount in balances.items():
-                cursor.execute('''
-                    INSERT OR REPLACE INTO balances
-                    (asset, free, locked, total)
-                    VALUES (?, ?, ?, ?)
-                ''', (asset, amount, 0, amount))
-            conn.commit()
-            conn.close()
+            self._write_q.put_nowait((kind, payload))
+        except queue.Full:
+            logger.warning("写库队列已满，改为同步写入")
+            self._write_batch([(kind, payload)])
+
+    def _writer_loop(self):
+        """后台写库线程：凑够一批或等待超时后一次性写入"""
+        while True:
+            item = self._write_q.get()
+            if item is _WRITER_STOP:
+                self._write_q.task_done()
+                return
+
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + _WRITE_BATCH_WAIT
+            while len(batch) < _WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._write_q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _WRITER_STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._write_batch(batch)
+            for _ in range(len(batch) + stop):
+                self._write_q.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[tuple]):
+        """在一个事务内写入一批订单/余额"""
+        orders = [payload for kind, payload in batch if kind == 'order']
+        balances = [row for kind, payload in batch if kind == 'balances' for row in payload]
+        try:
+            with self._db_lock, self._conn:
+                if orders:
+                    self._conn.executemany(_INSERT_ORDER_SQL, orders)
+                if balances:
+                    self._conn.executemany(_INSERT_BALANCE_SQL, balances)
         except Exception as e:
-            logger.error(f"保存余额失败: {e}")
+            logger.error(f"保存订单/余额失败: {e}")
+
+    def flush(self):
+        """等待后台线程写完已排队的订单/余额"""
+        self._write_q.join()
 
     def get_trades(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """获取交易记录"""
-        return [order.to_dict() for order in self.orders[-limit:]]
+        """获取交易记录（内存中最近的订单）"""
+        start = max(0, len(self.orders) - limit)
+        return [order.to_dict() for order in islice(self.orders, start, None)]
+
+    def get_order_history(self, limit: int = 100, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        从数据库查询历史订单（按时间倒序）
+
+        Args:
+            limit: 返回条数
+            symbol: 交易对，为空时查询全部
+
+        Returns:
+            订单字典列表
+        """
+        self.flush()
+        query = "SELECT * FROM orders"
+        params: tuple = ()
+        if symbol:
+            query += " WHERE symbol = ?"
+            params = (symbol,)
+        query += " ORDER BY timestamp DESC LIMIT ?"
+
+        try:
+            with self._db_lock:
+                cursor = self._conn.execute(query, params + (limit,))
+                columns = [col[0] for col in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"查询历史订单失败: {e}")
+            return []
 
     def close(self):
-        """关闭连接"""
+        """
+        关闭交易器（可重复调用）
+
+        依次停止行情推送、等待进行中的请求和异步订单、写完排队的数据库记录，
+        最后关闭数据库连接和 HTTP 会话
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._ws_loop is not None:
+            self._stop_websocket()
+
+        # 异步订单确认后才会进入写库队列，需先等线程池清空
+        self._executor.shutdown(wait=True)
+
+        # 先让写库线程写完队列中的记录再退出
+        self._write_q.put(_WRITER_STOP)
+        self._writer.join(timeout=5)
+        if self._writer.is_alive():
+            logger.warning("写库线程未按时退出，部分订单/余额可能未保存")
+
+        with self._db_lock:
+            self._conn.commit()
+            self._conn.close()
+
+        _release_client(self._client_key)
+
         logger.info("Demo Trading交易器已关闭")
 
     @property
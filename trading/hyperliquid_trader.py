@@ -9,11 +9,25 @@ import os
 import json
 import sqlite3
 import logging
-from typing import Dict, Optional, List, Any
+import time
+from typing import Deque, Dict, Optional, List, Any, Tuple
 from datetime import datetime
 from dataclasses import dataclass, asdict
+from functools import lru_cache
 import asyncio
-from threading import Lock
+from collections import deque
+from itertools import islice
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock, Thread
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # 未安装时回退到 requests 自带的 json 解析
 
 from trading.base import TradingInterface, OrderInfo
 from models.trading_decision import TradingDecision
@@ -33,10 +47,84 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+# 订单/余额记录可容忍断电时丢失最后几笔，换取写入不再逐次 fsync
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;"
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA temp_store=MEMORY;"
+    "PRAGMA cache_size=-8192;"
+)
+
+# Info/Exchange 共用的 HTTP 会话连接池（不自动重试，避免重复提交下单/撤单）
+_HTTP_POOL_CONNECTIONS = 4
+_HTTP_POOL_MAXSIZE = 16
+
+# WebSocket 推送数据的最长可信时间（秒），超过后（如连接中断）退回 REST 查询
+_WS_MAX_AGE = 10.0
+
+# 余额未变化时重复写库的最短间隔（秒）
+_BALANCE_PERSIST_INTERVAL = 5.0
+
+# REST 挂单索引的缓存有效期（秒）
+_OPEN_ORDERS_TTL = 0.5
+
+
+_CREATE_ORDERS_SQL = """
+    CREATE TABLE IF NOT EXISTS orders (
+        order_id TEXT PRIMARY KEY,
+        coin TEXT,
+        side TEXT,
+        size REAL,
+        price REAL,
+        order_type TEXT,
+        status TEXT,
+        timestamp INTEGER,
+        reduce_only BOOLEAN
+    )
+"""
+
+# 内存中保留的最近订单数，更早的订单通过 get_order_history 从数据库查询
+_ORDER_HISTORY_SIZE = 10_000
+
+# 写入语句固定为模块常量，sqlite3 按 SQL 文本缓存预编译语句，重复执行无需重新解析
+_INSERT_ORDER_SQL = """
+    INSERT OR REPLACE INTO orders
+    (order_id, coin, side, size, price, order_type, status, timestamp, reduce_only)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_BALANCE_SQL = """
+    INSERT OR REPLACE INTO balances
+    (asset, amount, timestamp)
+    VALUES (?, ?, ?)
+"""
+
+
+@lru_cache(maxsize=512)
+def _convert_symbol_to_hyperliquid(symbol: str) -> str:
+    """将标准symbol转换为Hyperliquid格式"""
+    # BTCUSDT -> BTC
+    if symbol.endswith('USDT'):
+        return symbol[:-4]
+    return symbol
 
-@dataclass
+
+@lru_cache(maxsize=512)
+def _convert_symbol_from_hyperliquid(coin: str) -> str:
+    """将Hyperliquid格式转换为标准symbol"""
+    # BTC -> BTCUSDT
+    return f"{coin}USDT"
+
+
+def _orjson_response_hook(response, *args, **kwargs):
+    """让 response.json() 改用 orjson 解析（SDK 的全部响应都经 response.json() 解析）"""
+    content = response.content
+    response.json = lambda **_: orjson.loads(content)
+    return response
+
+
+@dataclass(slots=True)
 class HyperliquidOrderInfo:
-    """Hyperliquid订单信息"""
+    """Hyperliquid订单信息（slots：订单在内存中大量保留）"""
     order_id: str
     coin: str
     side: str  # 'buy' or 'sell'
@@ -44,9 +132,14 @@ class HyperliquidOrderInfo:
     price: float
     order_type: str  # 'limit', 'market', 'trigger'
     status: str  # 'pending', 'filled', 'cancelled'
-    timestamp: datetime
+    timestamp: int  # Unix 纪元纳秒（time.time_ns()），下单热路径不构造 datetime
     reduce_only: bool = False
 
+    @property
+    def timestamp_dt(self) -> datetime:
+        """本地时间 datetime（仅在转换/序列化时构造）"""
+        return datetime.fromtimestamp(self.timestamp / 1e9)
+
     def to_order_info(self) -> OrderInfo:
         """转换为标准OrderInfo格式"""
         symbol = f"{self.coin}USDT"
@@ -58,9 +151,26 @@ class HyperliquidOrderInfo:
             amount=self.size,
             price=self.price,
             status=self.status,
-            timestamp=self.timestamp
+            timestamp=self.timestamp_dt
         )
 
+    def to_dict(self) -> Dict[str, Any]:
+        """直接转换为标准订单字典（与 OrderInfo.to_dict 格式一致，省去中间对象）"""
+        return {
+            'order_id': self.order_id,
+            'symbol': _convert_symbol_from_hyperliquid(self.coin),
+            'side': self.side,
+            'type': self.order_type,
+            'amount': self.size,
+            'price': self.price,
+            'status': self.status,
+            'filled_amount': 0.0,
+            'filled_price': None,
+            'timestamp': self.timestamp_dt.isoformat(),
+            'fee': 0.0,
+            'pnl': 0.0
+        }
+
 
 class HyperliquidTrader(TradingInterface):
     """
@@ -80,7 +190,9 @@ class HyperliquidTrader(TradingInterface):
         database_path: Optional[str] = None,
         use_testnet: bool = False,
         agent_private_key: Optional[str] = None,
-        main_wallet_address: Optional[str] = None
+        main_wallet_address: Optional[str] = None,
+        mids_ttl: float = 0.25,
+        use_websocket: bool = False
     ):
         """
         初始化Hyperliquid交易执行器
@@ -90,6 +202,8 @@ class HyperliquidTrader(TradingInterface):
             use_testnet: 是否使用测试网
             agent_private_key: Agent钱包私钥（用于签名）
             main_wallet_address: 主钱包地址（持有资金）
+            mids_ttl: 全市场中间价缓存有效期（秒），0 表示不缓存
+            use_websocket: 是否订阅 WebSocket 推送的中间价/持仓/挂单（替代 REST 轮询）
         """
         if Exchange is None or Info is None:
             raise ImportError("Hyperliquid SDK 未安装，请运行: source venv/bin/activate && pip install -r requirements.txt")
@@ -123,8 +237,11 @@ class HyperliquidTrader(TradingInterface):
                 account_address=self.main_wallet_address
             )
 
-            # 创建Info实例
-            self.info = Info()
+            # 创建Info实例（不使用推送时不启动 SDK 的 WebSocket 线程）
+            self.info = Info(skip_ws=not use_websocket)
+
+            # Info/Exchange 共用一个带连接池的 HTTP 会话
+            self._init_http_session()
 
             # 获取Agent钱包地址（从私钥推导）
             agent_account = Account.from_key(private_key)
@@ -145,9 +262,48 @@ class HyperliquidTrader(TradingInterface):
 
         self.database_path = database_path or "hyperliquid_trading.db"
         self.positions: Dict[str, Dict] = {}
-        self.orders: List[HyperliquidOrderInfo] = []
+        # 内存中只保留最近的订单，完整历史通过 get_order_history 从数据库查询
+        self.orders: Deque[HyperliquidOrderInfo] = deque(maxlen=_ORDER_HISTORY_SIZE)
         self.meta_cache = None
         self.meta_lock = Lock()
+        self._sz_decimals: Dict[str, int] = {}  # 币种 -> 数量精度，由 _refresh_meta 生成
+
+        # 全市场中间价短时缓存：(获取时刻, {币种: 价格})，多个币种的查询共用一次请求
+        self.mids_ttl = mids_ttl
+        self._mids_cache: tuple = (0.0, {})
+        self._mids_lock = Lock()
+
+        # WebSocket 推送的最新数据：(接收时刻, 数据)
+        self._ws_mids: Optional[tuple] = None
+        self._ws_user_state: Optional[tuple] = None
+        self._ws_open_orders: Optional[tuple] = None
+        self._open_orders_cache: tuple = (0.0, None)
+
+        # 最近一次写库的余额及时刻
+        self._saved_balances: Optional[Dict[str, float]] = None
+        self._saved_balances_at = 0.0
+        if use_websocket:
+            self._subscribe_websocket()
+
+        # 整个生命周期复用一个数据库连接，写入时加锁
+        self._db_lock = Lock()
+        self._conn = sqlite3.connect(self.database_path, check_same_thread=False)
+        self._conn.executescript(_SQLITE_PRAGMAS)
+        self._closed = False
+
+        # 相互独立的查询并发发出（SDK 为同步客户端，用线程池并发）
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hyperliquid-io")
+        # execute_decision_async 在后台提交止损单的专用线程池（不依赖调用方的事件循环，
+        # close 时统一等待；与 _executor 分开，避免止损单内部再向 _executor 提交查询时互相等待）
+        self._stop_loss_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hyperliquid-stop-loss")
+        self._stop_loss_futures: set = set()
+        # 同步调用方提交协程用的常驻事件循环（首次使用时在后台线程启动），避免每次 asyncio.run 重建循环
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[Thread] = None
+        self._loop_lock = Lock()
+        # 每个交易对最近一次成功设置的止损 (side, size, stop_price, 总持仓, 止损单 oid)；
+        # 止损单仍挂着且持仓未变化时，相同止损不重复提交。该交易对有任何成交即清除
+        self._last_stop: Dict[str, Tuple[str, float, float, float, str]] = {}
 
         self._init_database()
         self._refresh_meta()
@@ -155,26 +311,34 @@ class HyperliquidTrader(TradingInterface):
         mode_name = "Hyperliquid Testnet" if use_testnet else "Hyperliquid Mainnet"
         logger.info(f"Hyperliquid交易执行器已初始化 - 模式: {mode_name}")
 
+    def _init_http_session(self):
+        """创建共享 HTTP 会话并替换 SDK 客户端各自的会话"""
+        self._http = requests.Session()
+        self._http.headers.update({"Content-Type": "application/json"})
+        # 只挂载一个适配器，所有请求共用同一个连接池
+        self._http.mount('https://', HTTPAdapter(
+            pool_connections=_HTTP_POOL_CONNECTIONS,
+            pool_maxsize=_HTTP_POOL_MAXSIZE
+        ))
+        if orjson is not None:
+            self._http.hooks['response'].append(_orjson_response_hook)
+
+        # Exchange 内部还有一个自己的 Info 客户端，也一并替换
+        for client in (self.info, self.exchange, self.exchange.info):
+            client.session.close()
+            client.session = self._http
+
     def _init_database(self):
         """初始化数据库"""
         try:
-            conn = sqlite3.connect(self.database_path)
+            conn = self._conn
             cursor = conn.cursor()
 
-            # 创建订单表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS orders (
-                    order_id TEXT PRIMARY KEY,
-                    coin TEXT,
-                    side TEXT,
-                    size REAL,
-                    price REAL,
-                    order_type TEXT,
-                    status TEXT,
-                    timestamp TEXT,
-                    reduce_only BOOLEAN
-                )
-            ''')
+            # 创建订单表（timestamp 为 Unix 纪元微秒整数）
+            cursor.execute(_CREATE_ORDERS_SQL)
+            self._migrate_order_timestamps(cursor)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_ts ON orders(timestamp DESC)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_coin_ts ON orders(coin, timestamp DESC)")
 
             # 创建持仓表
             cursor.execute('''
@@ -189,13 +353,40 @@ class HyperliquidTrader(TradingInterface):
                 )
             ''')
 
+            # 创建余额表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS balances (
+                    asset TEXT PRIMARY KEY,
+                    amount REAL,
+                    timestamp TEXT
+                )
+            ''')
+
             conn.commit()
-            conn.close()
             logger.info("Hyperliquid数据库初始化成功")
         except Exception as e:
             logger.error(f"数据库初始化失败: {e}")
             raise
 
+    @staticmethod
+    def _migrate_order_timestamps(cursor: sqlite3.Cursor):
+        """旧版订单表的 timestamp 为 ISO 字符串（本地时间），迁移为纪元微秒整数"""
+        columns = {row[1]: row[2] for row in cursor.execute("PRAGMA table_info(orders)")}
+        if columns.get('timestamp', '').upper() != 'TEXT':
+            return
+
+        logger.info("迁移订单表 timestamp 为整数（纪元微秒）")
+        cursor.execute("ALTER TABLE orders RENAME TO orders_old")
+        cursor.execute(_CREATE_ORDERS_SQL)
+        cursor.execute('''
+            INSERT INTO orders
+            SELECT order_id, coin, side, size, price, order_type, status,
+                   CAST(ROUND((julianday(timestamp, 'utc') - 2440587.5) * 86400000000) AS INTEGER),
+                   reduce_only
+            FROM orders_old
+        ''')
+        cursor.execute("DROP TABLE orders_old")
+
     def _refresh_meta(self):
         """刷新meta信息（包含精度等）"""
         try:
@@ -206,22 +397,18 @@ class HyperliquidTrader(TradingInterface):
             logger.error(f"刷新Meta信息失败: {e}")
             self.meta_cache = {'universe': []}
 
+        # 整体替换精度表，读取方无需加锁
+        self._sz_decimals = {
+            asset['name']: asset.get('szDecimals', 4) for asset in self.meta_cache.get('universe', [])
+        }
+
     def _get_sz_decimals(self, coin: str) -> int:
         """获取币种的数量精度"""
-        try:
-            with self.meta_lock:
-                if not self.meta_cache:
-                    self._refresh_meta()
-
-                for asset in self.meta_cache.get('universe', []):
-                    if asset['name'] == coin:
-                        return asset.get('szDecimals', 4)
-
-                logger.warning(f"未找到 {coin} 的精度信息，使用默认精度4")
-                return 4
-        except Exception as e:
-            logger.error(f"获取 {coin} 精度失败: {e}")
+        decimals = self._sz_decimals.get(coin)
+        if decimals is None:
+            logger.warning(f"未找到 {coin} 的精度信息，使用默认精度4")
             return 4
+        return decimals
 
     def _round_to_sz_decimals(self, coin: str, value: float) -> float:
         """将数值四舍五入到正确的数量精度"""
@@ -229,46 +416,52 @@ class HyperliquidTrader(TradingInterface):
         multiplier = 10 ** decimals
         return round(value * multiplier) / multiplier
 
+    def _round_to_sz_decimals_batch(self, coins: List[str], values) -> np.ndarray:
+        """
+        批量将数量四舍五入到各币种的数量精度（与 _round_to_sz_decimals 结果一致）
+
+        Args:
+            coins: 币种列表
+            values: 与币种一一对应的数量
+
+        Returns:
+            舍入后的数量数组
+        """
+        decimals = np.fromiter((self._get_sz_decimals(coin) for coin in coins), dtype=np.int64, count=len(coins))
+        multipliers = np.power(10.0, decimals)
+        return np.round(np.asarray(values, dtype=np.float64) * multipliers) / multipliers
+
     def _round_price_to_sigfigs(self, price: float, sigfigs: int = 5) -> float:
         """将价格四舍五入到指定有效数字"""
-        if price == 0:
-            return 0
-
-        import math
-        magnitude = math.floor(math.log10(abs(price)))
-        factor = 10 ** (sigfigs - 1 - magnitude)
-        return round(price * factor) / factor
-
-    def _convert_symbol_to_hyperliquid(self, symbol: str) -> str:
-        """将标准symbol转换为Hyperliquid格式"""
-        # BTCUSDT -> BTC
-        if symbol.endswith('USDT'):
-            return symbol[:-4]
-        return symbol
-
-    def _convert_symbol_from_hyperliquid(self, coin: str) -> str:
-        """将Hyperliquid格式转换为标准symbol"""
-        # BTC -> BTCUSDT
-        return f"{coin}USDT"
+        # 'g' 格式按有效数字舍入（C 实现），无需 log10/pow 计算数量级
+        return float(f"{price:.{sigfigs}g}")
+
+    # 符号转换在每次下单/查价时调用，使用模块级缓存版本
+    _convert_symbol_to_hyperliquid = staticmethod(_convert_symbol_to_hyperliquid)
+    _convert_symbol_from_hyperliquid = staticmethod(_convert_symbol_from_hyperliquid)
 
     @property
     def mode_name(self) -> str:
         """获取交易模式名称"""
         return "Hyperliquid Testnet" if self.use_testnet else "Hyperliquid Mainnet"
 
-    def get_account_balance(self) -> Dict[str, float]:
+    def get_account_balance(self, persist: bool = True) -> Dict[str, float]:
         """
         获取账户余额
 
+        Args:
+            persist: 是否写入数据库（余额未变化时最多每 _BALANCE_PERSIST_INTERVAL 秒写一次）；
+                决策执行路径传 False，只读取不写库
+
         Returns:
             余额字典 {asset: amount}
         """
         try:
-            # 获取账户状态
-            user_state = self.info.user_state(self.main_wallet_address)
-
-            # 获取现货余额
-            spot_state = self.info.spot_user_state(self.main_wallet_address)
+            # 合约账户状态与现货余额互不依赖，同时请求
+            user_future = self._executor.submit(self.info.user_state, self.main_wallet_address)
+            spot_future = self._executor.submit(self.info.spot_user_state, self.main_wallet_address)
+            user_state = user_future.result()
+            spot_state = spot_future.result()
 
             result = {}
 
@@ -290,13 +483,55 @@ class HyperliquidTrader(TradingInterface):
                 result['total_account_value'] = account_value
 
             logger.info(f"获取Hyperliquid余额: {result}")
-            self._save_balances(result)
+            if persist:
+                self._maybe_save_balances(result)
             return result
 
         except Exception as e:
             logger.error(f"获取Hyperliquid余额失败: {e}")
             return {}
 
+    def _subscribe_websocket(self):
+        """订阅全市场中间价与账户数据（webData2 含持仓和挂单）推送"""
+        self.info.subscribe({"type": "allMids"}, self._on_all_mids)
+        self.info.subscribe({"type": "webData2", "user": self.main_wallet_address}, self._on_web_data)
+        logger.info("✅ 已订阅Hyperliquid WebSocket推送")
+
+    def _on_all_mids(self, msg: Dict[str, Any]):
+        """中间价推送回调"""
+        self._ws_mids = (time.monotonic(), msg['data']['mids'])
+
+    def _on_web_data(self, msg: Dict[str, Any]):
+        """账户数据推送回调：持仓状态与挂单（按订单号索引）"""
+        data = msg['data']
+        now = time.monotonic()
+        if 'clearinghouseState' in data:
+            self._ws_user_state = (now, data['clearinghouseState'])
+        if 'openOrders' in data:
+            self._ws_open_orders = (now, {str(order['oid']): order for order in data['openOrders']})
+
+    @staticmethod
+    def _ws_fresh(entry: Optional[tuple]) -> Optional[Any]:
+        """返回未过期的推送数据，没有或已过期时返回 None"""
+        if entry is not None and time.monotonic() - entry[0] < _WS_MAX_AGE:
+            return entry[1]
+        return None
+
+    def _get_all_mids(self) -> Dict[str, str]:
+        """获取全市场中间价（优先使用推送；有效期内复用缓存，并发调用只发一次请求）"""
+        mids = self._ws_fresh(self._ws_mids)
+        if mids is not None:
+            return mids
+
+        with self._mids_lock:
+            fetched_at, mids = self._mids_cache
+            if mids and time.monotonic() - fetched_at < self.mids_ttl:
+                return mids
+
+            mids = self.info.all_mids()
+            self._mids_cache = (time.monotonic(), mids)
+            return mids
+
     def get_symbol_price(self, symbol: str) -> float:
         """
         获取当前价格
@@ -311,7 +546,7 @@ class HyperliquidTrader(TradingInterface):
             coin = self._convert_symbol_to_hyperliquid(symbol)
 
             # 获取所有市场价格
-            all_mids = self.info.all_mids()
+            all_mids = self._get_all_mids()
 
             if coin in all_mids:
                 price = float(all_mids[coin])
@@ -381,10 +616,13 @@ class HyperliquidTrader(TradingInterface):
                 price=price,
                 order_type='market',
                 status='filled',
-                timestamp=datetime.now()
+                timestamp=time.time_ns()
             )
             self.orders.append(order_info)
+            self._invalidate_open_orders()
             self._save_order(order_info)
+            # 持仓已变化，原止损不再覆盖当前持仓
+            self._last_stop.pop(symbol, None)
 
             logger.info(f"Hyperliquid市价单执行成功: {symbol} {side} {size} @ {price}")
             return {
@@ -454,10 +692,13 @@ class HyperliquidTrader(TradingInterface):
                 price=rounded_price,
                 order_type='limit',
                 status='pending',
-                timestamp=datetime.now()
+                timestamp=time.time_ns()
             )
             self.orders.append(order_info)
+            self._invalidate_open_orders()
             self._save_order(order_info)
+            # 限价单可能立即成交，持仓随之变化
+            self._last_stop.pop(symbol, None)
 
             logger.info(f"Hyperliquid限价单提交成功: {symbol} {side} {size} @ {rounded_price}")
             return {
@@ -497,6 +738,9 @@ class HyperliquidTrader(TradingInterface):
 
             # 取消订单
             self.exchange.cancel_by_cloid(coin, Cloid(order_id))
+            self._invalidate_open_orders()
+            # 撤掉的可能是止损单
+            self._last_stop.pop(symbol, None)
 
             logger.info(f"Hyperliquid撤单成功: {symbol} {order_id}")
             return {"status": "success", "message": "撤单成功"}
@@ -505,6 +749,21 @@ class HyperliquidTrader(TradingInterface):
             logger.error(f"Hyperliquid撤单失败: {e}")
             return {"status": "error", "message": str(e)}
 
+    def _get_open_orders_index(self) -> Dict[str, Dict[str, Any]]:
+        """查询挂单并按订单号索引（短时缓存，连续查询多个订单只请求一次）"""
+        fetched_at, index = self._open_orders_cache
+        if index is not None and time.monotonic() - fetched_at < _OPEN_ORDERS_TTL:
+            return index
+
+        orders = self.info.open_orders(self.main_wallet_address)
+        index = {str(order['oid']): order for order in orders}
+        self._open_orders_cache = (time.monotonic(), index)
+        return index
+
+    def _invalidate_open_orders(self):
+        """下单/撤单后挂单已变化，丢弃缓存"""
+        self._open_orders_cache = (0.0, None)
+
     def get_order_status(self, symbol: str, order_id: str) -> Dict[str, Any]:
         """
         获取订单状态
@@ -519,22 +778,60 @@ class HyperliquidTrader(TradingInterface):
         try:
             coin = self._convert_symbol_to_hyperliquid(symbol)
 
-            # 获取订单状态
-            orders = self.info.open_orders(self.main_wallet_address)
-
-            for order in orders:
-                if str(order['oid']) == order_id:
-                    return {
-                        "status": "success",
-                        "order": order
-                    }
+            # 优先使用推送的挂单，否则使用 REST 查询结果的索引
+            open_orders = self._ws_fresh(self._ws_open_orders)
+            if open_orders is None:
+                open_orders = self._get_open_orders_index()
 
+            order = open_orders.get(order_id)
+            if order is not None:
+                return {"status": "success", "order": order}
             return {"status": "error", "message": "未找到订单"}
 
         except Exception as e:
             logger.error(f"查询Hyperliquid订单失败: {e}")
             return {"status": "error", "message": str(e)}
 
+    @staticmethod
+    def _position_arrays(asset_positions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        将持仓列表解析为列式数组（跳过数量为 0 的持仓）
+
+        Args:
+            asset_positions: user_state 中的 assetPositions
+
+        Returns:
+            {'coins': 币种列表, 'sizes'/'entry_prices'/'position_values'/'mark_prices'/
+             'unrealized_pnl'/'leverage': float64 数组}，数量为带方向的持仓量
+        """
+        coins, sizes, entry_prices, values, pnl, leverage = [], [], [], [], [], []
+        for asset_pos in asset_positions:
+            position = asset_pos['position']
+            size = float(position['szi'])
+            if size == 0:
+                continue
+            coins.append(position['coin'])
+            sizes.append(size)
+            entry_prices.append(position['entryPx'] or 0)
+            values.append(position['positionValue'])
+            pnl.append(position['unrealizedPnl'])
+            leverage.append(position['leverage']['value'] if position['leverage'] else 1)
+
+        sizes = np.asarray(sizes, dtype=np.float64)
+        abs_sizes = np.abs(sizes)
+        position_values = np.asarray(values, dtype=np.float64)
+        return {
+            'coins': coins,
+            'sizes': sizes,
+            'entry_prices': np.asarray(entry_prices, dtype=np.float64),
+            'position_values': position_values,
+            'mark_prices': np.divide(
+                position_values, abs_sizes, out=np.zeros_like(abs_sizes), where=abs_sizes != 0
+            ),
+            'unrealized_pnl': np.asarray(pnl, dtype=np.float64),
+            'leverage': np.asarray(leverage, dtype=np.float64),
+        }
+
     def get_open_positions(self) -> List[Dict[str, Any]]:
         """
         获取所有持仓
@@ -543,35 +840,33 @@ class HyperliquidTrader(TradingInterface):
             持仓列表
         """
         try:
-            # 获取账户状态
-            user_state = self.info.user_state(self.main_wallet_address)
-
-            positions = []
-
-            # 处理持仓信息
-            if 'assetPositions' in user_state:
-                for asset_pos in user_state['assetPositions']:
-                    position = asset_pos['position']
-
-                    # 持仓数量
-                    size = float(position['szi'])
-                    if size == 0:
-                        continue
-
-                    coin = position['coin']
-                    symbol = self._convert_symbol_from_hyperliquid(coin)
-
-                    pos_data = {
-                        'symbol': symbol,
-                        'side': 'long' if size > 0 else 'short',
-                        'positionAmt': abs(size),
-                        'entryPrice': float(position['entryPx']) if position['entryPx'] else 0,
-                        'markPrice': float(position['positionValue']) / abs(size) if size != 0 else 0,
-                        'unRealizedProfit': float(position['unrealizedPnl']),
-                        'leverage': float(position['leverage']['value']) if position['leverage'] else 1
-                    }
-
-                    positions.append(pos_data)
+            # 获取账户状态（优先使用推送）
+            user_state = self._ws_fresh(self._ws_user_state)
+            if user_state is None:
+                user_state = self.info.user_state(self.main_wallet_address)
+
+            columns = self._position_arrays(user_state.get('assetPositions', []))
+
+            # 只在返回边界处组装为字典
+            positions = [
+                {
+                    'symbol': self._convert_symbol_from_hyperliquid(coin),
+                    'side': 'long' if size > 0 else 'short',
+                    'positionAmt': abs(size),
+                    'entryPrice': entry_price,
+                    'markPrice': mark_price,
+                    'unRealizedProfit': pnl,
+                    'leverage': leverage
+                }
+                for coin, size, entry_price, mark_price, pnl, leverage in zip(
+                    columns['coins'],
+                    columns['sizes'].tolist(),
+                    columns['entry_prices'].tolist(),
+                    columns['mark_prices'].tolist(),
+                    columns['unrealized_pnl'].tolist(),
+                    columns['leverage'].tolist()
+                )
+            ]
 
             return positions
 
@@ -611,6 +906,23 @@ class HyperliquidTrader(TradingInterface):
             size = self._round_to_sz_decimals(coin, amount)
             rounded_stop_price = self._round_price_to_sigfigs(stop_price)
 
+            # 与上次设置的止损完全相同、且该止损单仍挂着并覆盖同样的总持仓时直接返回
+            stop_key = (side, size, rounded_stop_price)
+            if self._stop_still_active(symbol, coin, stop_key):
+                logger.debug(f"Hyperliquid止损单未变化，跳过提交: {symbol} {side} {size} @ {rounded_stop_price}")
+                return {
+                    "status": "success",
+                    "cached": True,
+                    "symbol": symbol,
+                    "side": side,
+                    "amount": size,
+                    "stop_price": rounded_stop_price,
+                    "message": reason
+                }
+
+            # 总持仓与下单并发查询，用于判断之后的相同止损能否跳过
+            position_future = self._executor.submit(self._position_size, coin)
+
             # 创建触发止损单
             order_result = self.exchange.order(
                 coin=coin,
@@ -630,11 +942,14 @@ class HyperliquidTrader(TradingInterface):
                 price=rounded_stop_price,
                 order_type='stop_loss',
                 status='pending',
-                timestamp=datetime.now(),
+                timestamp=time.time_ns(),
                 reduce_only=True
             )
             self.orders.append(order_info)
+            self._invalidate_open_orders()
             self._save_order(order_info)
+            if order_info.order_id:
+                self._last_stop[symbol] = stop_key + (position_future.result(), order_info.order_id)
 
             logger.info(f"Hyperliquid止损单设置成功: {symbol} {side} {size} @ {rounded_stop_price}")
             return {
@@ -651,6 +966,34 @@ class HyperliquidTrader(TradingInterface):
             logger.error(f"Hyperliquid设置止损失败: {e}")
             return {"status": "error", "message": str(e)}
 
+    def _stop_still_active(self, symbol: str, coin: str, stop_key: Tuple[str, float, float]) -> bool:
+        """上次设置的止损与本次相同，且止损单仍挂着、总持仓未变化"""
+        last = self._last_stop.get(symbol)
+        if last is None or last[:3] != stop_key:
+            return False
+
+        position_size, oid = last[3], last[4]
+        open_orders = self._ws_fresh(self._ws_open_orders)
+        if open_orders is None:
+            open_orders = self._get_open_orders_index()
+        if oid in open_orders and self._position_size(coin) == position_size:
+            return True
+
+        # 止损已触发/被撤或持仓已变化，缓存失效
+        self._last_stop.pop(symbol, None)
+        return False
+
+    def _position_size(self, coin: str) -> float:
+        """查询币种当前的总持仓（带方向，优先使用推送）"""
+        user_state = self._ws_fresh(self._ws_user_state)
+        if user_state is None:
+            user_state = self.info.user_state(self.main_wallet_address)
+        for asset_position in user_state.get('assetPositions', []):
+            position = asset_position['position']
+            if position['coin'] == coin:
+                return float(position['szi'])
+        return 0.0
+
     def execute_decision(
         self,
         decision: TradingDecision,
@@ -666,24 +1009,130 @@ class HyperliquidTrader(TradingInterface):
         Returns:
             执行结果
         """
+        result, stop_loss = self._execute_decision(decision, price_override)
+        if stop_loss:
+            self.set_stop_loss(**stop_loss)
+        return result
+
+    async def execute_decision_async(
+        self,
+        decision: TradingDecision,
+        price_override: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        异步执行交易决策（供 asyncio 调度器使用，不阻塞事件循环）
+
+        下单完成即返回，止损单在后台线程中提交，与调用方的后续决策重叠；
+        close 会等待所有尚未完成的止损单
+
+        Args:
+            decision: 交易决策
+            price_override: 价格覆盖（用于测试）
+
+        Returns:
+            执行结果
+        """
+        result, stop_loss = await asyncio.to_thread(self._execute_decision, decision, price_override)
+        if stop_loss:
+            future = self._stop_loss_executor.submit(self.set_stop_loss, **stop_loss)
+            self._stop_loss_futures.add(future)
+            future.add_done_callback(self._stop_loss_futures.discard)
+        return result
+
+    def submit_decision(
+        self,
+        decision: TradingDecision,
+        price_override: Optional[float] = None
+    ) -> Future:
+        """
+        在常驻事件循环上异步执行交易决策（供同步调度器使用）
+
+        止损单同样在后台线程中提交，不会随调用返回而被取消
+
+        Args:
+            decision: 交易决策
+            price_override: 价格覆盖（用于测试）
+
+        Returns:
+            执行结果的 Future
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self.execute_decision_async(decision, price_override), self._ensure_loop()
+        )
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """返回常驻事件循环，首次调用时在后台线程启动"""
+        with self._loop_lock:
+            if self._loop is None:
+                if self._closed:
+                    raise RuntimeError("交易执行器已关闭")
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = Thread(
+                    target=self._loop.run_forever, name="hyperliquid-loop", daemon=True
+                )
+                self._loop_thread.start()
+            return self._loop
+
+    def _submit(self, coro) -> Any:
+        """在常驻事件循环上运行协程并等待结果"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result()
+
+    @staticmethod
+    async def _drain_loop_tasks():
+        """等待常驻循环上仍在执行的协程（如 submit_decision 提交、尚未下完单的决策）"""
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _stop_loop(self):
+        """等待进行中的决策执行完后停止常驻事件循环"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._drain_loop_tasks(), loop).result(timeout=30)
+        except Exception as e:
+            logger.warning(f"等待进行中的决策失败: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop_thread.join(timeout=5)
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+    def _execute_decision(
+        self,
+        decision: TradingDecision,
+        price_override: Optional[float] = None
+    ) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        执行交易决策中的下单部分
+
+        Returns:
+            (执行结果, 待提交止损单的参数；无需止损时为 None)
+        """
         if not decision.symbol:
-            return {"status": "error", "message": "缺少交易对符号"}
+            return {"status": "error", "message": "缺少交易对符号"}, None
 
         # 验证决策
         is_valid, msg = decision.validate_decision()
         if not is_valid:
-            return {"status": "error", "message": f"决策无效: {msg}"}
+            return {"status": "error", "message": f"决策无效: {msg}"}, None
 
         try:
-            current_price = price_override or self.get_symbol_price(decision.symbol)
-
             if decision.action == "BUY":
+                # 价格在线程池中获取，同时在当前线程查询余额（余额查询本身也用线程池，不能嵌套提交）
+                price_future = None if price_override else self._executor.submit(
+                    self.get_symbol_price, decision.symbol
+                )
+                balance = self.get_account_balance(persist=False)
+                current_price = price_override or price_future.result()
+
                 # 按百分比计算数量（基于USDC余额）
-                balance = self.get_account_balance()
                 usdc_balance = balance.get('USDC', 0)
 
                 if usdc_balance <= 0:
-                    return {"status": "error", "message": "USDC余额不足"}
+                    return {"status": "error", "message": "USDC余额不足"}, None
 
                 # 计算交易金额
                 usdt_amount = usdc_balance * (decision.position_size / 100)
@@ -697,17 +1146,18 @@ class HyperliquidTrader(TradingInterface):
                     reason=decision.reasoning
                 )
 
-                # 设置止损
+                # 止损单由调用方提交（同步执行或后台任务）
+                stop_loss = None
                 if order_result["status"] == "success" and decision.stop_loss:
-                    self.set_stop_loss(
-                        symbol=decision.symbol,
-                        side='long',
-                        amount=amount,
-                        stop_price=decision.stop_loss,
-                        reason=f"止损-{decision.reasoning[:50]}"
-                    )
+                    stop_loss = {
+                        "symbol": decision.symbol,
+                        "side": 'long',
+                        "amount": amount,
+                        "stop_price": decision.stop_loss,
+                        "reason": f"止损-{decision.reasoning[:50]}"
+                    }
 
-                return order_result
+                return order_result, stop_loss
 
             elif decision.action == "SELL":
                 # 检查持仓
@@ -723,7 +1173,7 @@ class HyperliquidTrader(TradingInterface):
                     return {
                         "status": "error",
                         "message": f"未找到 {decision.symbol} 的持仓"
-                    }
+                    }, None
 
                 # 按百分比平仓
                 amount = position['positionAmt'] * (decision.position_size / 100)
@@ -736,7 +1186,7 @@ class HyperliquidTrader(TradingInterface):
                     reason=decision.reasoning
                 )
 
-                return order_result
+                return order_result, None
 
             else:  # HOLD
                 return {
@@ -744,11 +1194,11 @@ class HyperliquidTrader(TradingInterface):
                     "message": "HOLD决策，无操作",
                     "symbol": decision.symbol,
                     "action": "HOLD"
-                }
+                }, None
 
         except Exception as e:
             logger.error(f"执行Hyperliquid交易决策失败: {e}")
-            return {"status": "error", "message": str(e)}
+            return {"status": "error", "message": str(e)}, None
 
     def get_trades(self, limit: int = 100) -> List[Dict[str, Any]]:
         """
@@ -761,66 +1211,84 @@ class HyperliquidTrader(TradingInterface):
             交易记录列表
         """
         try:
-            # 获取最近的订单
-            recent_orders = self.orders[-limit:]
+            # 从尾部取最近的订单（只遍历 limit 条），按时间正序返回标准格式
+            recent = list(islice(reversed(self.orders), limit))
+            return [order_info.to_dict() for order_info in reversed(recent)]
 
-            # 转换为标准格式
-            trades = []
-            for order_info in recent_orders:
-                trades.append(order_info.to_order_info().to_dict())
+        except Exception as e:
+            logger.error(f"获取Hyperliquid交易记录失败: {e}")
+            return []
 
-            return trades
+    def get_order_history(self, limit: int = 100, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        从数据库查询历史订单（按时间倒序，timestamp 为纪元微秒）
+
+        Args:
+            limit: 返回条数
+            symbol: 交易对，为空时查询全部
+
+        Returns:
+            订单字典列表
+        """
+        query = "SELECT * FROM orders"
+        params: tuple = ()
+        if symbol:
+            query += " WHERE coin = ?"
+            params = (self._convert_symbol_to_hyperliquid(symbol),)
+        query += " ORDER BY timestamp DESC LIMIT ?"
 
+        try:
+            with self._db_lock:
+                cursor = self._conn.execute(query, params + (limit,))
+                columns = [col[0] for col in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
         except Exception as e:
-            logger.error(f"获取Hyperliquid交易记录失败: {e}")
+            logger.error(f"查询Hyperliquid历史订单失败: {e}")
             return []
 
     def _save_order(self, order: HyperliquidOrderInfo):
         """保存订单到数据库"""
         try:
-            conn = sqlite3.connect(self.database_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO orders
-                (order_id, coin, side, size, price, order_type, status, timestamp, reduce_only)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                order.order_id, order.coin, order.side, order.size, order.price,
-                order.order_type, order.status, order.timestamp.isoformat(), order.reduce_only
-            ))
-            conn.commit()
-            conn.close()
+            with self._db_lock, self._conn:
+                self._conn.execute(_INSERT_ORDER_SQL, (
+                    order.order_id, order.coin, order.side, order.size, order.price,
+                    order.order_type, order.status, order.timestamp // 1000, order.reduce_only
+                ))
         except Exception as e:
             logger.error(f"保存Hyperliquid订单失败: {e}")
 
+    def _maybe_save_balances(self, balances: Dict[str, float]):
+        """余额有变化或距上次写入超过间隔时才写库"""
+        now = time.monotonic()
+        if balances == self._saved_balances and now - self._saved_balances_at < _BALANCE_PERSIST_INTERVAL:
+            return
+        self._save_balances(balances)
+        self._saved_balances = dict(balances)
+        self._saved_balances_at = now
+
     def _save_balances(self, balances: Dict[str, float]):
         """保存余额到数据库"""
         try:
-            conn = sqlite3.connect(self.database_path)
-            cursor = conn.cursor()
-
-            # 创建余额表（如果不存在）
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS balances (
-                    asset TEXT PRIMARY KEY,
-                    amount REAL,
-                    timestamp TEXT
-                )
-            ''')
-
             timestamp = datetime.now().isoformat()
-            for asset, amount in balances.items():
-                cursor.execute('''
-                    INSERT OR REPLACE INTO balances
-                    (asset, amount, timestamp)
-                    VALUES (?, ?, ?)
-                ''', (asset, amount, timestamp))
-
-            conn.commit()
-            conn.close()
+            rows = [(asset, amount, timestamp) for asset, amount in balances.items()]
+            with self._db_lock, self._conn:
+                self._conn.executemany(_INSERT_BALANCE_SQL, rows)
         except Exception as e:
             logger.error(f"保存Hyperliquid余额失败: {e}")
 
     def close(self):
-        """关闭连接/清理资源"""
+        """关闭连接/清理资源（可重复调用）"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self.info.ws_manager is not None:
+            self.info.disconnect_websocket()
+        self._stop_loop()
+        # 先等后台止损单全部提交完（它们还会用到 _executor 和数据库连接）
+        self._stop_loss_executor.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+        with self._db_lock:
+            self._conn.close()
+        self._http.close()
         logger.info("Hyperliquid交易执行器已关闭")
\ No newline at end of file
@@ -6,16 +6,49 @@
 
 import json
 import sqlite3
-from typing import Dict, Optional, List, Any
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, List, Any, Tuple
 from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, replace
 import logging
 from pathlib import Path
 
+import numpy as np
+
 from models.trading_decision import TradingDecision
 
 logger = logging.getLogger(__name__)
 
+# 模拟交易记录可容忍断电时丢失最后几笔，换取写入不再逐次 fsync
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;"
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA temp_store=MEMORY;"
+    "PRAGMA cache_size=-2000;"
+)
+
+# PnL 列的初始容量
+_PNL_ARRAY_INITIAL_SIZE = 1024
+
+# 固定的 SQL 文本，sqlite3 按文本缓存预编译语句，重复执行无需重新解析
+_CACHED_STATEMENTS = 256
+_INSERT_POSITION_SQL = """
+    INSERT OR REPLACE INTO positions
+    (symbol, side, size, entry_price, entry_time, current_price,
+     unrealized_pnl, realized_pnl, stop_loss, take_profit)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_TRADE_SQL = """
+    INSERT INTO trades
+    (trade_id, symbol, side, size, price, timestamp, pnl, fee, reason)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_ACCOUNT_HISTORY_SQL = """
+    INSERT INTO account_history
+    (timestamp, balance, total_value, unrealized_pnl, realized_pnl)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
 
 @dataclass
 class Position:
@@ -42,9 +75,19 @@ class Position:
 
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
-        data['entry_time'] = self.entry_time.isoformat()
-        return data
+        # 字段都是扁平的基本类型，直接构造字典，省去 asdict 的递归深拷贝
+        return {
+            'symbol': self.symbol,
+            'side': self.side,
+            'size': self.size,
+            'entry_price': self.entry_price,
+            'entry_time': self.entry_time.isoformat(),
+            'current_price': self.current_price,
+            'unrealized_pnl': self.unrealized_pnl,
+            'realized_pnl': self.realized_pnl,
+            'stop_loss': self.stop_loss,
+            'take_profit': self.take_profit
+        }
 
 
 @dataclass
@@ -63,9 +106,17 @@ class Trade:
 
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
-        data['timestamp'] = self.timestamp.isoformat()
-        return data
+        return {
+            'trade_id': self.trade_id,
+            'symbol': self.symbol,
+            'side': self.side,
+            'size': self.size,
+            'price': self.price,
+            'timestamp': self.timestamp.isoformat(),
+            'pnl': self.pnl,
+            'fee': self.fee,
+            'reason': self.reason
+        }
 
 
 class PaperTrader:
@@ -98,14 +149,45 @@ class PaperTrader:
         self.fee_rate = fee_rate
         self.positions: Dict[str, Position] = {}  # symbol -> Position
         self.trades: List[Trade] = []
+        self._realized_pnl_total = 0.0  # 已实现PnL累计，随交易记录增量维护
+        # 每笔交易的 PnL 按列存放（容量不足时翻倍），供性能指标向量化计算
+        self._pnl_array = np.empty(_PNL_ARRAY_INITIAL_SIZE, dtype=np.float64)
+        self._n_trades = 0
         self.database_path = database_path or "paper_trading.db"
+        # 常驻连接（autocommit 模式），所有读写复用，避免每次写入都 connect/close；
+        # 内存数据库也因此在各次调用间保持同一个库
+        self._conn = sqlite3.connect(
+            self.database_path, check_same_thread=False, isolation_level=None,
+            cached_statements=_CACHED_STATEMENTS
+        )
+        self._conn.executescript(_SQLITE_PRAGMAS)
+        self._tx_depth = 0  # _transaction 嵌套层数
+        # replay 期间的写入缓冲（None 表示直接写库）
+        self._trades_buffer: Optional[List[Trade]] = None
+        self._positions_buffer: Optional[Dict[str, Position]] = None
         self._init_database()
 
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """
+        将一次决策/价格更新内的所有写入合并为一个事务（可嵌套，最外层提交）
+
+        出错时也提交已写入的记录：内存中的账户状态不会回滚，数据库需与之保持一致
+        """
+        if self._tx_depth == 0:
+            self._conn.execute("BEGIN")
+        self._tx_depth += 1
+        try:
+            yield
+        finally:
+            self._tx_depth -= 1
+            if self._tx_depth == 0:
+                self._conn.execute("COMMIT")
+
     def _init_database(self):
         """初始化数据库"""
         try:
-            conn = sqlite3.connect(self.database_path)
-            cursor = conn.cursor()
+            cursor = self._conn.cursor()
 
             # 创建持仓表
             cursor.execute('''
@@ -150,8 +232,6 @@ class PaperTrader:
                 )
             ''')
 
-            conn.commit()
-            conn.close()
             logger.info("纸交易数据库初始化成功")
         except Exception as e:
             logger.error(f"数据库初始化失败: {e}")
@@ -180,23 +260,25 @@ class PaperTrader:
             if not is_valid:
                 return {"status": "error", "message": f"决策无效: {msg}"}
 
-            # 执行交易
+            # 执行交易（一次决策的所有写入在同一事务中提交）
             if decision.action == "BUY":
-                return self._buy(
-                    symbol=decision.symbol,
-                    position_size_pct=decision.position_size,
-                    price=current_price,
-                    stop_loss=decision.stop_loss,
-                    take_profit=decision.take_profit,
-                    reason=decision.reasoning
-                )
+                with self._transaction():
+                    return self._buy(
+                        symbol=decision.symbol,
+                        position_size_pct=decision.position_size,
+                        price=current_price,
+                        stop_loss=decision.stop_loss,
+                        take_profit=decision.take_profit,
+                        reason=decision.reasoning
+                    )
             elif decision.action == "SELL":
-                return self._sell(
-                    symbol=decision.symbol,
-                    position_size_pct=decision.position_size,
-                    price=current_price,
-                    reason=decision.reasoning
-                )
+                with self._transaction():
+                    return self._sell(
+                        symbol=decision.symbol,
+                        position_size_pct=decision.position_size,
+                        price=current_price,
+                        reason=decision.reasoning
+                    )
             else:  # HOLD
                 return {
                     "status": "hold",
@@ -266,9 +348,9 @@ class PaperTrader:
         # 扣减资金
         self.balance -= total_cost
 
-        # 记录交易
+        # 记录交易（序号后缀保证同一秒内的多笔交易 ID 不冲突）
         trade = Trade(
-            trade_id=f"buy_{symbol}_{int(datetime.now().timestamp())}",
+            trade_id=f"buy_{symbol}_{int(datetime.now().timestamp())}_{len(self.trades)}",
             symbol=symbol,
             side='buy',
             size=size,
@@ -277,7 +359,7 @@ class PaperTrader:
             fee=fee,
             reason=reason
         )
-        self.trades.append(trade)
+        self._append_trade(trade)
         self._save_trade(trade)
         self._save_position(self.positions[symbol])
         self._save_account_history()
@@ -368,7 +450,7 @@ class PaperTrader:
 
         # 记录交易
         trade = Trade(
-            trade_id=f"sell_{symbol}_{int(datetime.now().timestamp())}",
+            trade_id=f"sell_{symbol}_{int(datetime.now().timestamp())}_{len(self.trades)}",
             symbol=symbol,
             side='sell',
             size=close_size,
@@ -378,7 +460,7 @@ class PaperTrader:
             fee=fee,
             reason=reason
         )
-        self.trades.append(trade)
+        self._append_trade(trade)
         self._save_trade(trade)
         self._save_account_history()
 
@@ -395,6 +477,15 @@ class PaperTrader:
             "position": position.to_dict() if symbol in self.positions else None
         }
 
+    def _append_trade(self, trade: Trade):
+        """记录交易，并增量更新已实现PnL累计和 PnL 列"""
+        self.trades.append(trade)
+        self._realized_pnl_total += trade.pnl
+        if self._n_trades == len(self._pnl_array):
+            self._pnl_array = np.resize(self._pnl_array, 2 * len(self._pnl_array))
+        self._pnl_array[self._n_trades] = trade.pnl
+        self._n_trades += 1
+
     def update_prices(self, price_data: Dict[str, float]):
         """
         更新所有持仓的当前价格
@@ -402,34 +493,36 @@ class PaperTrader:
         Args:
             price_data: {symbol: price} 字典
         """
-        for symbol, price in price_data.items():
-            if symbol in self.positions:
-                self.positions[symbol].update_price(price)
-
-                # 检查止损止盈
-                position = self.positions[symbol]
-                should_close = False
-                close_reason = ""
-
-                if position.side == 'long':
-                    if position.stop_loss and price <= position.stop_loss:
-                        should_close = True
-                        close_reason = "止损"
-                    elif position.take_profit and price >= position.take_profit:
-                        should_close = True
-                        close_reason = "止盈"
-                else:
-                    if position.stop_loss and price >= position.stop_loss:
-                        should_close = True
-                        close_reason = "止损"
-                    elif position.take_profit and price <= position.take_profit:
-                        should_close = True
-                        close_reason = "止盈"
-
-                if should_close:
-                    self._close_position(symbol, price, close_reason)
-
-        self._save_account_history()
+        # 整个循环（含触发的止损止盈平仓）在同一事务中提交
+        with self._transaction():
+            for symbol, price in price_data.items():
+                if symbol in self.positions:
+                    self.positions[symbol].update_price(price)
+
+                    # 检查止损止盈
+                    position = self.positions[symbol]
+                    should_close = False
+                    close_reason = ""
+
+                    if position.side == 'long':
+                        if position.stop_loss and price <= position.stop_loss:
+                            should_close = True
+                            close_reason = "止损"
+                        elif position.take_profit and price >= position.take_profit:
+                            should_close = True
+                            close_reason = "止盈"
+                    else:
+                        if position.stop_loss and price >= position.stop_loss:
+                            should_close = True
+                            close_reason = "止损"
+                        elif position.take_profit and price <= position.take_profit:
+                            should_close = True
+                            close_reason = "止盈"
+
+                    if should_close:
+                        self._close_position(symbol, price, close_reason)
+
+            self._save_account_history()
 
     def get_portfolio_value(self, price_data: Dict[str, float]) -> float:
         """
@@ -472,7 +565,7 @@ class PaperTrader:
                     unrealized_pnl += (position.entry_price - price) * position.size
 
         # 已实现PnL
-        realized_pnl = sum(trade.pnl for trade in self.trades)
+        realized_pnl = self._realized_pnl_total
 
         # 总PnL
         total_pnl = realized_pnl + unrealized_pnl
@@ -499,21 +592,16 @@ class PaperTrader:
                 "max_drawdown": 0
             }
 
+        pnls = self._pnl_array[:self._n_trades]
+
         # 计算胜率
-        profitable_trades = [t for t in self.trades if t.pnl > 0]
-        win_rate = (len(profitable_trades)) / len(self.trades) * 100
+        win_rate = float(np.count_nonzero(pnls > 0)) / len(pnls) * 100
 
         # 计算最大回撤
-        running_max = 0
-        max_drawdown = 0
-        current_balance = self.balance
-
         # 这里简化处理，实际应该基于净值曲线计算
-        for trade in self.trades:
-            current_balance += trade.pnl
-            running_max = max(running_max, current_balance)
-            drawdown = (running_max - current_balance) / running_max * 100
-            max_drawdown = max(max_drawdown, drawdown)
+        equity = self.balance + np.cumsum(pnls)
+        running_max = np.maximum.accumulate(equity)
+        max_drawdown = float(((running_max - equity) / running_max).max() * 100)
 
         return {
             "total_trades": len(self.trades),
@@ -533,66 +621,89 @@ class PaperTrader:
         return [t.to_dict() for t in trades[:limit]]
 
     def _save_position(self, position: Position):
-        """保存持仓到数据库"""
+        """保存持仓到数据库（回放期间先缓冲，每个交易对只保留最新快照）"""
+        if self._positions_buffer is not None:
+            self._positions_buffer[position.symbol] = replace(position)
+            return
+        self._save_positions_bulk([position])
+
+    def _save_trade(self, trade: Trade):
+        """保存交易到数据库（回放期间先缓冲）"""
+        if self._trades_buffer is not None:
+            self._trades_buffer.append(trade)
+            return
+        self._save_trades_bulk([trade])
+
+    def _save_positions_bulk(self, positions: Iterable[Position]):
+        """批量保存持仓（executemany，同一事务）"""
         try:
-            conn = sqlite3.connect(self.database_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO positions
-                (symbol, side, size, entry_price, entry_time, current_price,
-                 unrealized_pnl, realized_pnl, stop_loss, take_profit)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                position.symbol, position.side, position.size, position.entry_price,
-                position.entry_time.isoformat(), position.current_price,
-                position.unrealized_pnl, position.realized_pnl,
-                position.stop_loss, position.take_profit
-            ))
-            conn.commit()
-            conn.close()
+            with self._transaction():
+                self._conn.executemany(_INSERT_POSITION_SQL, [(
+                    position.symbol, position.side, position.size, position.entry_price,
+                    position.entry_time.isoformat(), position.current_price,
+                    position.unrealized_pnl, position.realized_pnl,
+                    position.stop_loss, position.take_profit
+                ) for position in positions])
         except Exception as e:
             logger.error(f"保存持仓失败: {e}")
 
-    def _save_trade(self, trade: Trade):
-        """保存交易到数据库"""
+    def _save_trades_bulk(self, trades: Iterable[Trade]):
+        """批量保存交易（executemany，同一事务）"""
         try:
-            conn = sqlite3.connect(self.database_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO trades
-                (trade_id, symbol, side, size, price, timestamp, pnl, fee, reason)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                trade.trade_id, trade.symbol, trade.side, trade.size,
-                trade.price, trade.timestamp.isoformat(), trade.pnl,
-                trade.fee, trade.reason
-            ))
-            conn.commit()
-            conn.close()
+            with self._transaction():
+                self._conn.executemany(_INSERT_TRADE_SQL, [(
+                    trade.trade_id, trade.symbol, trade.side, trade.size,
+                    trade.price, trade.timestamp.isoformat(), trade.pnl,
+                    trade.fee, trade.reason
+                ) for trade in trades])
         except Exception as e:
             logger.error(f"保存交易失败: {e}")
 
     def _save_account_history(self):
-        """保存账户历史"""
+        """保存账户历史（回放期间跳过，由 flush 统一写一条）"""
+        if self._trades_buffer is not None:
+            return
         try:
-            conn = sqlite3.connect(self.database_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO account_history
-                (timestamp, balance, total_value, unrealized_pnl, realized_pnl)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
+            self._conn.execute(_INSERT_ACCOUNT_HISTORY_SQL, (
                 datetime.now().isoformat(),
                 self.balance,
                 self.balance,  # 简化处理
                 0,  # 简化处理
-                sum(t.pnl for t in self.trades)
+                self._realized_pnl_total
             ))
-            conn.commit()
-            conn.close()
         except Exception as e:
             logger.error(f"保存账户历史失败: {e}")
 
+    def replay(self, events: Iterable[Tuple[TradingDecision, float]]) -> List[Dict[str, Any]]:
+        """
+        批量回放交易决策（如从日志回补），期间的写入先缓冲，结束后一次性批量写库
+
+        Args:
+            events: (决策, 当时价格) 序列
+
+        Returns:
+            每个决策的执行结果
+        """
+        self._trades_buffer = []
+        self._positions_buffer = {}
+        try:
+            return [self.execute_decision(decision, price) for decision, price in events]
+        finally:
+            self.flush()
+
+    def flush(self):
+        """将缓冲的交易/持仓批量写库，并记录一条账户历史"""
+        if self._trades_buffer is None:
+            return
+        trades, positions = self._trades_buffer, self._positions_buffer
+        self._trades_buffer = self._positions_buffer = None
+        with self._transaction():
+            if trades:
+                self._save_trades_bulk(trades)
+            if positions:
+                self._save_positions_bulk(positions.values())
+            self._save_account_history()
+
     def export_trades(self, file_path: str):
         """导出交易记录"""
         with open(file_path, 'w', encoding='utf-8') as f:
@@ -603,20 +714,25 @@ class PaperTrader:
         self.balance = self.initial_balance
         self.positions.clear()
         self.trades.clear()
+        self._realized_pnl_total = 0.0
+        self._n_trades = 0
 
         # 清空数据库
         try:
-            conn = sqlite3.connect(self.database_path)
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM positions')
-            cursor.execute('DELETE FROM trades')
-            cursor.execute('DELETE FROM account_history')
-            conn.commit()
-            conn.close()
+            with self._transaction():
+                cursor = self._conn.cursor()
+                cursor.execute('DELETE FROM positions')
+                cursor.execute('DELETE FROM trades')
+                cursor.execute('DELETE FROM account_history')
             logger.info("账户已重置")
         except Exception as e:
             logger.error(f"重置失败: {e}")
 
     def close(self):
-        """关闭连接"""
+        """关闭连接（可重复调用）"""
+        if self._conn is None:
+            return
+        self.flush()
+        self._conn.close()
+        self._conn = None
         logger.info("纸交易执行器已关闭")
@@ -0,0 +1,80 @@
+"""
+请求权重限流
+
+按交易所的权重模型限流（如 Binance 每分钟 1200 权重），
+额度内的请求可以突发执行，只有额度耗尽时才等待
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶限流器（线程安全）
+
+    桶中最多保存 capacity 个令牌，每秒补充 refill_per_sec 个；
+    每次请求按权重消耗令牌，不足时阻塞到补足为止
+    """
+
+    def __init__(self, capacity: float, refill_per_sec: float):
+        """
+        初始化令牌桶
+
+        Args:
+            capacity: 桶容量（最大突发权重）
+            refill_per_sec: 每秒补充的令牌数
+        """
+        if capacity <= 0 or refill_per_sec <= 0:
+            raise ValueError("capacity 和 refill_per_sec 必须为正数")
+
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """按流逝时间补充令牌（调用方需持有锁）"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.refill_per_sec)
+        self._updated_at = now
+
+    def try_consume(self, weight: float = 1) -> bool:
+        """
+        尝试立即消耗令牌
+
+        Args:
+            weight: 请求权重
+
+        Returns:
+            令牌充足并已扣除时返回 True
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= weight:
+                self._tokens -= weight
+                return True
+            return False
+
+    def consume(self, weight: float = 1) -> float:
+        """
+        消耗令牌，不足时阻塞等待
+
+        Args:
+            weight: 请求权重（超过容量时按容量计算）
+
+        Returns:
+            实际等待的秒数
+        """
+        weight = min(weight, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= weight:
+                    self._tokens -= weight
+                    return waited
+                delay = (weight - self._tokens) / self.refill_per_sec
+            time.sleep(delay)
+            waited += delay